@@ -1,26 +1,45 @@
 import pygame
+import argparse
+import array
+import asyncio
+import collections
+import concurrent.futures
+import itertools
+import json
 import math
+import multiprocessing
+import os
 import random
+import socket
+import struct
+import sys
+import threading
+import time
+import zlib
 from enum import Enum
+
+import heatmaps
+import live_state
+import tag_core
+from tag_core import (
+    FPS, NORMAL_GRAVITY, LOW_GRAVITY, MAP_WIDTH, MAP_HEIGHT, BASE_SPEED, TAGGED_SPEED_BOOST,
+    JUMP_VELOCITY, FRICTION, MAX_PLAYERS, GROUND_HEIGHT, PLATFORM_Y_OFFSET, MOVING_PLATFORMS,
+    MOVING_PLATFORM_RANGE, MOVING_PLATFORM_PERIOD, TAG_COOLDOWN, MATCH_DURATION, DASH_COOLDOWN,
+    DEFAULT_CONFIG, MAP_GENERATORS, GameState, InputPlayback, MatchConfig, PlatformGrid,
+    air_time_table, analyze_map, build_map, generate_default_map, pick_best_map, touching_pairs,
+)
+try:
+    import numpy
+except ImportError:  # particle effects are skipped without NumPy
+    numpy = None
 pygame.init()
 # ==================== CONSTANTS ====================
-# Screen / World
+# Physics, map generation and match timing constants live in tag_core
+# Screen
 SCREEN_WIDTH = 1025
 SCREEN_HEIGHT = 710
-FPS = 60
-GRAVITY = 0.5
-MAP_WIDTH = 2000
-MAP_HEIGHT = 1600
 # Movement
 RUN_THRESHOLD = 1.2
-BASE_SPEED = 7
-TAGGED_SPEED_BOOST = 1.15
-JUMP_VELOCITY = -15
-FRICTION = 0.80
-
-# Player dimensions
-PLAYER_WIDTH = 30
-PLAYER_HEIGHT = 60
 
 # Camera
 CAMERA_MARGIN_X = 220
@@ -28,14 +47,61 @@ CAMERA_MARGIN_Y = 140
 CAMERA_EASE = 0.14
 ZOOM_MIN = 0.4
 ZOOM_MAX = 1.9
+# Split screen (--split-screen): the shared camera splits into one view per player
+# when it has to zoom out below the first zoom, and merges again above the second
+SPLIT_SCREEN_ZOOM = (0.7, 0.85)
+SPLIT_ZOOM_STEP = 0.1  # split views snap their zoom to these buckets so world tiles are shared
+SPLIT_DIVIDER = 5  # px between the two views
+SPLIT_VIEW_WIDTH = (SCREEN_WIDTH - SPLIT_DIVIDER) // 2
+SPLIT_VIEWPORTS = (pygame.Rect(0, 0, SPLIT_VIEW_WIDTH, SCREEN_HEIGHT),
+                   pygame.Rect(SCREEN_WIDTH - SPLIT_VIEW_WIDTH, 0, SPLIT_VIEW_WIDTH, SCREEN_HEIGHT))
+WORLD_TILE_SIZE = 256  # screen px per side of a pre-rendered static platform tile
+WORLD_TILE_MARGIN = 8  # extra px rendered around each tile (see WorldTileCache)
+# Pixel memory the world tile cache may hold: the most tiles two split views can
+# overlap at once, whatever their zoom buckets (about 7 MB at 4 bytes per pixel)
+WORLD_TILE_BYTES = (2 * (SPLIT_VIEW_WIDTH // WORLD_TILE_SIZE + 2) * (SCREEN_HEIGHT // WORLD_TILE_SIZE + 2)
+                    * (WORLD_TILE_SIZE + 2 * WORLD_TILE_MARGIN) ** 2 * 4)
+WORLD_TILE_COLORKEY = (255, 0, 255)
 
 # Platform generation
-GROUND_HEIGHT = 140
-
-
-# Game timing
-TAG_COOLDOWN = 30
-MATCH_DURATION = 60
+MAP_QUEUE_DEPTH = 2  # ready layouts kept per map type by the background generator
+
+# Chunked worlds (maps wider than MAP_WIDTH)
+CHUNK_WIDTH = 1000
+MAX_RESIDENT_CHUNKS = 24
+
+# Input
+JOYSTICK_DEADZONE = 0.35
+JOY_BUTTON_JUMP = 0
+JOY_BUTTON_ALT = 1
+JOY_BUTTON_DASH = 2
+JOY_BUTTON_START = 7
+LATE_INPUT_MARGIN = 0.002  # seconds of slack kept between input sampling and the frame deadline
+SIM_SWITCH_INTERVAL = 0.001  # GIL hand-off interval while the simulation thread runs
+PACER_SPIN_SECONDS = 0.002  # the frame pacer busy-waits this last stretch instead of sleeping
+PACER_BIN_MS = 0.25         # frame-interval histogram resolution
+GLOW_RADIUS_STEP = 4         # glow textures are cached per this many pixels of radius
+GLOW_INTENSITY_STEPS = 8     # and per 1/8 of intensity
+GLOW_CACHE_BYTES = 4 << 20   # pixel memory the glow texture cache may hold
+TAG_GLOW_COLOR = (255, 80, 60)
+PORTAL_GLOW_COLOR = (255, 60, 40)
+PARTICLE_BUDGET = 4000  # live particles across all effects; 0 turns particles off
+LANDING_DUST_SPEED = 4  # fall speed (px/frame) a landing needs to kick up dust
+AUDIO_CHANNELS = 8  # mixer voices shared by all sound effects
+AUDIO_VOLUME = 0.5
+# Menus and game-over wait for input instead of repainting every frame
+MENU_FPS = 20            # wake-up rate while someone is using the menus
+MENU_IDLE_FPS = 2        # wake-up rate once nobody has touched anything for a while
+MENU_IDLE_SECONDS = 30
+# Events that count as someone using the menus (stick moves count once they cross
+# JOYSTICK_DEADZONE), and the ones that need a menu repaint
+MENU_INPUT_EVENTS = (pygame.KEYDOWN, pygame.JOYBUTTONDOWN, pygame.JOYHATMOTION)
+MENU_REPAINT_EVENTS = (pygame.KEYDOWN, pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED)
+# (left, right, jump, dash) keys that gamepad presses are translated into, per player
+PLAYER_KEYS = (
+    (pygame.K_a, pygame.K_d, pygame.K_w, pygame.K_r),
+    (pygame.K_LEFT, pygame.K_RIGHT, pygame.K_UP, pygame.K_u),
+)
 
 # Colors
 WHITE = (255, 255, 255)
@@ -62,38 +128,79 @@ UPSIDE_DOWN_PLATFORM_BROWN = (84, 75, 67)
 UPSIDE_DOWN_PLATFORM_DARK = (41, 38, 35)
 UPSIDE_DOWN_GRASS_COLOR = (50, 67, 33)
 UI_LIGHT = (140,140,140)
-PLATFORM_Y_OFFSET = 80
+# Shirt colors handed out in N-player mode, one per slot up to MAX_PLAYERS
+# (players 1 and 2 still pick theirs)
+PLAYER_COLORS = [
+    RED, BLUE, GREEN, YELLOW, PURPLE, ORANGE,
+    (0, 200, 200), (255, 105, 180), (150, 90, 40), (128, 128, 0),
+    (0, 128, 128), (240, 240, 240), (40, 40, 40), (128, 0, 0),
+    (0, 0, 128), (173, 255, 47),
+]
+
+# Parallax background: (strip top, strip bottom, scroll factor, drift px/s).
+# Everything below a mountain strip is solid, so it is baked into the sky instead.
+PARALLAX_TILE_WIDTH = 2400
+FAR_MOUNTAIN_LAYER = (500, 650, 0.12, 0.0)
+NEAR_MOUNTAIN_LAYER = (550, 700, 0.3, 0.0)
+CLOUD_LAYER = (-50, 150, 0.05, 10.0)
 
 class PlayerState(Enum):
     NORMAL = 1
     TAGGED = 2
 
-class Platform:
-    def __init__(self, x, y, width, height):
-        self.rect = pygame.Rect(x, y, width, height)
+class InputMode(Enum):
+    STANDARD = 1  # pump events, simulate, draw, then wait in the frame pacer
+    LATE = 2      # sleep first, then sample input right before simulating
 
-    def draw(self, surface, zoom, cam_x, cam_y, platform_color, edge_color, grass_color):
-        sx = int(self.rect.x * zoom - cam_x)
-        sy = int(self.rect.y * zoom - cam_y)
+class Platform(tag_core.Platform):
+    rect_type = pygame.Rect
+
+    def record(self, display_list, zoom, cam_x, cam_y, platform_color, edge_color, grass_color):
+        """Queue the platform's fill, edge and grass; platforms never overlap, so
+        the three passes are batched across all platforms."""
+        # floor rather than int: a platform hanging off the left or top keeps its
+        # far edge put, and WorldTileCache tiles split platforms without a seam
+        sx = math.floor(self.rect.x * zoom - cam_x)
+        sy = math.floor(self.rect.y * zoom - cam_y)
         sw = max(1, int(self.rect.width * zoom))
         sh = max(1, int(self.rect.height * zoom))
-        draw_rect = pygame.Rect(sx, sy, sw, sh)
         # Frustum culling
-        if (draw_rect.right < 0 or draw_rect.left > SCREEN_WIDTH or 
-            draw_rect.bottom < 0 or draw_rect.top > SCREEN_HEIGHT):
+        if display_list.culls(sx, sy, sx + sw, sy + sh):
             return
-        pygame.draw.rect(surface, platform_color, draw_rect)
-        pygame.draw.rect(surface, edge_color, draw_rect, max(1, int(3 * zoom)))
-        pygame.draw.line(surface, grass_color,
-                        (draw_rect.left, draw_rect.top),
-                        (draw_rect.right, draw_rect.top), max(1, int(4 * zoom)))
+        draw_rect = pygame.Rect(sx, sy, sw, sh)
+        display_list.add(LAYER_PLATFORMS, 0, "fill", platform_color, draw_rect)
+        display_list.add(LAYER_PLATFORMS, 1, "rect", edge_color, (draw_rect, max(1, int(3 * zoom))))
+        display_list.add(LAYER_PLATFORMS, 2, "line", grass_color,
+                         ((draw_rect.left, draw_rect.top), (draw_rect.right, draw_rect.top),
+                          max(1, int(4 * zoom))))
+
+
+class MovingPlatform(Platform, tag_core.MovingPlatform):
+    """A drawable tag_core.MovingPlatform."""
 
-class Portal:
+
+class Portal(tag_core.Portal):
     """A bright red portal that switches the world colors."""
-    def __init__(self, x, y, width, height):
-        self.rect = pygame.Rect(x, y, width, height)
+    rect_type = pygame.Rect
 
-    def draw(self, surface, zoom, cam_x, cam_y, alpha=1.0):
+    def __init__(self, x, y, width, height):
+        super().__init__(x, y, width, height)
+        self.body = None  # last rendered body surface, reused while the on-screen size holds
+
+    def record(self, display_list, zoom, cam_x, cam_y, alpha=1.0, sim_time=0.0):
+        """Queue the pulsing additive glow and, on top of it, the portal body."""
+        rendered = self.render(zoom, cam_x, cam_y, alpha, sim_time)
+        if rendered:
+            surf, (x, y) = rendered
+            glow_phase = (math.sin(sim_time * 5) + 1) * 0.5  # 0..1
+            center = (x + surf.get_width() // 2, y + surf.get_height() // 2)
+            radius = int(max(surf.get_size()) * 0.9)
+            display_list.add_glow(LAYER_PORTAL, 0, center, PORTAL_GLOW_COLOR, radius,
+                                  (0.45 + 0.55 * glow_phase) * max(0.0, min(1.0, alpha)))
+            display_list.add(LAYER_PORTAL, 1, "blit", None, rendered)
+
+    def render(self, zoom, cam_x, cam_y, alpha, sim_time):
+        """Return (body surface, screen position) for the portal, or None when off screen."""
         # Transform to screen space
         sx = int(self.rect.x * zoom - cam_x)
         sy = int(self.rect.y * zoom - cam_y)
@@ -104,117 +211,369 @@ class Portal:
         # Frustum culling
         if (draw_rect.right < 0 or draw_rect.left > SCREEN_WIDTH or
             draw_rect.bottom < 0 or draw_rect.top > SCREEN_HEIGHT):
+            return None
+
+        # The body is static; the pulse lives in the glow, so it only re-renders on resize
+        if self.body is None or self.body.get_size() != (sw, sh):
+            radius = max(4, int(8 * zoom))
+            body = pygame.Surface((sw, sh), pygame.SRCALPHA)
+            pygame.draw.rect(body, (255, 40, 40), body.get_rect(), border_radius=radius)
+            pygame.draw.rect(body, (255, 170, 160), body.get_rect(), max(2, int(4 * zoom)), border_radius=radius)
+            self.body = body
+        self.body.set_alpha(int(255 * max(0, min(1.0, alpha))))
+        return self.body, (draw_rect.x, draw_rect.y)
+
+class ParallaxLayer:
+    """A horizontally tiling background strip that scrolls slower than the world.
+
+    The shape is kept as an 8-bit mask (index 1 = shape, 0 = transparent),
+    so re-tinting for a theme change is a palette swap plus one conversion
+    to a run-length encoded colorkey surface instead of redrawing polygons.
+    """
+    def __init__(self, mask, y, scroll_factor, drift=0.0):
+        self.mask = mask
+        self.y = y
+        self.scroll_factor = scroll_factor
+        self.drift = drift
+        self.tile = None
+        self.tile_color = None
+
+    @staticmethod
+    def make_mask(width, height):
+        mask = pygame.Surface((width, height), depth=8)
+        mask.set_palette([(0, 0, 0), (255, 255, 255)] + [(0, 0, 0)] * 254)
+        mask.fill(0)
+        mask.set_colorkey(0)
+        return mask
+
+    def _tinted(self, color):
+        if color != self.tile_color:
+            self.mask.set_palette_at(1, color)
+            tile = self.mask.convert() if pygame.display.get_surface() else self.mask.copy()
+            tile.set_colorkey(tile.get_colorkey(), pygame.RLEACCEL)
+            self.tile = tile
+            self.tile_color = color
+        return self.tile
+
+    def draw(self, surface, color, camera_x, seconds):
+        """Blit enough copies of the strip to cover the surface width.
+
+        camera_x is the left edge of the view in world pixels; seconds drives
+        the optional drift (clouds).
+        """
+        tile = self._tinted(color)
+        width = tile.get_width()
+        offset = int(camera_x * self.scroll_factor - seconds * self.drift) % width
+        x = -offset
+        right = surface.get_width()
+        while x < right:
+            surface.blit(tile, (x, self.y))
+            x += width
+
+
+# Display list layers, submitted back to front
+LAYER_PLATFORMS = 0
+LAYER_PORTAL = 1
+LAYER_PLAYERS = 2
+
+
+class DisplayList:
+    """World draw calls for one frame: recorded, then culled, sorted and submitted.
+
+    A command is (layer, order, seq, kind, color, args). Commands entirely
+    off screen are dropped as they are recorded. Submission sorts by layer,
+    then by order (a state key for layers whose primitives never overlap,
+    such as platforms), then by recording order, so runs of the same
+    primitive and color go out back to back with the color mapped once.
+    A pose is one command and is expanded at submit time; a glow is one
+    additive blit of a GlowCache texture.
+    """
+    def __init__(self, glow_cache=None):
+        self.commands = []
+        self.glow_cache = glow_cache or GlowCache()
+        self.pending_culled = 0
+        # Stats for the last submitted frame
+        self.recorded = 0
+        self.culled = 0
+        self.draw_calls = 0
+
+    def culls(self, left, top, right, bottom):
+        """True (and counted) when the screen box is entirely off screen."""
+        if right < 0 or left > SCREEN_WIDTH or bottom < 0 or top > SCREEN_HEIGHT:
+            self.pending_culled += 1
+            return True
+        return False
+
+    def add(self, layer, order, kind, color, args):
+        self.commands.append((layer, order, len(self.commands), kind, color, args))
+
+    def add_glow(self, layer, order, center, color, radius, intensity):
+        x, y = center
+        if not self.culls(x - radius, y - radius, x + radius, y + radius):
+            self.add(layer, order, "glow", color, (center, radius, intensity))
+
+    def extend(self, commands, culled):
+        """Re-add commands recorded on an earlier frame (see StaticPlatformLayer)."""
+        self.commands.extend(commands)
+        self.pending_culled += culled
+
+    def add_pose(self, layer, center, pose, reach):
+        x, y = center
+        if not self.culls(x - reach, y - reach, x + reach, y + reach):
+            self.add(layer, 0, "pose", None, (center, pose))
+
+    def submit(self, surface):
+        commands = self.commands
+        commands.sort()
+        clip = surface.get_clip()
+        mapped = {}
+        calls = 0
+        for _, _, _, kind, color, args in commands:
+            if kind == "pose":
+                (cx, cy), pose = args
+                for part, part_color, part_args in pose:
+                    value = mapped.get(part_color)
+                    if value is None:
+                        value = mapped[part_color] = surface.map_rgb(part_color)
+                    if part == "circle":
+                        (x, y), radius, width = part_args
+                        pygame.draw.circle(surface, value, (cx + x, cy + y), radius, width)
+                    elif part == "line":
+                        (x0, y0), (x1, y1), width = part_args
+                        pygame.draw.line(surface, value, (cx + x0, cy + y0), (cx + x1, cy + y1), width)
+                    else:
+                        rect, start, stop, width = part_args
+                        pygame.draw.arc(surface, value, rect.move(cx, cy), start, stop, width)
+                calls += len(pose)
+                continue
+            if kind == "blit":
+                surface.blit(*args)
+                calls += 1
+                continue
+            if kind == "glow":
+                (x, y), radius, intensity = args
+                texture = self.glow_cache.texture(color, radius, intensity)
+                if texture:
+                    half = texture.get_width() // 2
+                    surface.blit(texture, (x - half, y - half), special_flags=pygame.BLEND_ADD)
+                    calls += 1
+                continue
+            value = mapped.get(color)
+            if value is None:
+                value = mapped[color] = surface.map_rgb(color)
+            if kind == "fill":
+                # Surface.fill mishandles rects hanging off the left/top edge; clip first
+                surface.fill(value, args.clip(clip))
+            elif kind == "rect":
+                pygame.draw.rect(surface, value, *args)
+            elif kind == "line":
+                pygame.draw.line(surface, value, *args)
+            calls += 1
+        self.recorded = len(commands) + self.pending_culled
+        self.culled = self.pending_culled
+        self.draw_calls = calls
+        self.commands = []
+        self.pending_culled = 0
+
+
+class StaticPlatformLayer:
+    """Display-list commands of the platforms that never move, kept between frames.
+
+    The commands are re-recorded only when the platform list, the camera
+    transform or the platform colours change; otherwise last frame's
+    commands are replayed as they are, e.g. when one simulation frame is
+    presented several times at a high --render-rate or while a frame is
+    frozen. Moving platforms are recorded separately every frame.
+    """
+    def __init__(self):
+        self.platforms = None
+        self.key = None
+        self.commands = []
+        self.culled = 0
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, display_list, platforms, transform, colors):
+        key = (transform, colors)
+        if platforms is self.platforms and key == self.key:
+            self.hits += 1
+            display_list.extend(self.commands, self.culled)
             return
+        self.misses += 1
+        start = len(display_list.commands)
+        culled = display_list.pending_culled
+        zoom, cam_x, cam_y = transform
+        for platform in platforms:
+            if not platform.moving:
+                platform.record(display_list, zoom, cam_x, cam_y, *colors)
+        self.platforms = platforms
+        self.key = key
+        self.commands = display_list.commands[start:]
+        self.culled = display_list.pending_culled - culled
+
+
+class WorldTileCache:
+    """Static platforms pre-rendered into world-aligned tiles, per zoom bucket.
+
+    Split-screen views blit the tiles they overlap instead of each
+    recording every platform, so a tile is drawn once per zoom and colours
+    and then shared by both views and by later frames. Tiles are
+    colorkeyed so the sky shows through; the least recently used ones are
+    dropped past max_bytes, and all of them when the platform list changes.
+    Each tile is rendered with a margin, because pygame drops a thick line
+    whose centre is off the surface even when its width would reach onto it.
+    """
+    margin = WORLD_TILE_MARGIN
+    max_entries = 1024  # empty tiles are remembered too, and cost no pixels
+
+    def __init__(self, size=WORLD_TILE_SIZE, max_bytes=WORLD_TILE_BYTES):
+        self.size = size
+        self.area = pygame.Rect(self.margin, self.margin, size, size)
+        self.max_bytes = max_bytes
+        self.tiles = collections.OrderedDict()  # (zoom, colors, tx, ty) -> Surface, or None when empty
+        self.platforms = None
+        self.bytes = 0
+        self.display_list = DisplayList()
+        self.hits = 0
+        self.misses = 0
+
+    def blit(self, surface, platforms, transform, colors):
+        """Draw the static platforms of a whole-pixel camera transform onto surface."""
+        if platforms is not self.platforms:
+            self.tiles.clear()
+            self.bytes = 0
+            self.platforms = platforms
+        zoom, cam_x, cam_y = transform
+        size = self.size
+        width, height = surface.get_size()
+        for ty in range(cam_y // size, (cam_y + height) // size + 1):
+            for tx in range(cam_x // size, (cam_x + width) // size + 1):
+                tile = self._tile(zoom, colors, tx, ty)
+                if tile:
+                    surface.blit(tile, (tx * size - cam_x, ty * size - cam_y), self.area)
+
+    def _tile(self, zoom, colors, tx, ty):
+        key = (zoom, colors, tx, ty)
+        if key in self.tiles:
+            self.hits += 1
+            self.tiles.move_to_end(key)
+            return self.tiles[key]
+        self.misses += 1
+        display_list = self.display_list
+        margin = self.margin
+        for platform in self.platforms:
+            if not platform.moving:
+                platform.record(display_list, zoom, tx * self.size - margin, ty * self.size - margin, *colors)
+        tile = None
+        if display_list.commands:
+            tile = pygame.Surface((self.size + 2 * margin, self.size + 2 * margin))
+            if pygame.display.get_surface():
+                tile = tile.convert()
+            tile.fill(WORLD_TILE_COLORKEY)
+            display_list.submit(tile)
+            tile.set_colorkey(WORLD_TILE_COLORKEY, pygame.RLEACCEL)
+            self.bytes += tile.get_width() * tile.get_height() * tile.get_bytesize()
+        display_list.pending_culled = 0
+        self.tiles[key] = tile
+        while (self.bytes > self.max_bytes or len(self.tiles) > self.max_entries) and len(self.tiles) > 1:
+            _, dropped = self.tiles.popitem(last=False)
+            if dropped:
+                self.bytes -= dropped.get_width() * dropped.get_height() * dropped.get_bytesize()
+        return tile
+
+
+class PoseCache:
+    """LRU cache of center-relative player poses (see Player.build_pose)."""
+    def __init__(self, max_entries=256):
+        self.poses = collections.OrderedDict()
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, player, zoom):
+        key = player.pose_key(zoom)
+        pose = self.poses.get(key)
+        if pose is None:
+            self.misses += 1
+            pose = self.poses[key] = player.build_pose(zoom)
+            if len(self.poses) > self.max_entries:
+                self.poses.popitem(last=False)
+        else:
+            self.hits += 1
+            self.poses.move_to_end(key)
+        return pose
 
-        # Pulsating glow effect
-        t = pygame.time.get_ticks() * 0.005
-        glow_phase = (math.sin(t) + 1) * 0.5  # 0..1
-        base_color = (255, 40, 40)
-        glow_color = (255, 90 + int(100 * glow_phase), 90 + int(80 * glow_phase))
-
-        radius = max(4, int(8 * zoom))
-        a = max(0, min(1.0, alpha))
-
-        # Draw on an alpha surface
-        portal_surf = pygame.Surface((sw, sh), pygame.SRCALPHA)
-        def with_alpha(col):
-            return (col[0], col[1], col[2], int(255 * a))
-
-        pygame.draw.rect(portal_surf, with_alpha(base_color), portal_surf.get_rect(), border_radius=radius)
-        pygame.draw.rect(portal_surf, with_alpha(glow_color), portal_surf.get_rect(), max(2, int(4 * zoom)), border_radius=radius)
-        inner = portal_surf.get_rect().inflate(-max(3, int(6 * zoom)), -max(3, int(6 * zoom)))
-        if inner.width > 0 and inner.height > 0:
-            pygame.draw.rect(portal_surf, with_alpha(glow_color), inner, max(1, int(3 * zoom)), border_radius=radius)
 
-        surface.blit(portal_surf, (draw_rect.x, draw_rect.y))
+class GlowCache:
+    """LRU cache of pre-rendered radial glow textures, shared by players, portals and particles.
 
-class Player:
-    def __init__(self, x, y, player_id, color_primary, color_shirt):
-        self.x = x
-        self.y = y
-        self.player_id = player_id
+    Textures are black-edged RGB gradients meant for BLEND_ADD, so they
+    brighten what is underneath without per-pixel alpha. Radius and
+    intensity are quantized so nearby requests share a texture, and the
+    least recently used ones are dropped once their pixels exceed max_bytes.
+    """
+    def __init__(self, max_bytes=GLOW_CACHE_BYTES):
+        self.textures = collections.OrderedDict()
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def quantize(radius, intensity):
+        radius = max(GLOW_RADIUS_STEP, int(radius + GLOW_RADIUS_STEP / 2) // GLOW_RADIUS_STEP * GLOW_RADIUS_STEP)
+        level = max(0, min(GLOW_INTENSITY_STEPS, round(intensity * GLOW_INTENSITY_STEPS)))
+        return radius, level
+
+    def texture(self, color, radius, intensity):
+        """The glow texture for a color, radius and 0..1 intensity, or None when it would be black."""
+        radius, level = self.quantize(radius, intensity)
+        if level == 0:
+            return None
+        key = (color, radius, level)
+        texture = self.textures.get(key)
+        if texture is not None:
+            self.hits += 1
+            self.textures.move_to_end(key)
+            return texture
+        self.misses += 1
+        texture = self.textures[key] = self._render(color, radius, level / GLOW_INTENSITY_STEPS)
+        self.bytes += texture.get_width() * texture.get_height() * texture.get_bytesize()
+        while self.bytes > self.max_bytes and len(self.textures) > 1:
+            _, dropped = self.textures.popitem(last=False)
+            self.bytes -= dropped.get_width() * dropped.get_height() * dropped.get_bytesize()
+        return texture
+
+    @staticmethod
+    def _render(color, radius, intensity):
+        texture = pygame.Surface((radius * 2, radius * 2))
+        if pygame.display.get_surface():
+            texture = texture.convert()
+        texture.fill(BLACK)
+        # Filled circles from the rim inwards, brightening with a quadratic falloff
+        for r in range(radius, 0, -1):
+            falloff = (1.0 - r / radius) ** 2 * intensity
+            pygame.draw.circle(texture, [int(c * falloff) for c in color], (radius, radius), r)
+        return texture
+
+
+class Player(tag_core.Player):
+    """A tag_core.Player with colors, a tag glow and animation state for drawing."""
+    rect_type = pygame.Rect
+
+    def __init__(self, x, y, player_id, color_primary, color_shirt, config=DEFAULT_CONFIG):
+        super().__init__(x, y, player_id, config)
         self.color_primary = color_primary
         self.color_shirt = color_shirt
-        self.vx = 0
-        self.vy = 0
-        self.width = 30
-        self.height = 60
-        self.on_ground = False
-        self.jumps_remaining = 2
-        self.is_tagged = False
-        self.tagged_cooldown = 0
         self.tagged_timer = 0
         self.state = PlayerState.NORMAL
         self.glow_intensity = 0
-        self.direction = 1
         self.run_cycle = 0.0
         self.current_animation = "idle"
         self.idle_phase = 0.0
-        self.dash_cooldown = 0
-        self.dash_speed = 20
-        self.dash_duration = 10
-        self.dash_timer = 0
-
-    def get_bounds(self):
-        return pygame.Rect(self.x, self.y, self.width, self.height)
-
-    def jump(self):
-        if self.jumps_remaining > 0:
-            self.vy = JUMP_VELOCITY
-            self.jumps_remaining -= 1
-            self.on_ground = False
-
-    def update(self, platforms):
-        self.vy += GRAVITY
-        self.x += self.vx
-        self.y += self.vy
 
-        # World bounds
-        if self.x < 0:
-            self.x = 0
-            self.vx = 0
-        elif self.x + self.width > MAP_WIDTH:
-            self.x = MAP_WIDTH - self.width
-            self.vx = 0
-
-        # Check world floor
-        if self.y + self.height >= MAP_HEIGHT:
-            self.y = MAP_HEIGHT - self.height
-            self.vy = 0
-            self.on_ground = True
-            self.jumps_remaining = 2
-
-        # Resolve platform collisions
-        player_rect = pygame.Rect(self.x, self.y, self.width, self.height)
-        for platform in platforms:
-            if player_rect.colliderect(platform.rect):
-                prev_y = self.y - self.vy
-                prev_bottom = prev_y + self.height
-
-                # Landing on top of platform
-                if self.vy > 0 and prev_bottom <= platform.rect.top + 8:
-                    self.y = platform.rect.top - self.height
-                    self.vy = 0
-                    self.on_ground = True
-                    self.jumps_remaining = 2
-                # Hitting head on bottom of platform
-                elif self.vy < 0 and prev_y >= platform.rect.bottom - 4:
-                    self.y = platform.rect.bottom
-                    self.vy = 0
-                # Side collision
-                else:
-                    prev_x = self.x - self.vx
-                    if prev_x + self.width <= platform.rect.left:
-                        # Hit from left
-                        self.x = platform.rect.left - self.width
-                        self.vx = 0
-                    elif prev_x >= platform.rect.right:
-                        # Hit from right
-                        self.x = platform.rect.right
-                        self.vx = 0
-
-                player_rect.update(self.x, self.y, self.width, self.height)
-        
+    def update(self, platforms, map_width=MAP_WIDTH, gravity=NORMAL_GRAVITY):
+        super().update(platforms, map_width, gravity)
         if self.is_tagged:
             self.glow_intensity = min(self.glow_intensity + 0.15, 1.0)
             self.tagged_timer = 0
@@ -222,19 +581,7 @@ class Player:
             self.glow_intensity = max(self.glow_intensity - 0.1, 0.0)
             if self.tagged_timer > 0:
                 self.tagged_timer -= 1
-                
-        if self.tagged_cooldown > 0:
-            self.tagged_cooldown -= 1
-
-        if self.dash_timer > 0:
-            self.dash_timer -= 1
-        elif self.dash_cooldown > 0:
-            self.dash_cooldown -= 1
-
-        # Apply friction to stop small movements
-        if self.on_ground and abs(self.vx) < 0.08 and self.dash_timer == 0:
-            self.vx = 0
-        
+
         # Animation state - set AFTER friction is applied
         # Trust on_ground flag completely - it's set properly by collision detection
         if self.on_ground:
@@ -262,13 +609,44 @@ class Player:
                 self.current_animation = "jumping"
                 self.run_cycle = 0
 
-    def dash(self):
-        if self.dash_cooldown == 0 and self.dash_timer == 0:
-            self.dash_timer = self.dash_duration
-            self.dash_cooldown = FPS * 5  # 5 seconds cooldown
-            self.vx = self.dash_speed * self.direction
+    def pose_key(self, zoom):
+        """Everything the pose geometry depends on, besides its screen position."""
+        key = (self.current_animation, zoom, self.color_shirt)
+        if self.current_animation == "running":
+            arm_swing_px = int(math.sin(self.run_cycle * math.pi / 2) * 6 * zoom)
+            leg_swing_px = int(math.sin(self.run_cycle * math.pi / 2 + math.pi / 2) * 4 * zoom)
+            key += (self.direction, arm_swing_px, leg_swing_px)
+        return key
+
+    def build_pose(self, zoom):
+        """Record the player's draw calls relative to the body center."""
+        out = []
+        # Body (shirt-colored)
+        body_radius = max(1, int(18 * zoom))
+        out.append(("circle", self.color_shirt, ((0, 0), body_radius, 0)))
 
-    def draw(self, surface, zoom, cam_x, cam_y):
+        # Face
+        eye_offset = max(1, int(6 * zoom))
+        eye_r = max(1, int(4 * zoom))
+        pupil_r = max(1, int(2 * zoom))
+        eye_y = -max(1, int(4 * zoom))
+        out.append(("circle", WHITE, ((-eye_offset, eye_y), eye_r, 0)))
+        out.append(("circle", WHITE, ((eye_offset, eye_y), eye_r, 0)))
+        out.append(("circle", BLACK, ((-eye_offset, eye_y), pupil_r, 0)))
+        out.append(("circle", BLACK, ((eye_offset, eye_y), pupil_r, 0)))
+        mouth_rect = pygame.Rect(-max(1, int(6 * zoom)), max(1, int(2 * zoom)), max(1, int(12 * zoom)), max(1, int(6 * zoom)))
+        out.append(("arc", BLACK, (mouth_rect, math.pi, 2 * math.pi, max(1, int(2 * zoom)))))
+        # Poses
+        if self.current_animation == "jumping":
+            self._jumping_pose(out, zoom)
+        elif self.current_animation == "running":
+            self._running_pose(out, zoom)
+        else:
+            self._idle_pose(out, zoom)
+        return out
+
+    def record(self, display_list, zoom, cam_x, cam_y, pose_cache):
+        """Queue this player's pose, reusing the cached geometry when nothing changed."""
         # Slight smoothing in idle only
         used_zoom = zoom
         if self.current_animation == "idle":
@@ -284,171 +662,155 @@ class Player:
         h = max(1, int(self.height * used_zoom))
         center_x = draw_x + w // 2
         center_y = draw_y + h // 2
-
-        # Tagged glow
         if self.is_tagged:
-            glow_radius = int((25 + self.glow_intensity * 15) * used_zoom)
-            for i in range(3):
-                glow_color = (255,
-                              int(100 + self.glow_intensity * 155 - i * 30),
-                              int(100 + self.glow_intensity * 155 - i * 30))
-                pygame.draw.circle(surface, glow_color, (center_x, center_y),
-                                   glow_radius + i * max(2, int(4 * used_zoom)),
-                                   max(1, int(3 * used_zoom)))
-
-        # Body (shirt-colored)
-        body_radius = max(1, int(18 * used_zoom))
-        pygame.draw.circle(surface, self.color_shirt, (center_x, center_y), body_radius)
+            # Under every pose, so overlapping glows add up instead of covering players
+            display_list.add_glow(LAYER_PLAYERS, -1, (center_x, center_y), TAG_GLOW_COLOR,
+                                  int((36 + self.glow_intensity * 24) * used_zoom), self.glow_intensity)
+        pose = pose_cache.get(self, used_zoom)
+        reach = int(40 * used_zoom) + 12  # arms and legs are the widest part
+        display_list.add_pose(LAYER_PLAYERS, (center_x, center_y), pose, reach)
 
-        # Face
-        eye_offset = max(1, int(6 * used_zoom))
-        eye_r = max(1, int(4 * used_zoom))
-        pupil_r = max(1, int(2 * used_zoom))
-        pygame.draw.circle(surface, WHITE, (center_x - eye_offset, center_y - max(1, int(4 * used_zoom))), eye_r)
-        pygame.draw.circle(surface, WHITE, (center_x + eye_offset, center_y - max(1, int(4 * used_zoom))), eye_r)
-        pygame.draw.circle(surface, BLACK, (center_x - eye_offset, center_y - max(1, int(4 * used_zoom))), pupil_r)
-        pygame.draw.circle(surface, BLACK, (center_x + eye_offset, center_y - max(1, int(4 * used_zoom))), pupil_r)
-        mouth_rect = pygame.Rect(center_x - max(1, int(6 * used_zoom)), center_y + max(1, int(2 * used_zoom)), max(1, int(12 * used_zoom)), max(1, int(6 * used_zoom)))
-        pygame.draw.arc(surface, BLACK, mouth_rect, math.pi, 2 * math.pi, max(1, int(2 * used_zoom)))
-        # Poses
-        if self.current_animation == "jumping":
-            self.draw_jumping_pose(surface, center_x, center_y, used_zoom)
-        elif self.current_animation == "running":
-            self.draw_running_pose(surface, center_x, center_y, used_zoom)
-        else:
-            self.draw_idle_pose(surface, center_x, center_y, used_zoom)
+    def draw(self, surface, zoom, cam_x, cam_y):
+        """Draw immediately (outside the per-frame display list)."""
+        display_list = DisplayList()
+        self.record(display_list, zoom, cam_x, cam_y, PoseCache(1))
+        display_list.submit(surface)
 
-    def draw_idle_pose(self, surface, center_x, center_y, zoom):
+    def _idle_pose(self, out, zoom):
         # Arms slightly relaxed
-        lx0 = center_x - int(18 * zoom)
-        ly0 = center_y + int(2 * zoom)
-        lx1 = center_x - int(20 * zoom)
-        ly1 = center_y + int(16 * zoom)
-        pygame.draw.line(surface, self.color_shirt, (lx0, ly0), (lx1, ly1), max(1, int(5 * zoom)))
-        pygame.draw.circle(surface, self.color_shirt, (lx1, ly1), max(1, int(4 * zoom)))
-
-        rx0 = center_x + int(18 * zoom)
-        ry0 = center_y + int(2 * zoom)
-        rx1 = center_x + int(20 * zoom)
-        ry1 = center_y + int(16 * zoom)
-        pygame.draw.line(surface, self.color_shirt, (rx0, ry0), (rx1, ry1), max(1, int(5 * zoom)))
-        pygame.draw.circle(surface, self.color_shirt, (rx1, ry1), max(1, int(4 * zoom)))
+        lx0 = -int(18 * zoom)
+        ly0 = int(2 * zoom)
+        lx1 = -int(20 * zoom)
+        ly1 = int(16 * zoom)
+        out.append(("line", self.color_shirt, ((lx0, ly0), (lx1, ly1), max(1, int(5 * zoom)))))
+        out.append(("circle", self.color_shirt, ((lx1, ly1), max(1, int(4 * zoom)), 0)))
+
+        rx0 = int(18 * zoom)
+        ry0 = int(2 * zoom)
+        rx1 = int(20 * zoom)
+        ry1 = int(16 * zoom)
+        out.append(("line", self.color_shirt, ((rx0, ry0), (rx1, ry1), max(1, int(5 * zoom)))))
+        out.append(("circle", self.color_shirt, ((rx1, ry1), max(1, int(4 * zoom)), 0)))
 
         # Legs straight under body
-        leg_y = center_y + int(18 * zoom)
-        llx0 = center_x - int(6 * zoom)
+        leg_y = int(18 * zoom)
+        llx0 = -int(6 * zoom)
         lly0 = leg_y
-        llx1 = center_x - int(6 * zoom)
+        llx1 = -int(6 * zoom)
         lly1 = leg_y + int(14 * zoom)
-        pygame.draw.line(surface, self.color_shirt, (llx0, lly0), (llx1, lly1), max(1, int(5 * zoom)))
-        pygame.draw.circle(surface, self.color_shirt, (llx1, lly1), max(1, int(3 * zoom)))
+        out.append(("line", self.color_shirt, ((llx0, lly0), (llx1, lly1), max(1, int(5 * zoom)))))
+        out.append(("circle", self.color_shirt, ((llx1, lly1), max(1, int(3 * zoom)), 0)))
 
-        rlx0 = center_x + int(6 * zoom)
+        rlx0 = int(6 * zoom)
         rly0 = leg_y
-        rlx1 = center_x + int(6 * zoom)
+        rlx1 = int(6 * zoom)
         rly1 = leg_y + int(14 * zoom)
-        pygame.draw.line(surface, self.color_shirt, (rlx0, rly0), (rlx1, rly1), max(1, int(5 * zoom)))
-        pygame.draw.circle(surface, self.color_shirt, (rlx1, rly1), max(1, int(3 * zoom)))
+        out.append(("line", self.color_shirt, ((rlx0, rly0), (rlx1, rly1), max(1, int(5 * zoom)))))
+        out.append(("circle", self.color_shirt, ((rlx1, rly1), max(1, int(3 * zoom)), 0)))
 
-    def draw_running_pose(self, surface, center_x, center_y, zoom):
+    def _running_pose(self, out, zoom):
         arm_swing = math.sin(self.run_cycle * math.pi / 2) * 6
         arm_swing_px = int(arm_swing * zoom)
-        arm_y = center_y + int(2 * zoom)
-        leg_y = center_y + int(18 * zoom)
+        arm_y = int(2 * zoom)
+        leg_y = int(18 * zoom)
         arm_back_x = int(24 * zoom)
         arm_forward_x = int(24 * zoom)
 
         # Arms with facing direction
         if self.direction > 0:
-            lx0 = center_x - int(18 * zoom)
+            lx0 = -int(18 * zoom)
             ly0 = arm_y
-            lx1 = center_x - arm_back_x - arm_swing_px
+            lx1 = -arm_back_x - arm_swing_px
             ly1 = arm_y + int(8 * zoom)
-            pygame.draw.line(surface, self.color_shirt, (lx0, ly0), (lx1, ly1), max(1, int(5 * zoom)))
-            pygame.draw.circle(surface, self.color_shirt, (lx1, ly1), max(1, int(4 * zoom)))
+            out.append(("line", self.color_shirt, ((lx0, ly0), (lx1, ly1), max(1, int(5 * zoom)))))
+            out.append(("circle", self.color_shirt, ((lx1, ly1), max(1, int(4 * zoom)), 0)))
 
-            rx0 = center_x + int(18 * zoom)
+            rx0 = int(18 * zoom)
             ry0 = arm_y
-            rx1 = center_x + arm_forward_x + arm_swing_px
+            rx1 = arm_forward_x + arm_swing_px
             ry1 = arm_y + int(8 * zoom)
-            pygame.draw.line(surface, self.color_shirt, (rx0, ry0), (rx1, ry1), max(1, int(5 * zoom)))
-            pygame.draw.circle(surface, self.color_shirt, (rx1, ry1), max(1, int(4 * zoom)))
+            out.append(("line", self.color_shirt, ((rx0, ry0), (rx1, ry1), max(1, int(5 * zoom)))))
+            out.append(("circle", self.color_shirt, ((rx1, ry1), max(1, int(4 * zoom)), 0)))
         else:
-            rx0 = center_x + int(18 * zoom)
+            rx0 = int(18 * zoom)
             ry0 = arm_y
-            rx1 = center_x + int(24 * zoom) + arm_swing_px
+            rx1 = int(24 * zoom) + arm_swing_px
             ry1 = arm_y + int(8 * zoom)
-            pygame.draw.line(surface, self.color_shirt, (rx0, ry0), (rx1, ry1), max(1, int(5 * zoom)))
-            pygame.draw.circle(surface, self.color_shirt, (rx1, ry1), max(1, int(4 * zoom)))
+            out.append(("line", self.color_shirt, ((rx0, ry0), (rx1, ry1), max(1, int(5 * zoom)))))
+            out.append(("circle", self.color_shirt, ((rx1, ry1), max(1, int(4 * zoom)), 0)))
 
-            lx0 = center_x - int(18 * zoom)
+            lx0 = -int(18 * zoom)
             ly0 = arm_y
-            lx1 = center_x - int(24 * zoom) - arm_swing_px
+            lx1 = -int(24 * zoom) - arm_swing_px
             ly1 = arm_y + int(8 * zoom)
-            pygame.draw.line(surface, self.color_shirt, (lx0, ly0), (lx1, ly1), max(1, int(5 * zoom)))
-            pygame.draw.circle(surface, self.color_shirt, (lx1, ly1), max(1, int(4 * zoom)))
+            out.append(("line", self.color_shirt, ((lx0, ly0), (lx1, ly1), max(1, int(5 * zoom)))))
+            out.append(("circle", self.color_shirt, ((lx1, ly1), max(1, int(4 * zoom)), 0)))
 
         # Legs with phase offset so they alternate vs arms
         leg_swing = math.sin(self.run_cycle * math.pi / 2 + math.pi / 2) * 4
         leg_swing_px = int(leg_swing * zoom)
 
-        llx0 = center_x - int(6 * zoom)
+        llx0 = -int(6 * zoom)
         lly0 = leg_y
-        llx1 = center_x - int(10 * zoom) - leg_swing_px
+        llx1 = -int(10 * zoom) - leg_swing_px
         lly1 = leg_y + int(14 * zoom)
-        pygame.draw.line(surface, self.color_shirt, (llx0, lly0), (llx1, lly1), max(1, int(5 * zoom)))
-        pygame.draw.circle(surface, self.color_shirt, (llx1, lly1), max(1, int(3 * zoom)))
+        out.append(("line", self.color_shirt, ((llx0, lly0), (llx1, lly1), max(1, int(5 * zoom)))))
+        out.append(("circle", self.color_shirt, ((llx1, lly1), max(1, int(3 * zoom)), 0)))
 
-        rlx0 = center_x + int(6 * zoom)
+        rlx0 = int(6 * zoom)
         rly0 = leg_y
-        rlx1 = center_x + int(10 * zoom) + leg_swing_px
+        rlx1 = int(10 * zoom) + leg_swing_px
         rly1 = leg_y + int(14 * zoom)
-        pygame.draw.line(surface, self.color_shirt, (rlx0, rly0), (rlx1, rly1), max(1, int(5 * zoom)))
-        pygame.draw.circle(surface, self.color_shirt, (rlx1, rly1), max(1, int(3 * zoom)))
+        out.append(("line", self.color_shirt, ((rlx0, rly0), (rlx1, rly1), max(1, int(5 * zoom)))))
+        out.append(("circle", self.color_shirt, ((rlx1, rly1), max(1, int(3 * zoom)), 0)))
 
-    def draw_jumping_pose(self, surface, center_x, center_y, zoom):
+    def _jumping_pose(self, out, zoom):
         # Arms up
-        lx0 = center_x - int(18 * zoom)
-        ly0 = center_y - int(5 * zoom)
-        lx1 = center_x - int(25 * zoom)
-        ly1 = center_y - int(15 * zoom)
-        pygame.draw.line(surface, self.color_shirt, (lx0, ly0), (lx1, ly1), max(1, int(5 * zoom)))
-        pygame.draw.circle(surface, self.color_shirt, (lx1, ly1), max(1, int(4 * zoom)))
-
-        rx0 = center_x + int(18 * zoom)
-        ry0 = center_y - int(5 * zoom)
-        rx1 = center_x + int(25 * zoom)
-        ry1 = center_y - int(15 * zoom)
-        pygame.draw.line(surface, self.color_shirt, (rx0, ry0), (rx1, ry1), max(1, int(5 * zoom)))
-        pygame.draw.circle(surface, self.color_shirt, (rx1, ry1), max(1, int(4 * zoom)))
+        lx0 = -int(18 * zoom)
+        ly0 = -int(5 * zoom)
+        lx1 = -int(25 * zoom)
+        ly1 = -int(15 * zoom)
+        out.append(("line", self.color_shirt, ((lx0, ly0), (lx1, ly1), max(1, int(5 * zoom)))))
+        out.append(("circle", self.color_shirt, ((lx1, ly1), max(1, int(4 * zoom)), 0)))
+
+        rx0 = int(18 * zoom)
+        ry0 = -int(5 * zoom)
+        rx1 = int(25 * zoom)
+        ry1 = -int(15 * zoom)
+        out.append(("line", self.color_shirt, ((rx0, ry0), (rx1, ry1), max(1, int(5 * zoom)))))
+        out.append(("circle", self.color_shirt, ((rx1, ry1), max(1, int(4 * zoom)), 0)))
 
         # Legs slightly tucked
-        leg_y = center_y + int(18 * zoom)
-        llx0 = center_x - int(6 * zoom)
+        leg_y = int(18 * zoom)
+        llx0 = -int(6 * zoom)
         lly0 = leg_y
-        llx1 = center_x - int(8 * zoom)
+        llx1 = -int(8 * zoom)
         lly1 = leg_y + int(8 * zoom)
-        pygame.draw.line(surface, self.color_shirt, (llx0, lly0), (llx1, lly1), max(1, int(5 * zoom)))
-        pygame.draw.circle(surface, self.color_shirt, (llx1, lly1), max(1, int(3 * zoom)))
+        out.append(("line", self.color_shirt, ((llx0, lly0), (llx1, lly1), max(1, int(5 * zoom)))))
+        out.append(("circle", self.color_shirt, ((llx1, lly1), max(1, int(3 * zoom)), 0)))
 
-        rlx0 = center_x + int(6 * zoom)
+        rlx0 = int(6 * zoom)
         rly0 = leg_y
-        rlx1 = center_x + int(8 * zoom)
+        rlx1 = int(8 * zoom)
         rly1 = leg_y + int(8 * zoom)
-        pygame.draw.line(surface, self.color_shirt, (rlx0, rly0), (rlx1, rly1), max(1, int(5 * zoom)))
-        pygame.draw.circle(surface, self.color_shirt, (rlx1, rly1), max(1, int(3 * zoom)))
+        out.append(("line", self.color_shirt, ((rlx0, rly0), (rlx1, rly1), max(1, int(5 * zoom)))))
+        out.append(("circle", self.color_shirt, ((rlx1, rly1), max(1, int(3 * zoom)), 0)))
 
 class Camera:
     """
     Improved camera system with simplified logic and smoother behavior.
     Automatically frames both players while respecting world boundaries.
     """
-    def __init__(self, ground_top):
+    def __init__(self, ground_top, map_width=MAP_WIDTH, width=SCREEN_WIDTH, height=SCREEN_HEIGHT, zoom_step=0):
         self.x = 0
         self.y = 0
         self.zoom = 1.0
         self.target_zoom = 1.0
         self.ground_top = ground_top  # y-coordinate of the top of the ground platform
+        self.map_width = map_width
+        self.width = width  # size of the view on screen
+        self.height = height
+        self.zoom_step = zoom_step  # when set, get_transform snaps the zoom to multiples of it
         
         # Smoothing parameters
         self.zoom_ease = 0.14
@@ -458,19 +820,18 @@ class Camera:
         self.target_x = 0
         self.target_y = 0
 
-    def update(self, player1, player2):
+    def update(self, *players):
         """
-        Update camera to frame both players smoothly.
+        Update camera to frame all players smoothly.
         
         Args:
-            player1: First player object
-            player2: Second player object
+            players: Player objects to keep in view (two or more)
         """
-        # 1. Calculate bounding box containing both players
-        left = min(player1.x, player2.x)
-        right = max(player1.x + player1.width, player2.x + player2.width)
-        top = min(player1.y, player2.y)
-        bottom = max(player1.y + player1.height, player2.y + player2.height)
+        # 1. Calculate bounding box containing all players
+        left = min(player.x for player in players)
+        right = max(player.x + player.width for player in players)
+        top = min(player.y for player in players)
+        bottom = max(player.y + player.height for player in players)
         
         # 2. Add comfortable margins around players
         margin_x = 160
@@ -484,8 +845,8 @@ class Camera:
         required_height = max(required_height, 300)
         
         # 3. Calculate zoom level to fit both dimensions
-        zoom_x = SCREEN_WIDTH / required_width
-        zoom_y = SCREEN_HEIGHT / required_height
+        zoom_x = self.width / required_width
+        zoom_y = self.height / required_height
         
         # Use the smaller zoom to ensure everything fits
         self.target_zoom = min(zoom_x, zoom_y)
@@ -493,8 +854,8 @@ class Camera:
         # Clamp zoom to reasonable limits and never show outside world bounds
         min_zoom_world = max(
             ZOOM_MIN,
-            SCREEN_WIDTH / MAP_WIDTH,
-            SCREEN_HEIGHT / max(self.ground_top, 1),
+            self.width / self.map_width,
+            self.height / max(self.ground_top, 1),
         )
         self.target_zoom = max(min_zoom_world, min(self.target_zoom, ZOOM_MAX))
         
@@ -503,7 +864,7 @@ class Camera:
         center_y = (top + bottom) / 2
         
         # 5. Apply vertical constraints to keep ground visible but allow a lower view
-        half_view_height = (SCREEN_HEIGHT / self.target_zoom) / 2
+        half_view_height = (self.height / self.target_zoom) / 2
 
         # Allow the camera bottom to sit lower so part of the ground platform stays visible
         visible_ground = GROUND_HEIGHT + 60  # ensure full ground is visible even at wide zooms
@@ -516,14 +877,14 @@ class Camera:
         
         # 6. Convert world center to camera position
         # Camera position is top-left corner in world space
-        self.target_x = center_x * self.target_zoom - SCREEN_WIDTH / 2
-        self.target_y = center_y * self.target_zoom - SCREEN_HEIGHT / 2
+        self.target_x = center_x * self.target_zoom - self.width / 2
+        self.target_y = center_y * self.target_zoom - self.height / 2
         # Shift camera view downward to reveal more ground
         self.target_y += 24
         
         # 7. Clamp camera to world boundaries
-        max_cam_x = max(0, MAP_WIDTH * self.target_zoom - SCREEN_WIDTH)
-        max_cam_y = max(0, self.ground_top * self.target_zoom - SCREEN_HEIGHT)
+        max_cam_x = max(0, self.map_width * self.target_zoom - self.width)
+        max_cam_y = max(0, self.ground_top * self.target_zoom - self.height)
         
         self.target_x = max(0, min(self.target_x, max_cam_x))
         self.target_y = max(0, min(self.target_y, max_cam_y))
@@ -535,7 +896,18 @@ class Camera:
 
     def get_transform(self):
         """Returns (zoom, camera_x, camera_y) for rendering."""
-        return self.zoom, self.x, self.y
+        if not self.zoom_step:
+            return self.zoom, self.x, self.y
+        # Snap down to a zoom bucket about the view centre, so the view only ever
+        # widens, at whole-pixel offsets so cached world tiles line up with
+        # everything drawn on top of them
+        zoom = round(max(1, math.floor(self.zoom / self.zoom_step + 1e-6)) * self.zoom_step, 6)
+        scale = zoom / self.zoom
+        x = (self.x + self.width / 2) * scale - self.width / 2
+        y = (self.y + self.height / 2) * scale - self.height / 2
+        x = min(x, self.map_width * zoom - self.width)
+        y = min(y, self.ground_top * zoom - self.height)
+        return zoom, max(0, round(x)), max(0, round(y))
     
     def world_to_screen(self, world_x, world_y):
         """Convert world coordinates to screen coordinates."""
@@ -549,20 +921,1798 @@ class Camera:
         world_y = (screen_y + self.y) / self.zoom
         return world_x, world_y
 
-class GameState(Enum):
-    PLAYING = 1
-    GAME_OVER_P1 = 2
-    GAME_OVER_P2 = 3
+# Per map type: (platforms per chunk, width range, height, y range, x/y padding)
+CHUNK_STYLES = {
+    "default": (13, (150, 320), 44,
+                (140 + PLATFORM_Y_OFFSET, MAP_HEIGHT - GROUND_HEIGHT - 260 + PLATFORM_Y_OFFSET), (50, 120)),
+    "floating": (10, (120, 280), 40,
+                 (120 + PLATFORM_Y_OFFSET, MAP_HEIGHT - 340 + PLATFORM_Y_OFFSET), (60, 140)),
+    "narrow": (8, (90, 160), 30,
+               (120 + PLATFORM_Y_OFFSET, MAP_HEIGHT - 340 + PLATFORM_Y_OFFSET), (50, 120)),
+}
+
+
+class ChunkedWorld:
+    """Platforms for maps far wider than MAP_WIDTH, generated chunk by chunk.
+
+    Each CHUNK_WIDTH-wide chunk is generated on demand from (seed, chunk
+    index), so an evicted chunk comes back identical. Only chunks near the
+    camera and the players are resident; beyond max_chunks the least
+    recently used ones are dropped. Collision, drawing and portal spawning
+    only ever see the active list.
+    """
+    def __init__(self, seed, width, map_type="default", max_chunks=MAX_RESIDENT_CHUNKS):
+        self.seed = seed
+        self.width = width
+        self.map_type = map_type if map_type in CHUNK_STYLES else "default"
+        self.max_chunks = max_chunks
+        self.num_chunks = math.ceil(width / CHUNK_WIDTH)
+        self.chunks = collections.OrderedDict()  # chunk index -> platforms, LRU order
+        self.active_keys = ()
+        self.active = []
+        self.generated = 0
+
+    def _generate(self, cx):
+        rng = random.Random(self.seed * 1000003 + cx)
+        left = cx * CHUNK_WIDTH
+        right = min(self.width, left + CHUNK_WIDTH)
+        platforms = [Platform(left, MAP_HEIGHT - GROUND_HEIGHT, right - left, GROUND_HEIGHT)]
+        target, (min_w, max_w), height, (min_y, max_y), (pad_x, pad_y) = CHUNK_STYLES[self.map_type]
+        # Keep half the padding off each chunk edge so neighbours never crowd each other
+        edge = pad_x // 2
+        attempts = 0
+        while len(platforms) - 1 < target and attempts < target * 30:
+            attempts += 1
+            w = rng.randint(min_w, max_w)
+            if right - left < w + 2 * edge:
+                break
+            x = rng.randint(left + edge, right - w - edge)
+            y = rng.randint(min_y, max_y)
+            candidate = Platform(x, y, w, height)
+            padded = candidate.rect.inflate(pad_x * 2, pad_y * 2)
+            if not any(padded.colliderect(existing.rect) for existing in platforms):
+                platforms.append(candidate)
+        return platforms
+
+    def refresh(self, spans):
+        """Make chunks overlapping the given (x0, x1) spans resident, plus one
+        chunk either side, and return the active platform list."""
+        keys = set()
+        for x0, x1 in spans:
+            first = max(0, int(x0 // CHUNK_WIDTH) - 1)
+            last = min(self.num_chunks - 1, int(x1 // CHUNK_WIDTH) + 1)
+            keys.update(range(first, last + 1))
+        keys = tuple(sorted(keys))
+
+        for cx in keys:
+            if cx in self.chunks:
+                self.chunks.move_to_end(cx)
+            else:
+                self.chunks[cx] = self._generate(cx)
+                self.generated += 1
+        # Active chunks were just moved to the end, so LRU eviction never drops them
+        while len(self.chunks) > max(self.max_chunks, len(keys)):
+            self.chunks.popitem(last=False)
+
+        if keys != self.active_keys:
+            self.active_keys = keys
+            self.active = [platform for cx in keys for platform in self.chunks[cx]]
+        return self.active
+
+
+# ==================== MAP GENERATION ====================
+# Generators, reachability analysis and the collision index live in tag_core;
+# the game builds the same layouts out of its drawable platform classes.
+class MapQueue:
+    """Ready-to-use layouts per map type, generated ahead on a background thread.
+
+    Each entry is (platforms, MapReport, PlatformGrid). Every map type
+    draws its seeds from its own RNG stream and entries are handed out in
+    generation order, so a seed yields the same maps whether they were
+    made ahead or on demand. The worker only runs while set_active(True),
+    i.e. while menus are shown, so it never competes with gameplay.
+    """
+    def __init__(self, config, background=True, depth=MAP_QUEUE_DEPTH):
+        self.config = config
+        self.depth = depth
+        self.rngs = {map_type: config.rng(f"map:{map_type}") for map_type in MAP_GENERATORS}
+        self.ready = {map_type: collections.deque() for map_type in MAP_GENERATORS}
+        self.condition = threading.Condition()
+        self.generate_lock = threading.Lock()  # keeps each stream's entries in seed order
+        self.active = False
+        self.closed = False
+        self.hits = 0
+        self.misses = 0
+        self.worker = None
+        if background:
+            self.worker = threading.Thread(target=self._fill, name="map-queue", daemon=True)
+            self.worker.start()
+
+    def _generate(self, map_type):
+        return build_map(self.config, map_type, self.rngs[map_type], Platform, MovingPlatform)
+
+    def take(self, map_type):
+        """Pop the next layout for a map type, generating it now if none is ready."""
+        map_type = map_type if map_type in MAP_GENERATORS else "default"
+        with self.condition:
+            if self.ready[map_type]:
+                self.hits += 1
+                self.condition.notify()
+                return self.ready[map_type].popleft()
+        with self.generate_lock:
+            # The worker may have finished one while we waited for the lock
+            with self.condition:
+                if self.ready[map_type]:
+                    self.hits += 1
+                    self.condition.notify()
+                    return self.ready[map_type].popleft()
+            self.misses += 1
+            return self._generate(map_type)
+
+    def needs(self, map_type):
+        return len(self.ready[map_type]) < self.depth
+
+    def prepare(self, map_type):
+        """Generate one layout for map_type now, unless depth are already ready."""
+        with self.generate_lock:
+            if not self.needs(map_type):
+                return
+            entry = self._generate(map_type)
+            with self.condition:
+                self.ready[map_type].append(entry)
+
+    def set_active(self, active):
+        if active != self.active:
+            with self.condition:
+                self.active = active
+                self.condition.notify()
+
+    def _next_type(self):
+        map_type = min(self.ready, key=lambda name: len(self.ready[name]))
+        return map_type if len(self.ready[map_type]) < self.depth else None
+
+    def _fill(self):
+        while True:
+            with self.condition:
+                while not self.closed and not (self.active and self._next_type()):
+                    self.condition.wait()
+                if self.closed:
+                    return
+                map_type = self._next_type()
+            with self.generate_lock:
+                entry = self._generate(map_type)
+                with self.condition:
+                    self.ready[map_type].append(entry)
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        if self.worker:
+            self.worker.join()
+
+
+# ==================== FRAME PACING ====================
+class FramePacer:
+    """Presents frames at a fixed rate against absolute deadlines.
+
+    Most of each wait is slept; the last PACER_SPIN_SECONDS are spun
+    (yielding the GIL), because OS sleeps overshoot by more than a frame
+    can afford. The render rate may differ from the simulation's FPS;
+    sim_steps() says how many fixed steps are due each frame. With vsync
+    the flip already blocks, so the pacer only measures - unless flips
+    turn out not to block, in which case it paces in software after all.
+    Every interval lands in a PACER_BIN_MS histogram.
+    """
+    def __init__(self, rate=FPS, vsync=False, spin=PACER_SPIN_SECONDS):
+        self.rate = rate
+        self.period = 1.0 / rate
+        self.vsync = vsync
+        self.spin = spin
+        self.deadline = None
+        self.last_wake = None
+        self.sim_accumulator = 0.0
+        self.fast_flips = 0
+        self.histogram = collections.Counter()  # interval bin -> frames
+        self.frames = 0
+        self.missed = 0
+
+    def sim_steps(self):
+        """Fixed FPS simulation steps due this render frame (always 1 when the rates match)."""
+        self.sim_accumulator += FPS / self.rate
+        steps = int(self.sim_accumulator)
+        self.sim_accumulator -= steps
+        return steps
+
+    def wait(self):
+        """Block until the next frame deadline and record the interval."""
+        now = time.perf_counter()
+        if self.deadline is None or now > self.deadline + self.period:
+            # First frame, or more than a frame behind: re-anchor instead of bursting
+            if self.deadline is not None:
+                self.missed += 1
+            self.deadline = now + self.period
+        elif now > self.deadline:
+            self.missed += 1
+        if not self.vsync:
+            remaining = self.deadline - now
+            if remaining > self.spin:
+                time.sleep(remaining - self.spin)
+            while time.perf_counter() < self.deadline:
+                time.sleep(0)
+        wake = time.perf_counter()
+        if self.last_wake is not None:
+            interval = wake - self.last_wake
+            self.histogram[int(interval * 1000 / PACER_BIN_MS)] += 1
+            self.frames += 1
+            if self.vsync:
+                self.fast_flips = self.fast_flips + 1 if interval < self.period / 2 else 0
+                if self.fast_flips > FPS:
+                    self.vsync = False  # flip isn't blocking on this driver
+        self.last_wake = wake
+        self.deadline += self.period
+
+    def pause(self):
+        """Forget the schedule, e.g. while menus run, so resuming isn't a missed deadline."""
+        self.deadline = None
+        self.last_wake = None
+
+    def percentile(self, fraction):
+        """Frame interval in ms at the given fraction of recorded frames."""
+        target = fraction * self.frames
+        seen = 0
+        for bin_index in sorted(self.histogram):
+            seen += self.histogram[bin_index]
+            if seen >= target:
+                return (bin_index + 0.5) * PACER_BIN_MS
+        return 0.0
+
+    def summary(self):
+        if not self.frames:
+            return "no paced frames recorded"
+        return (f"{self.frames} frames at {self.rate} Hz{' (vsync)' if self.vsync else ''}: "
+                f"interval p50 {self.percentile(0.5):.2f} ms, p99 {self.percentile(0.99):.2f} ms "
+                f"(target {self.period * 1000:.2f} ms), {self.missed} missed deadlines")
+
+
+# ==================== PARTICLES ====================
+# Per effect: (color, radius, life frames, speed range, angle range, gravity, position jitter,
+# glow). Glowing effects are additive GlowCache textures that dim as they die.
+PARTICLE_STYLES = {
+    "dust": ((190, 175, 150), 4, (14, 26), (0.5, 2.5), (math.pi, math.tau), 0.12, 12, False),
+    "trail": ((255, 255, 255), 3, (8, 14), (0.0, 0.6), (0.0, math.tau), 0.0, 8, False),
+    "tag": ((255, 90, 90), 5, (20, 40), (2.0, 7.0), (0.0, math.tau), 0.2, 4, True),
+    "portal": ((170, 110, 255), 5, (25, 45), (2.0, 8.0), (0.0, math.tau), 0.05, 10, True),
+}
+PARTICLE_KINDS = list(PARTICLE_STYLES)
+PARTICLE_FADE_LEVELS = 6  # sizes a particle shrinks through as it dies; one cached sprite each
+
+
+class ParticleSystem:
+    """Fixed-capacity particle pool stored in NumPy arrays.
+
+    Particles live in preallocated per-field arrays; a stack of free slots
+    hands them out and takes them back, so nothing is allocated per
+    particle. update() integrates and retires the whole pool with array
+    operations, capture() copies the live ones out for a RenderSnapshot,
+    and draw() blits them in batched Surface.blits calls from sprites cached
+    per kind, size step and zoom step: colorkeyed discs, or additive glow
+    textures for glowing effects. Emits beyond the budget are dropped.
+    """
+    def __init__(self, capacity=PARTICLE_BUDGET, seed=None):
+        self.capacity = capacity
+        self.x = numpy.zeros(capacity, numpy.float32)
+        self.y = numpy.zeros(capacity, numpy.float32)
+        self.vx = numpy.zeros(capacity, numpy.float32)
+        self.vy = numpy.zeros(capacity, numpy.float32)
+        self.gravity = numpy.zeros(capacity, numpy.float32)
+        self.life = numpy.zeros(capacity, numpy.float32)
+        self.max_life = numpy.ones(capacity, numpy.float32)
+        self.kind = numpy.zeros(capacity, numpy.int32)
+        self.alive = numpy.zeros(capacity, bool)
+        self.free = numpy.arange(capacity - 1, -1, -1, dtype=numpy.int32)  # stack of free slots
+        self.free_count = capacity
+        self.rng = numpy.random.default_rng(seed)
+        self.sprites = {}  # zoom step -> (sprites, half sizes, additive flags) indexed by kind * levels + level
+        self.dropped = 0
+
+    @property
+    def live(self):
+        return self.capacity - self.free_count
+
+    def emit(self, kind, x, y, count, vx=0.0, vy=0.0):
+        """Spawn up to `count` particles of an effect around (x, y), inheriting (vx, vy)."""
+        n = min(count, self.free_count)
+        self.dropped += count - n
+        if n <= 0:
+            return
+        slots = self.free[self.free_count - n:self.free_count]
+        self.free_count -= n
+        _, _, (life_min, life_max), (speed_min, speed_max), (angle_min, angle_max), gravity, jitter, _ = \
+            PARTICLE_STYLES[kind]
+        rng = self.rng
+        angle = rng.uniform(angle_min, angle_max, n)
+        speed = rng.uniform(speed_min, speed_max, n)
+        life = rng.uniform(life_min, life_max, n)
+        self.x[slots] = x + rng.uniform(-jitter, jitter, n)
+        self.y[slots] = y + rng.uniform(-jitter, jitter, n)
+        self.vx[slots] = numpy.cos(angle) * speed + vx
+        self.vy[slots] = numpy.sin(angle) * speed + vy
+        self.gravity[slots] = gravity
+        self.life[slots] = life
+        self.max_life[slots] = life
+        self.kind[slots] = PARTICLE_KINDS.index(kind)
+        self.alive[slots] = True
+
+    def update(self):
+        """Advance every particle one frame and return expired ones to the pool."""
+        if self.free_count == self.capacity:
+            return
+        # Dead slots are integrated too; that is cheaper than gathering the live ones
+        self.vy += self.gravity
+        self.x += self.vx
+        self.y += self.vy
+        self.life -= 1
+        expired = numpy.flatnonzero(self.alive & (self.life <= 0))
+        if len(expired):
+            self.alive[expired] = False
+            self.free[self.free_count:self.free_count + len(expired)] = expired
+            self.free_count += len(expired)
+
+    def capture(self):
+        """(x, y, sprite index) arrays for the live particles, copied for a RenderSnapshot."""
+        live = numpy.flatnonzero(self.alive)
+        fade = (self.life[live] / self.max_life[live] * PARTICLE_FADE_LEVELS).astype(numpy.int32)
+        sprite = self.kind[live] * PARTICLE_FADE_LEVELS + numpy.clip(fade, 0, PARTICLE_FADE_LEVELS - 1)
+        return self.x[live], self.y[live], sprite
+
+    def _sprite_set(self, zoom, glow_cache):
+        step = max(1, round(zoom * 4))
+        if step not in self.sprites:
+            sprites, halves, additive = [], [], []
+            for color, radius, *_, glow in PARTICLE_STYLES.values():
+                for level in range(PARTICLE_FADE_LEVELS):
+                    fraction = (level + 1) / PARTICLE_FADE_LEVELS
+                    if glow:
+                        # Additive glows fade by dimming, which costs nothing extra to blit
+                        sprite = glow_cache.texture(color, radius * 2 * step / 4, fraction)
+                        size = sprite.get_width() // 2
+                    else:
+                        # Discs shrink as they die; surface alpha would make every blit ~3x slower
+                        size = max(1, round(radius * step / 4 * fraction))
+                        sprite = pygame.Surface((size * 2, size * 2))
+                        if pygame.display.get_surface():
+                            sprite = sprite.convert()
+                        sprite.fill(BLACK)
+                        pygame.draw.circle(sprite, color, (size, size), size)
+                        sprite.set_colorkey(BLACK, pygame.RLEACCEL)
+                    sprites.append(sprite)
+                    halves.append(size)
+                    additive.append(glow)
+            self.sprites[step] = (sprites, numpy.array(halves, numpy.float32), numpy.array(additive))
+        return self.sprites[step]
+
+    def draw(self, surface, frame, zoom, cam_x, cam_y, glow_cache):
+        """Blit captured particles in batches, culling those off screen; glows go on top."""
+        xs, ys, sprite_ids = frame
+        if not len(xs):
+            return
+        sprites, halves, additive = self._sprite_set(zoom, glow_cache)
+        half = halves[sprite_ids]
+        sx = (xs * zoom - cam_x - half).astype(numpy.int32)
+        sy = (ys * zoom - cam_y - half).astype(numpy.int32)
+        width, height = surface.get_size()
+        visible = (sx > -2 * half) & (sx < width) & (sy > -2 * half) & (sy < height)
+        glowing = additive[sprite_ids]
+        solid = visible & ~glowing
+        surface.blits(zip(map(sprites.__getitem__, sprite_ids[solid].tolist()),
+                          zip(sx[solid].tolist(), sy[solid].tolist())), doreturn=False)
+        glowing &= visible
+        if glowing.any():
+            surface.blits(((sprites[i], (x, y), None, pygame.BLEND_ADD) for i, x, y in
+                           zip(sprite_ids[glowing].tolist(), sx[glowing].tolist(), sy[glowing].tolist())),
+                          doreturn=False)
+
+
+def create_particles(headless, budget=PARTICLE_BUDGET, seed=None):
+    """A ParticleSystem, or None when headless, without NumPy or with no budget."""
+    if headless or numpy is None or budget <= 0:
+        return None
+    return ParticleSystem(budget, seed)
+
+
+# ==================== AUDIO ====================
+# Per gameplay event: (priority, start Hz, end Hz, seconds, waveform). Higher
+# priority voices may steal channels from lower ones when all are busy.
+SOUND_EFFECTS = {
+    "jump": (1, 320, 640, 0.12, "square"),
+    "dash": (2, 900, 180, 0.18, "noise"),
+    "tag": (3, 520, 1040, 0.25, "square"),
+    "portal_touch": (3, 200, 1200, 0.45, "sine"),
+    "match_end": (4, 660, 330, 0.6, "sine"),
+}
+
+
+def synthesize_effect(rate, channels, start_hz, end_hz, seconds, waveform, seed=0):
+    """Render a swept tone into signed 16-bit interleaved PCM with a short fade out."""
+    samples = array.array("h")
+    rng = random.Random(seed)
+    count = int(rate * seconds)
+    phase = 0.0
+    noise = 0.0
+    for i in range(count):
+        t = i / count
+        phase += (start_hz + (end_hz - start_hz) * t) / rate
+        if waveform == "square":
+            value = 1.0 if phase % 1.0 < 0.5 else -1.0
+        elif waveform == "noise":
+            if phase >= 1.0:  # sample-and-hold noise, pitched by the sweep
+                phase -= 1.0
+                noise = rng.uniform(-1.0, 1.0)
+            value = noise
+        else:
+            value = math.sin(phase * math.tau)
+        envelope = min(1.0, i / 64) * (1.0 - t) ** 2
+        sample = int(value * envelope * 12000)
+        samples.extend([sample] * channels)
+    return samples
+
+
+class NullAudio:
+    """Audio backend that plays nothing, for headless and batch games."""
+    def __init__(self):
+        self.played = collections.Counter()
+
+    def play(self, kind):
+        self.played[kind] += 1
+
+    def close(self):
+        pass
+
+    def summary(self):
+        return f"audio disabled; {sum(self.played.values())} effects triggered"
+
+
+class AudioEngine(NullAudio):
+    """Pooled sound effects for gameplay events.
+
+    Effects are synthesized into in-memory Sounds on a background thread
+    at startup; until one is ready its events are skipped. play() never
+    waits: it starts the effect on a free channel of a fixed pool, steals
+    the oldest voice of lower or equal priority when all are busy, and
+    otherwise drops the effect.
+    """
+    def __init__(self, channels=AUDIO_CHANNELS, volume=AUDIO_VOLUME):
+        super().__init__()
+        self.rate, size, self.output_channels = pygame.mixer.get_init()
+        if size != -16:
+            raise ValueError(f"mixer sample size {size} is not signed 16-bit")
+        pygame.mixer.set_num_channels(channels)
+        self.channels = [pygame.mixer.Channel(index) for index in range(channels)]
+        self.voices = [(0, 0.0)] * channels  # (priority, start time) last started per channel
+        self.volume = volume
+        self.sounds = {}
+        self.stolen = 0
+        self.dropped = 0
+        self.loader = threading.Thread(target=self._load, name="audio-load", daemon=True)
+        self.loader.start()
+
+    def _load(self):
+        for kind, (_, start_hz, end_hz, seconds, waveform) in SOUND_EFFECTS.items():
+            pcm = synthesize_effect(self.rate, self.output_channels, start_hz, end_hz, seconds, waveform)
+            sound = pygame.mixer.Sound(buffer=pcm.tobytes())
+            sound.set_volume(self.volume)
+            self.sounds[kind] = sound
+
+    def play(self, kind):
+        super().play(kind)
+        sound = self.sounds.get(kind)
+        if sound is None:
+            return
+        priority = SOUND_EFFECTS[kind][0]
+        free = [index for index, channel in enumerate(self.channels) if not channel.get_busy()]
+        if free:
+            index = free[0]
+        else:
+            index = min(range(len(self.channels)), key=lambda i: self.voices[i])
+            if self.voices[index][0] > priority:
+                self.dropped += 1
+                return
+            self.stolen += 1
+        self.channels[index].play(sound)
+        self.voices[index] = (priority, time.perf_counter())
+
+    def close(self):
+        self.loader.join()
+        for channel in self.channels:
+            channel.stop()
+
+    def summary(self):
+        return (f"audio: {sum(self.played.values())} effects triggered, "
+                f"{self.stolen} voices stolen, {self.dropped} dropped")
+
+
+def create_audio(headless):
+    """The real audio engine when a mixer is available, otherwise NullAudio."""
+    if headless or not pygame.mixer.get_init():
+        return NullAudio()
+    try:
+        return AudioEngine()
+    except (ValueError, pygame.error):
+        return NullAudio()
+
+
+# ==================== TELEMETRY ====================
+# Positional fields recorded for each event kind. Events are stored and written
+# as [time, kind, *fields]; every log file starts with this schema.
+TELEMETRY_SCHEMA = {
+    "tag": ("it_player", "x", "y"),
+    "portal_touch": ("player", "upside_down"),
+    "portal_spawn": ("x", "y"),
+    "dash": ("player", "x", "y"),
+    "jump": ("player", "x", "y", "jumps_left"),
+    "map": ("map_type",),
+    "match_end": ("winner", "p1_tag_time", "p2_tag_time", "tags", "portal_uses"),
+    "frames": ("count", "mean_ms", "max_ms"),
+}
+TELEMETRY_KINDS = list(TELEMETRY_SCHEMA)
+MAP_CODES = {"default": 0, "floating": 1, "narrow": 2}
+
+
+class Telemetry:
+    """Buffered gameplay event stream written to rotating local logs.
+
+    emit() only appends a tuple to a deque, so the frame loop never touches
+    the disk. A daemon thread drains the deque every flush_interval seconds,
+    encodes the events and writes them to telemetry-NNNN.jsonl (or .bin),
+    starting a new file once max_bytes is reached and keeping max_files.
+    Numbering continues after the highest file already in the directory, so
+    a new session never overwrites an earlier one's logs.
+
+    The binary format is a JSON schema line followed by records of
+    <float64 time, uint8 kind index, uint8 field count, float32 fields...>.
+    """
+    def __init__(self, directory, binary=False, max_bytes=4 * 1024 * 1024,
+                 max_files=8, flush_interval=0.5, max_buffered=100000):
+        self.directory = directory
+        self.binary = binary
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.flush_interval = flush_interval
+        # Bounded so a stalled disk drops old events instead of growing forever
+        self.events = collections.deque(maxlen=max_buffered)
+        self.start = time.perf_counter()
+        self.file = None
+        self.file_bytes = 0
+
+        # Per-second frame time summary, accumulated on the frame thread
+        self.frame_count = 0
+        self.frame_total = 0.0
+        self.frame_max = 0.0
+        self.frame_window_start = self.start
+
+        os.makedirs(directory, exist_ok=True)
+        self.file_index = self._last_index()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._writer_loop, name="telemetry", daemon=True)
+        self.thread.start()
+
+    def emit(self, kind, *fields):
+        self.events.append((time.perf_counter() - self.start, kind, fields))
+
+    def frame(self, frame_seconds):
+        """Fold one frame time into the running summary; emits once per second."""
+        self.frame_count += 1
+        self.frame_total += frame_seconds
+        if frame_seconds > self.frame_max:
+            self.frame_max = frame_seconds
+        now = time.perf_counter()
+        if now - self.frame_window_start >= 1.0:
+            self.emit("frames", self.frame_count,
+                      round(self.frame_total / self.frame_count * 1000.0, 3),
+                      round(self.frame_max * 1000.0, 3))
+            self.frame_count = 0
+            self.frame_total = 0.0
+            self.frame_max = 0.0
+            self.frame_window_start = now
+
+    def close(self):
+        """Stop the writer thread after it has flushed everything buffered."""
+        self.stop_event.set()
+        self.thread.join()
+
+    def _writer_loop(self):
+        while not self.stop_event.wait(self.flush_interval):
+            self._flush()
+        self._flush()
+        if self.file:
+            self.file.close()
+
+    def _flush(self):
+        if not self.events:
+            return
+        chunks = []
+        while self.events:
+            chunks.append(self._encode(self.events.popleft()))
+        data = b"".join(chunks)
+        if self.file is None or self.file_bytes + len(data) > self.max_bytes:
+            self._rotate()
+        self.file.write(data)
+        self.file.flush()
+        self.file_bytes += len(data)
+
+    def _encode(self, event):
+        t, kind, fields = event
+        if self.binary:
+            return struct.pack(f"<dBB{len(fields)}f", t, TELEMETRY_KINDS.index(kind), len(fields), *fields)
+        return (json.dumps([round(t, 4), kind, *fields], separators=(",", ":")) + "\n").encode()
+
+    def _last_index(self):
+        """Highest telemetry-NNNN number already in the directory, or 0."""
+        extension = "bin" if self.binary else "jsonl"
+        last = 0
+        for name in os.listdir(self.directory):
+            stem, _, suffix = name.partition(".")
+            if suffix == extension and stem.startswith("telemetry-") and stem[10:].isdigit():
+                last = max(last, int(stem[10:]))
+        return last
+
+    def _rotate(self):
+        if self.file:
+            self.file.close()
+        self.file_index += 1
+        extension = "bin" if self.binary else "jsonl"
+        path = os.path.join(self.directory, f"telemetry-{self.file_index:04d}.{extension}")
+        self.file = open(path, "wb")
+        header = (json.dumps({"schema": TELEMETRY_SCHEMA, "kinds": TELEMETRY_KINDS,
+                              "maps": MAP_CODES}) + "\n").encode()
+        self.file.write(header)
+        self.file_bytes = len(header)
+        stale = self.file_index - self.max_files
+        if stale > 0:
+            old = os.path.join(self.directory, f"telemetry-{stale:04d}.{extension}")
+            if os.path.exists(old):
+                os.remove(old)
+
+# ==================== HEATMAPS ====================
+HEATMAP_IMAGE_SCALE = 4     # image pixels per cell side
+# Image colour per layer; layers are log-scaled and added together
+HEATMAP_COLORS = ((255, 60, 40), (40, 110, 255), (255, 255, 120))
+
+
+class Heatmap(heatmaps.Heatmap):
+    """A heatmaps.Heatmap that also exports its layers as PNG images."""
+    def render(self, key):
+        """RGBA bytes and size of one map's layers, log-scaled and blended."""
+        self.flush()
+        grid = self.grids[key]
+        rgb = numpy.zeros((self.rows, self.cols, 3), numpy.float32)
+        for layer, color in zip(grid, HEATMAP_COLORS):
+            peak = layer.max()
+            if peak:
+                weight = numpy.log1p(layer) / numpy.log1p(peak)
+                rgb += weight[:, :, None] * numpy.array(color, numpy.float32)
+        pixels = numpy.full((self.rows, self.cols, 4), 255, numpy.uint8)
+        pixels[:, :, :3] = numpy.minimum(rgb, 255)
+        pixels = pixels.repeat(HEATMAP_IMAGE_SCALE, 0).repeat(HEATMAP_IMAGE_SCALE, 1)
+        return pixels.tobytes(), (self.cols * HEATMAP_IMAGE_SCALE, self.rows * HEATMAP_IMAGE_SCALE)
+
+    def save_images(self, path):
+        """Write one PNG per recorded map type: heat.png becomes heat-default.png etc."""
+        stem, extension = os.path.splitext(path)
+        written = []
+        for key, frames in self.frames.items():
+            if not frames:
+                continue
+            pixels, size = self.render(key)
+            target = f"{stem}-{key}{extension or '.png'}"
+            with open(target, "wb") as f:
+                f.write(encode_png(pixels, size, "RGBA"))
+            written.append(target)
+        return written
+
+
+def write_heatmap(heatmap, path=None, image_path=None):
+    """Fold heatmap into the archive at path (if any) and export images of the total."""
+    if path:
+        if os.path.exists(path):
+            total = Heatmap.load(path)
+            total.merge(heatmap)
+            heatmap = total
+        heatmap.save(path)
+    if image_path:
+        for written in heatmap.save_images(image_path):
+            print(f"wrote {written}")
+    print(heatmap.summary())
+
+
+def merge_heatmaps(paths, target, image_path=None):
+    """Merge saved heatmaps from several runs into target."""
+    merged = Heatmap.load(paths[0])
+    for path in paths[1:]:
+        merged.merge(Heatmap.load(path))
+    write_heatmap(merged, target, image_path)
+
+
+# ==================== FRAME CAPTURE ====================
+# Byte orders Surface.get_buffer() can be copied as, keyed by 32-bit (R, G, B) masks
+CAPTURE_PIXEL_FORMATS = {
+    (0xFF0000, 0xFF00, 0xFF): "BGRA",
+    (0xFF, 0xFF00, 0xFF0000): "RGBA",
+}
+
+
+def encode_png(pixels, size, pixel_format, level=3):
+    """Encode 32-bit pixels (BGRA or RGBA, tightly packed) as an RGB PNG.
+
+    Channels are reordered one row at a time and compressed with zlib,
+    which releases the GIL, so encoder threads only hold it in short bursts.
+    """
+    width, height = size
+    src_stride = width * 4
+    row = width * 3 + 1  # each scanline starts with filter type 0
+    red, blue = (2, 0) if pixel_format == "BGRA" else (0, 2)
+    scanlines = bytearray(row * height)
+    for y in range(height):
+        src = y * src_stride
+        dst = y * row + 1
+        scanlines[dst:dst + row - 1:3] = pixels[src + red:src + src_stride:4]
+        scanlines[dst + 1:dst + row - 1:3] = pixels[src + 1:src + src_stride:4]
+        scanlines[dst + 2:dst + row - 1:3] = pixels[src + blue:src + src_stride:4]
+
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(scanlines, level))
+            + chunk(b"IEND", b""))
+
+
+class FrameCapture:
+    """Records presented frames to a PNG sequence or one raw video file.
+
+    capture() copies the frame's pixels into the next free buffer of a
+    preallocated ring (a single copy straight from the surface buffer)
+    and hands it to a thread pool for encoding. When every buffer is
+    still waiting on an encoder the frame is dropped rather than making
+    the game wait. Raw output is written by one worker in frame order,
+    with a capture.json describing the layout: the presentation rate,
+    the indexes of dropped frames and each written frame's capture time
+    in seconds since the first (play pauses while menus are up, so the
+    rate alone can't place every frame).
+    """
+    def __init__(self, directory, raw=False, workers=2, buffers=8, size=(SCREEN_WIDTH, SCREEN_HEIGHT),
+                 rate=FPS):
+        self.directory = directory
+        self.raw = raw
+        self.size = size
+        self.rate = rate  # frames presented per second while playing
+        self.buffers = [bytearray(size[0] * size[1] * 4) for _ in range(buffers)]
+        self.free = collections.deque(range(buffers))  # indexes of idle buffers
+        self.pixel_format = None
+        self.frames = 0       # frames offered to capture()
+        self.dropped = 0
+        self.dropped_frames = []       # indexes of dropped frames
+        self.times = array.array("d")  # perf_counter time of every frame offered
+        self.written = 0
+        self.overhead_total = 0.0
+        self.overhead_max = 0.0
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.raw_file = open(os.path.join(directory, "capture.raw"), "wb") if raw else None
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1 if raw else workers, thread_name_prefix="capture")
+
+    def capture(self, surface):
+        start = time.perf_counter()
+        index = self.frames
+        self.frames += 1
+        self.times.append(start)
+        try:
+            slot = self.free.popleft()
+        except IndexError:
+            self.dropped += 1
+            self.dropped_frames.append(index)
+        else:
+            buffer = self.buffers[slot]
+            pixel_format = CAPTURE_PIXEL_FORMATS.get(surface.get_masks()[:3])
+            if (pixel_format and surface.get_bitsize() == 32
+                    and surface.get_pitch() == self.size[0] * 4 and surface.get_size() == self.size):
+                memoryview(buffer)[:] = surface.get_buffer()
+            else:
+                # Padded or non 32-bit surfaces go through a converting copy
+                pixel_format = "RGBA"
+                buffer[:] = pygame.image.tostring(pygame.transform.scale(surface, self.size), "RGBA")
+            self.pixel_format = pixel_format
+            self.executor.submit(self._encode, slot, index, pixel_format)
+        elapsed = time.perf_counter() - start
+        self.overhead_total += elapsed
+        self.overhead_max = max(self.overhead_max, elapsed)
+
+    def _encode(self, slot, index, pixel_format):
+        try:
+            if self.raw:
+                self.raw_file.write(self.buffers[slot])
+            else:
+                data = encode_png(self.buffers[slot], self.size, pixel_format)
+                with open(os.path.join(self.directory, f"frame-{index:06d}.png"), "wb") as f:
+                    f.write(data)
+            with self.lock:
+                self.written += 1
+        finally:
+            self.free.append(slot)
+
+    def close(self):
+        """Wait for queued frames to be encoded and finish the output."""
+        self.executor.shutdown(wait=True)
+        if self.raw_file:
+            self.raw_file.close()
+            dropped = set(self.dropped_frames)
+            first = self.times[0] if self.times else 0.0
+            timestamps = [round(t - first, 6) for index, t in enumerate(self.times) if index not in dropped]
+            with open(os.path.join(self.directory, "capture.json"), "w") as f:
+                json.dump({"width": self.size[0], "height": self.size[1],
+                           "pixel_format": self.pixel_format or "BGRA", "fps": self.rate,
+                           "frames": self.written, "dropped": self.dropped_frames,
+                           "timestamps": timestamps}, f)
+
+    def summary(self):
+        mean = self.overhead_total / max(1, self.frames) * 1000.0
+        return (f"Frame capture: {self.written}/{self.frames} frames written, {self.dropped} dropped; "
+                f"capture overhead {mean:.3f} ms/frame mean, {self.overhead_max * 1000.0:.3f} ms max")
+
+# ==================== RENDER SNAPSHOTS ====================
+class RenderSnapshot:
+    """Everything SnapshotRenderer.draw needs for one gameplay frame, copied out of the simulation.
+
+    Snapshots are reused rather than reallocated: capture() overwrites the
+    player poses and fields in place. While the renderer holds a snapshot
+    nothing writes to it, so drawing never sees a half-updated frame.
+    """
+    def __init__(self):
+        self.players = []      # Player-shaped copies; Player.draw works on them unchanged
+        self.portal = Portal(0, 0, 0, 0)
+        self.portal_visible = False
+        self.portal_alpha = 1.0
+        self.winner = None
+        self.platforms = []
+        self.moving_platforms = []  # copies of the moving ones, positioned for this frame
+        self.particles = None  # ParticleSystem.capture() arrays, if the game has particles
+        self.views = None  # [(viewport, transform)] while the screen is split
+        self.input_seq = 0  # threaded mode: the sampled input this frame's step consumed
+
+    def capture(self, game):
+        while len(self.players) < len(game.players):
+            self.players.append(object.__new__(Player))
+        del self.players[len(game.players):]
+        for pose, player in zip(self.players, game.players):
+            pose.__dict__.update(player.__dict__)
+        self.winner = self.players[game.players.index(game.winner)] if game.winner else None
+
+        self.transform = game.camera.get_transform()
+        self.views = None
+        if game.split_cameras:
+            self.views = [(viewport, camera.get_transform())
+                          for viewport, (_, camera) in zip(SPLIT_VIEWPORTS, game.split_cameras)]
+        # Platform lists are replaced, never mutated, so sharing the list is safe;
+        # moving platforms are moved in place, so their rects are copied
+        self.platforms = game.platforms
+        moving = game.match._moving_platforms()
+        while len(self.moving_platforms) < len(moving):
+            self.moving_platforms.append(Platform(0, 0, 0, 0))
+        del self.moving_platforms[len(moving):]
+        for copy, platform in zip(self.moving_platforms, moving):
+            copy.rect.update(platform.rect)
+        self.portal_visible = game.portal is not None
+        if game.portal:
+            self.portal.rect.update(game.portal.rect)
+            if game.portal_fade_duration <= 0:
+                self.portal_alpha = 1.0
+            else:
+                self.portal_alpha = min(1.0, game.portal_fade_timer / game.portal_fade_duration)
+        self.sim_time = game.sim_frames / FPS
+
+        self.background_surface = game.background_surface
+        self.sky_top = game.current_sky_top
+        self.sky_bottom = game.current_sky_bottom
+        self.mountain_light = game.current_mountain_light
+        self.mountain_dark = game.current_mountain_dark
+        self.cloud_color = game.current_cloud_color
+        self.platform_brown = game.current_platform_brown
+        self.platform_dark = game.current_platform_dark
+        self.grass_color = game.current_grass_color
+        self.ui_t = game.ui_t
+        self.state = game.state
+        self.match_seconds = game.match_seconds
+        self.dash_cooldown = game.config.dash_cooldown
+        self.particles = game.particles.capture() if game.particles else None
+        return self
+
+
+class TripleBuffer:
+    """Hands the newest snapshot from the simulation thread to the render thread.
+
+    The writer fills `back` and publish() swaps it into the shared middle
+    slot; latest() swaps a freshly published middle slot into `front`.
+    Neither side ever waits for the other to finish a frame, and a slow
+    renderer simply skips to the newest snapshot.
+    """
+    def __init__(self, factory):
+        self.front, self.middle, self.back = factory(), factory(), factory()
+        self.fresh = False
+        self.has_front = False
+        self.lock = threading.Lock()
+
+    def publish(self):
+        with self.lock:
+            self.back, self.middle = self.middle, self.back
+            self.fresh = True
+
+    def latest(self):
+        """Newest published item, or None if nothing was published since clear()."""
+        with self.lock:
+            if self.fresh:
+                self.front, self.middle = self.middle, self.front
+                self.fresh = False
+                self.has_front = True
+            return self.front if self.has_front else None
+
+    def clear(self):
+        with self.lock:
+            self.fresh = False
+            self.has_front = False
+
+
+def render_background(sky_top, sky_bottom, mountain_light, mountain_dark):
+    """The sky gradient with the solid mountain bases, one screen in size."""
+    column = pygame.Surface((1, SCREEN_HEIGHT))
+    for y in range(SCREEN_HEIGHT):
+        ratio = y / SCREEN_HEIGHT
+        r = int(sky_top[0] + (sky_bottom[0] - sky_top[0]) * ratio)
+        g = int(sky_top[1] + (sky_bottom[1] - sky_top[1]) * ratio)
+        b = int(sky_top[2] + (sky_bottom[2] - sky_top[2]) * ratio)
+        column.set_at((0, y), (r, g, b))
+    bg = pygame.transform.scale(column, (SCREEN_WIDTH, SCREEN_HEIGHT))
+    # Solid mountain bases under the scrolling ridge strips
+    for (_, bottom, _, _), color in ((FAR_MOUNTAIN_LAYER, mountain_light),
+                                     (NEAR_MOUNTAIN_LAYER, mountain_dark)):
+        bg.fill(color, (0, bottom, SCREEN_WIDTH, SCREEN_HEIGHT - bottom))
+    return bg.convert() if pygame.display.get_surface() else bg
+
+
+def hud_color(ui_t):
+    """HUD text color, blended from black toward light as ui_t goes 0 -> 1."""
+    t = max(0.0, min(1.0, ui_t))
+    return tuple(int(BLACK[i] + (UI_LIGHT[i] - BLACK[i]) * t) for i in range(3))
+
+
+class SnapshotRenderer:
+    """Draws RenderSnapshots: the world through the snapshot's camera (or both
+    split views), then the HUD. It only holds drawing caches, so a spectator
+    can draw a remote match with one and no Game.
+    """
+    def __init__(self, screen, particles=None):
+        self.screen = screen
+        self.particles = particles  # ParticleSystem that draws snapshot.particles, if any
+        self.font_main = pygame.font.Font(None, 32)
+        self.font_small = pygame.font.Font(None, 20)
+        self.font_big = pygame.font.Font(None, 64)
+        # World primitives are recorded into a display list; poses are cached across frames
+        self.glow_cache = GlowCache()
+        self.display_list = DisplayList(self.glow_cache)
+        self.pose_cache = PoseCache()
+        self.platform_layer = StaticPlatformLayer()
+        self.world_tiles = WorldTileCache()  # static platforms shared by split views
+        self.parallax_layers = None  # built on first draw
+        self.background = (None, None)  # (palette, surface) last built by background_for
+
+    def background_for(self, snapshot):
+        """The background for a snapshot's palette, for snapshots that don't carry one
+        (replays, spectators); it is only re-rendered when the palette changes."""
+        palette = (snapshot.sky_top, snapshot.sky_bottom, snapshot.mountain_light, snapshot.mountain_dark)
+        if palette != self.background[0]:
+            self.background = (palette, render_background(*palette))
+        return self.background[1]
+
+    def draw(self, snapshot, banner=None):
+        """Draw the world and HUD for a snapshot; banner labels e.g. instant replays."""
+        if snapshot.views:
+            # Split screen: each view draws the world into its own part of the screen
+            for viewport, transform in snapshot.views:
+                self._draw_world(self.screen.subsurface(viewport), snapshot, transform, viewport)
+            self.screen.fill(BLACK, (SPLIT_VIEW_WIDTH, 0, SCREEN_WIDTH - 2 * SPLIT_VIEW_WIDTH, SCREEN_HEIGHT))
+        else:
+            self._draw_world(self.screen, snapshot, snapshot.transform)
+
+        # Draw UI overlay
+        if snapshot.state == GameState.PLAYING:
+            self.draw_ui(snapshot)
+            self.draw_dash_cooldown(snapshot)
+        else:
+            self.draw_game_over(snapshot)
+        if banner:
+            self.draw_banner(banner)
+
+    def _draw_world(self, surface, snapshot, transform, viewport=None):
+        """Draw the background and world objects seen through one camera transform.
+
+        viewport is the screen area of a split view (surface is then a
+        subsurface of it); its static platforms come from the shared world
+        tiles rather than the single-camera platform layer.
+        """
+        # Draw pre-rendered background (HUGE performance boost!)
+        surface.blit(snapshot.background_surface, (0, 0), viewport)
+        
+        # Parallax mountains and drifting clouds, each scrolling at its own rate
+        if self.parallax_layers is None:
+            self.parallax_layers = self.create_parallax_layers()
+        zoom, cam_x, cam_y = transform
+        view_left = cam_x / zoom
+        seconds = pygame.time.get_ticks() / 1000.0
+        for layer, color_attr in self.parallax_layers:
+            layer.draw(surface, getattr(snapshot, color_attr), view_left, seconds)
+        
+        # Record world objects: platforms, then the portal, then players on top
+        display_list = self.display_list
+        colors = (snapshot.platform_brown, snapshot.platform_dark, snapshot.grass_color)
+        if viewport is None:
+            self.platform_layer.record(display_list, snapshot.platforms, transform, colors)
+        elif self.world_tiles:
+            self.world_tiles.blit(surface, snapshot.platforms, transform, colors)
+        else:
+            for platform in snapshot.platforms:
+                if not platform.moving:
+                    platform.record(display_list, zoom, cam_x, cam_y, *colors)
+        for platform in snapshot.moving_platforms:
+            platform.record(display_list, zoom, cam_x, cam_y, *colors)
+        if snapshot.portal_visible:
+            snapshot.portal.record(display_list, zoom, cam_x, cam_y, snapshot.portal_alpha, snapshot.sim_time)
+        for player in snapshot.players:
+            player.record(display_list, zoom, cam_x, cam_y, self.pose_cache)
+        display_list.submit(surface)
+        if snapshot.particles is not None and self.particles:
+            self.particles.draw(surface, snapshot.particles, zoom, cam_x, cam_y, self.glow_cache)
+
+    def draw_ui(self, snapshot):
+        """Draw HUD elements during gameplay."""
+        # Tag status banner (show which player is 'it' using their selected color)
+        it_players = [player for player in snapshot.players if player.is_tagged] or [snapshot.players[1]]
+        if len(it_players) == 1:
+            tagged_text = f"PLAYER {it_players[0].player_id} IS IT!"
+        else:
+            tagged_text = "PLAYERS " + ", ".join(str(p.player_id) for p in it_players) + " ARE IT!"
+        color = it_players[0].color_shirt
+
+        text_surface = self.font_main.render(tagged_text, True, color)
+        # place banner just under the top UI (dash bars)
+        self.screen.blit(text_surface, 
+                        (SCREEN_WIDTH // 2 - text_surface.get_width() // 2, 10 + 15 + 4))
+        
+        # Controls guide
+        ui_color = hud_color(snapshot.ui_t)
+        p1_text = self.font_small.render("P1: A / D move, W jump, R dash", True, ui_color)
+        p2_text = self.font_small.render("P2: LEFT / RIGHT move, UP jump, U dash", True, ui_color)
+        self.screen.blit(p1_text, (10, 50))
+        self.screen.blit(p2_text, (10, 75))
+        
+        # Match timer (moved slightly lower so it doesn't overlap with top dash bars)
+        timer_surface = self.font_main.render(f"Time: {snapshot.match_seconds}s", True, ui_color)
+        timer_x = SCREEN_WIDTH - timer_surface.get_width() - 10
+        # place timer beneath the top dash bars (dash bars at y=10, height=15)
+        timer_y = 10 + 15 + 8
+        self.screen.blit(timer_surface, (timer_x, timer_y))
+
+    def draw_dash_cooldown(self, snapshot):
+        """Draw dash cooldown bars for both players at the top of the screen."""
+        ui_color = hud_color(snapshot.ui_t)
+        player1, player2 = snapshot.players[0], snapshot.players[1]
+        # Player 1 Dash Cooldown Bar (Top Left)
+        p1_bar_width = 200
+        p1_bar_height = 15
+        p1_bar_x = 10
+        p1_bar_y = 10
+        p1_cooldown_ratio = 1 - (player1.dash_cooldown / snapshot.dash_cooldown)
+        p1_fill_width = int(p1_bar_width * p1_cooldown_ratio)
+
+        pygame.draw.rect(self.screen, ui_color, (p1_bar_x, p1_bar_y, p1_bar_width, p1_bar_height), 2)
+        pygame.draw.rect(self.screen, player1.color_shirt, (p1_bar_x, p1_bar_y, p1_fill_width, p1_bar_height))
+
+        # Player 2 Dash Cooldown Bar (Top Right)
+        p2_bar_width = 200
+        p2_bar_height = 15
+        p2_bar_x = SCREEN_WIDTH - p2_bar_width - 10
+        p2_bar_y = 10
+        p2_cooldown_ratio = 1 - (player2.dash_cooldown / snapshot.dash_cooldown)
+        p2_fill_width = int(p2_bar_width * p2_cooldown_ratio)
+
+        pygame.draw.rect(self.screen, ui_color, (p2_bar_x, p2_bar_y, p2_bar_width, p2_bar_height), 2)
+        pygame.draw.rect(self.screen, player2.color_shirt, (p2_bar_x, p2_bar_y, p2_fill_width, p2_bar_height))
+
+    def draw_banner(self, label):
+        """Label instant replays so they aren't mistaken for live play."""
+        text = self.font_big.render(label, True, WHITE)
+        x = SCREEN_WIDTH // 2 - text.get_width() // 2
+        y = SCREEN_HEIGHT - text.get_height() - 20
+        self.screen.blit(self.font_big.render(label, True, BLACK), (x + 3, y + 3))
+        self.screen.blit(text, (x, y))
+
+    def draw_game_over(self, snapshot):
+        """Draw game over screen with winner announcement."""
+        winner = snapshot.winner or snapshot.players[1]
+        title = f"PLAYER {winner.player_id} WINS!"
+        color = winner.color_shirt
+        
+        # Title
+        title_surface = self.font_big.render(title, True, color)
+        self.screen.blit(title_surface, 
+                        (SCREEN_WIDTH // 2 - title_surface.get_width() // 2,
+                         SCREEN_HEIGHT // 2 - 60))
+        
+        # Instructions
+        info1 = self.font_main.render("Press 6 for Title Screen", True, BLACK)
+        info2 = self.font_main.render("Press 5 to quit", True, BLACK)
+        self.screen.blit(info1, 
+                        (SCREEN_WIDTH // 2 - info1.get_width() // 2,
+                         SCREEN_HEIGHT // 2 + 20))
+        self.screen.blit(info2, 
+                        (SCREEN_WIDTH // 2 - info2.get_width() // 2,
+                         SCREEN_HEIGHT // 2 + 50))
+
+    def create_parallax_layers(self):
+        """Pre-render the tiling far mountain, near mountain and cloud strips."""
+        far_top, far_bottom, far_factor, _ = FAR_MOUNTAIN_LAYER
+        far = ParallaxLayer.make_mask(PARALLAX_TILE_WIDTH, far_bottom - far_top)
+        points_far = [
+            (0, 650), (300, 520), (600, 600), (900, 500), 
+            (1200, 580), (1500, 550), (1800, 580), (2100, 500), 
+            (2400, 650), (2400, far_bottom), (0, far_bottom)
+        ]
+        pygame.draw.polygon(far, 1, [(x, y - far_top) for x, y in points_far])
+
+        # Both ends meet at the same height so the strip tiles seamlessly
+        near_top, near_bottom, near_factor, _ = NEAR_MOUNTAIN_LAYER
+        near = ParallaxLayer.make_mask(PARALLAX_TILE_WIDTH, near_bottom - near_top)
+        points_near = [
+            (0, 640), (250, 580), (550, 680), (750, 550), 
+            (1000, 680), (1200, 600), (1500, 650), (1800, 600), 
+            (2100, 700), (2400, 640), (2400, near_bottom), (0, near_bottom)
+        ]
+        pygame.draw.polygon(near, 1, [(x, y - near_top) for x, y in points_near])
+
+        cloud_top, cloud_bottom, cloud_factor, cloud_drift = CLOUD_LAYER
+        clouds = ParallaxLayer.make_mask(SCREEN_WIDTH + 375, cloud_bottom - cloud_top)
+        for i in range(4):
+            self.draw_cloud(clouds, i * 350 + 50, 40 + (i % 2) * 60 - cloud_top, 50, color=1)
+
+        return [
+            (ParallaxLayer(far, far_top, far_factor), "mountain_light"),
+            (ParallaxLayer(near, near_top, near_factor), "mountain_dark"),
+            (ParallaxLayer(clouds, cloud_top, cloud_factor, cloud_drift), "cloud_color"),
+        ]
+
+    def draw_cloud(self, surface, x, y, size, color):
+        """Draw a simple cloud (used when pre-rendering the cloud strip)."""
+        pygame.draw.circle(surface, color, (x, y), size)
+        pygame.draw.circle(surface, color, (x + size, y), size)
+        pygame.draw.circle(surface, color, (x + size // 2, y - size // 2), size)
+
+
+# ==================== INSTANT REPLAY ====================
+REPLAY_SECONDS = 10
+REPLAY_SLOW_SPEED = 0.5
+REPLAY_LEAD_SECONDS = 2   # slow-motion replays cover this long either side of the last tag or portal flip
+REPLAY_ANIMATIONS = ("idle", "running", "jumping")
+# Theme colours kept per frame, packed as 0xRRGGBB (exact in a float32)
+REPLAY_COLORS = (
+    "sky_top", "sky_bottom", "mountain_light", "mountain_dark", "cloud_color",
+    "platform_brown", "platform_dark", "grass_color",
+)
+REPLAY_GAME_COLORS = tuple("current_" + name for name in REPLAY_COLORS)
+# Frame record: camera (3), sim time, portal x/y/w/h/alpha, UI blend, timer, split view
+# count and zoom/x/y per split view, colours and moving platform count, followed by
+# x/y/w/h per moving slot (one slot per moving platform the config's maps have)
+REPLAY_FRAME_FLOATS = 12 + len(SPLIT_VIEWPORTS) * 3 + len(REPLAY_COLORS) + 1
+REPLAY_MOVING_FLOATS = 4
+# Player record: x, y, tagged, glow, direction, run cycle, animation, idle phase, dash cooldown
+REPLAY_PLAYER_FLOATS = 9
+
+
+class ReplayBuffer:
+    """The last REPLAY_SECONDS of render state in one preallocated float32 ring.
+
+    Every simulation step record() overwrites the oldest slot in place, so
+    recording never allocates containers and memory is fixed at frames *
+    (REPLAY_FRAME_FLOATS + moving_slots * REPLAY_MOVING_FLOATS + players *
+    REPLAY_PLAYER_FLOATS) * 4 bytes: with MOVING_PLATFORMS slots, 600 frames
+    take 134 KB for two players and 429 KB for sixteen. moving_slots should
+    be the config's moving_platforms, which is the most any of its maps
+    has. Only the platform list is kept by reference, per slot. restore() rebuilds a
+    RenderSnapshot from a slot, so playback goes through Game.draw.
+    Particles are not recorded.
+    """
+    def __init__(self, players, moving_slots=MOVING_PLATFORMS, frames=REPLAY_SECONDS * FPS):
+        self.players = players
+        self.moving_slots = moving_slots
+        self.frames = frames
+        self.stride = REPLAY_FRAME_FLOATS + moving_slots * REPLAY_MOVING_FLOATS + players * REPLAY_PLAYER_FLOATS
+        self.data = array.array("f", bytes(4 * frames * self.stride))
+        self.platforms = [None] * frames
+        self.recorded = 0     # frames recorded so far; the newest is recorded - 1
+        self.last_mark = -1   # frame of the latest tag or portal flip
+
+    @property
+    def nbytes(self):
+        return self.data.itemsize * len(self.data)
+
+    @property
+    def oldest(self):
+        return max(0, self.recorded - self.frames)
+
+    def mark(self):
+        """Remember the newest frame as a highlight (see REPLAY_LEAD_SECONDS)."""
+        self.last_mark = self.recorded
+
+    def record(self, game):
+        """Copy the game's render state into the next slot, overwriting the oldest."""
+        if len(game.players) != self.players:
+            return
+        slot = self.recorded % self.frames
+        data = self.data
+        i = slot * self.stride
+        camera = game.camera
+        data[i] = camera.zoom
+        data[i + 1] = camera.x
+        data[i + 2] = camera.y
+        data[i + 3] = game.sim_frames / FPS
+        portal = game.portal
+        if portal:
+            rect = portal.rect
+            data[i + 4] = rect.x
+            data[i + 5] = rect.y
+            data[i + 6] = rect.width
+            data[i + 7] = rect.height
+            if game.portal_fade_duration <= 0:
+                data[i + 8] = 1.0
+            else:
+                data[i + 8] = min(1.0, game.portal_fade_timer / game.portal_fade_duration)
+        else:
+            data[i + 6] = 0  # zero width: no portal
+        data[i + 9] = game.ui_t
+        data[i + 10] = game.match_seconds
+        # Split-screen views are recorded per frame so replays follow each player
+        views = game.split_cameras or ()
+        data[i + 11] = len(views)
+        j = i + 12
+        for _, split_camera in views:
+            data[j], data[j + 1], data[j + 2] = split_camera.get_transform()
+            j += 3
+        i += 12 + len(SPLIT_VIEWPORTS) * 3
+        for name in REPLAY_GAME_COLORS:
+            color = getattr(game, name)
+            data[i] = (color[0] << 16) | (color[1] << 8) | color[2]
+            i += 1
+        moving = game.match._moving_platforms()
+        count = min(len(moving), self.moving_slots)
+        data[i] = count
+        for index in range(count):
+            rect = moving[index].rect
+            j = i + 1 + index * REPLAY_MOVING_FLOATS
+            data[j] = rect.x
+            data[j + 1] = rect.y
+            data[j + 2] = rect.width
+            data[j + 3] = rect.height
+        i += 1 + self.moving_slots * REPLAY_MOVING_FLOATS
+        for player in game.players:
+            data[i] = player.x
+            data[i + 1] = player.y
+            data[i + 2] = player.is_tagged
+            data[i + 3] = player.glow_intensity
+            data[i + 4] = player.direction
+            data[i + 5] = player.run_cycle
+            data[i + 6] = REPLAY_ANIMATIONS.index(player.current_animation)
+            data[i + 7] = player.idle_phase
+            data[i + 8] = player.dash_cooldown
+            i += REPLAY_PLAYER_FLOATS
+        self.platforms[slot] = game.platforms
+        self.recorded += 1
+
+    def restore(self, frame, snapshot):
+        """Fill snapshot (already holding the players' looks) with recorded frame `frame`."""
+        slot = frame % self.frames
+        data = self.data
+        i = slot * self.stride
+        snapshot.transform = (data[i], data[i + 1], data[i + 2])
+        snapshot.sim_time = data[i + 3]
+        snapshot.portal_visible = data[i + 6] > 0
+        if snapshot.portal_visible:
+            snapshot.portal.rect.update(int(data[i + 4]), int(data[i + 5]), int(data[i + 6]), int(data[i + 7]))
+        snapshot.portal_alpha = data[i + 8]
+        snapshot.ui_t = data[i + 9]
+        snapshot.match_seconds = int(data[i + 10])
+        snapshot.views = None
+        if data[i + 11]:
+            # Split cameras snap to zoom buckets and whole pixels (Camera.get_transform)
+            snapshot.views = [(viewport, (round(data[j], 6), int(data[j + 1]), int(data[j + 2])))
+                              for viewport, j in zip(SPLIT_VIEWPORTS, range(i + 12, i + 12 + int(data[i + 11]) * 3, 3))]
+        i += 12 + len(SPLIT_VIEWPORTS) * 3
+        for name in REPLAY_COLORS:
+            packed = int(data[i])
+            setattr(snapshot, name, (packed >> 16, (packed >> 8) & 0xFF, packed & 0xFF))
+            i += 1
+        count = int(data[i])
+        while len(snapshot.moving_platforms) < count:
+            snapshot.moving_platforms.append(Platform(0, 0, 0, 0))
+        del snapshot.moving_platforms[count:]
+        for index, platform in enumerate(snapshot.moving_platforms):
+            j = i + 1 + index * REPLAY_MOVING_FLOATS
+            platform.rect.update(int(data[j]), int(data[j + 1]), int(data[j + 2]), int(data[j + 3]))
+        i += 1 + self.moving_slots * REPLAY_MOVING_FLOATS
+        for player in snapshot.players:
+            player.x = data[i]
+            player.y = data[i + 1]
+            player.is_tagged = bool(data[i + 2])
+            player.glow_intensity = data[i + 3]
+            player.direction = int(data[i + 4])
+            player.run_cycle = data[i + 5]
+            player.current_animation = REPLAY_ANIMATIONS[int(data[i + 6])]
+            player.idle_phase = data[i + 7]
+            player.dash_cooldown = int(data[i + 8])
+            i += REPLAY_PLAYER_FLOATS
+        snapshot.platforms = self.platforms[slot]
+        snapshot.state = GameState.PLAYING
+        snapshot.winner = None
+        snapshot.particles = None
+        return snapshot
+
+
+# ==================== SPECTATOR STREAM ====================
+# Player attributes streamed to spectators: (wire name, attribute)
+SPECTATOR_PLAYER_FIELDS = (
+    ("x", "x"), ("y", "y"), ("it", "is_tagged"), ("glow", "glow_intensity"),
+    ("dir", "direction"), ("run", "run_cycle"), ("anim", "current_animation"),
+    ("idle", "idle_phase"), ("dash", "dash_cooldown"), ("color", "color_shirt"),
+    ("id", "player_id"),
+)
+# Snapshot attributes streamed as-is (colors, UI blend, timer)
+SPECTATOR_FIELDS = (
+    "sky_top", "sky_bottom", "mountain_light", "mountain_dark", "cloud_color",
+    "platform_brown", "platform_dark", "grass_color", "ui_t", "match_seconds",
+    "dash_cooldown", "sim_time", "portal_alpha",
+)
+SPECTATOR_KEYFRAME_INTERVAL = FPS * 2
+SPECTATOR_MAX_PENDING = 256 * 1024  # bytes queued for one spectator before it is resynced
+
+
+def spectator_state(snapshot):
+    """Flatten a RenderSnapshot into {field: JSON value}; floats are rounded to 2 places."""
+    def wire(value):
+        if isinstance(value, float):
+            return round(value, 2)
+        if isinstance(value, tuple):
+            return [wire(v) for v in value]
+        return value
+
+    state = {name: wire(getattr(snapshot, name)) for name in SPECTATOR_FIELDS}
+    state["view"] = wire(snapshot.transform)
+    state["state"] = snapshot.state.value
+    state["portal"] = list(snapshot.portal.rect) if snapshot.portal_visible else None
+    state["moving"] = [list(platform.rect) for platform in snapshot.moving_platforms]
+    state["players"] = len(snapshot.players)
+    state["winner"] = snapshot.players.index(snapshot.winner) if snapshot.winner else -1
+    for i, player in enumerate(snapshot.players):
+        for name, attr in SPECTATOR_PLAYER_FIELDS:
+            state[f"{i}.{name}"] = wire(getattr(player, attr))
+    return state
+
+
+class SpectatorBroadcaster:
+    """Streams per-frame state deltas to spectator clients over TCP.
+
+    Each message is a 4-byte big-endian length and a JSON object
+    {"k": keyframe?, "f": frame, "d": {field: value}}. Deltas carry only
+    fields that changed since the previous frame; the static platform list
+    is only sent when it changes, while moving platforms are a regular
+    per-frame field. Every SPECTATOR_KEYFRAME_INTERVAL frames,
+    and to anyone who just joined or fell too far behind, a full keyframe
+    is sent instead. Sockets are non-blocking, so a slow spectator never
+    stalls the game.
+    """
+    def __init__(self, port, host="127.0.0.1", keyframe_interval=SPECTATOR_KEYFRAME_INTERVAL):
+        self.server = socket.create_server((host, port))
+        self.server.setblocking(False)
+        self.keyframe_interval = keyframe_interval
+        self.clients = {}         # socket -> bytearray of unsent data
+        self.message_ends = {}    # socket -> stream offsets where its queued messages end
+        self.resync = set()       # clients that need a keyframe next
+        self.last_state = {}
+        self.last_platforms = None
+        self.platform_data = []
+        self.frame = 0
+        # Measurements
+        self.bytes_sent = {}      # socket -> bytes delivered so far
+        self.joined = {}          # socket -> frame it connected on
+        self.publish_time = 0.0
+        self.publish_cpu = 0.0
+        self.frames_published = 0
+
+    def publish(self, snapshot):
+        start, start_cpu = time.perf_counter(), time.process_time()
+        self._accept()
+        state = spectator_state(snapshot)
+        if snapshot.platforms is not self.last_platforms:
+            self.last_platforms = snapshot.platforms
+            self.platform_data = [list(platform.rect) for platform in snapshot.platforms
+                                  if not platform.moving]
+            state["platforms"] = self.platform_data
+        else:
+            state["platforms"] = self.last_state.get("platforms")
+
+        if self.clients:
+            keyframe = self.frame % self.keyframe_interval == 0
+            if keyframe or self.resync:
+                full = self._encode(True, state)
+            delta = None
+            if not keyframe:
+                changed = {k: v for k, v in state.items()
+                           if k != "platforms" and self.last_state.get(k) != v}
+                if state["platforms"] is not self.last_state.get("platforms"):
+                    changed["platforms"] = state["platforms"]
+                delta = self._encode(False, changed)
+            for client in list(self.clients):
+                self._queue(client, full if keyframe or client in self.resync else delta)
+                self._send(client)
+            self.resync.clear()
+        self.last_state = state
+        self.frame += 1
+        self.frames_published += 1
+        self.publish_time += time.perf_counter() - start
+        self.publish_cpu += time.process_time() - start_cpu
+
+    def _encode(self, keyframe, fields):
+        payload = json.dumps({"k": keyframe, "f": self.frame, "d": fields},
+                             separators=(",", ":")).encode()
+        return struct.pack(">I", len(payload)) + payload
+
+    def _accept(self):
+        while True:
+            try:
+                client, _ = self.server.accept()
+            except BlockingIOError:
+                return
+            client.setblocking(False)
+            client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.clients[client] = bytearray()
+            self.message_ends[client] = collections.deque()
+            self.bytes_sent[client] = 0
+            self.joined[client] = self.frame
+            self.resync.add(client)
+
+    def _queue(self, client, message):
+        pending = self.clients[client]
+        pending += message
+        self.message_ends[client].append(self.bytes_sent[client] + len(pending))
+
+    def _send(self, client):
+        pending = self.clients[client]
+        try:
+            sent = client.send(pending)
+        except BlockingIOError:
+            sent = 0
+        except OSError:
+            self._drop(client)
+            return
+        del pending[:sent]
+        self.bytes_sent[client] += sent
+        ends = self.message_ends[client]
+        while ends and ends[0] <= self.bytes_sent[client]:
+            ends.popleft()
+        if len(pending) > SPECTATOR_MAX_PENDING:
+            # Too far behind: discard the backlog and start over from a keyframe.
+            # The first message may already be partly on the wire, so it is
+            # finished; only whole messages after it are dropped.
+            head = ends[0] - self.bytes_sent[client]
+            del pending[head:]
+            while len(ends) > 1:
+                ends.pop()
+            self.resync.add(client)
+
+    def _drop(self, client):
+        client.close()
+        del self.clients[client]
+        del self.message_ends[client]
+        self.resync.discard(client)
+
+    def close(self):
+        for client in list(self.clients):
+            self._drop(client)
+        self.server.close()
+
+    def summary(self):
+        frames = max(1, self.frames_published)
+        rates = [sent / (max(1, self.frame - self.joined[client]) / FPS) / 1024
+                 for client, sent in self.bytes_sent.items()]
+        per_client = f"{sum(rates) / len(rates):.1f} KB/s per spectator" if rates else "no spectators"
+        return (f"Spectator stream: {self.frames_published} frames, {per_client}; "
+                f"publish {self.publish_time / frames * 1000:.3f} ms/frame "
+                f"({self.publish_cpu / frames * 1000:.3f} ms CPU)")
+
+
+class SpectatorClient:
+    """Receives a SpectatorBroadcaster stream and rebuilds RenderSnapshots from it."""
+    def __init__(self, host, port):
+        self.sock = socket.create_connection((host, port))
+        self.sock.setblocking(False)
+        self.buffer = bytearray()
+        self.state = None     # None until the first keyframe arrives
+        self.snapshot = RenderSnapshot()
+        self.platforms_data = None
+        self.bytes_received = 0
+        self.messages = 0
+        self.connected = True
+
+    def poll(self):
+        """Apply everything received so far; returns True when the state changed."""
+        while True:
+            try:
+                data = self.sock.recv(65536)
+            except BlockingIOError:
+                break
+            except OSError:
+                data = b""
+            if not data:
+                self.connected = False
+                break
+            self.buffer += data
+            self.bytes_received += len(data)
+        changed = False
+        while len(self.buffer) >= 4:
+            (size,) = struct.unpack_from(">I", self.buffer)
+            if len(self.buffer) < 4 + size:
+                break
+            message = json.loads(self.buffer[4:4 + size])
+            del self.buffer[:4 + size]
+            self.messages += 1
+            if message["k"]:
+                self.state = message["d"]
+            elif self.state is not None:
+                self.state.update(message["d"])
+            changed = self.state is not None
+        return changed
+
+    def build_snapshot(self):
+        """Turn the current state into the RenderSnapshot SnapshotRenderer.draw expects."""
+        state = self.state
+        snapshot = self.snapshot
+        for name in SPECTATOR_FIELDS:
+            value = state[name]
+            setattr(snapshot, name, tuple(value) if isinstance(value, list) else value)
+        snapshot.transform = tuple(state["view"])
+        snapshot.state = GameState(state["state"])
+        snapshot.portal_visible = state["portal"] is not None
+        if snapshot.portal_visible:
+            snapshot.portal.rect.update(state["portal"])
+        if state["platforms"] is not self.platforms_data:
+            self.platforms_data = state["platforms"]
+            snapshot.platforms = [Platform(*rect) for rect in state["platforms"]]
+        snapshot.moving_platforms = [Platform(*rect) for rect in state["moving"]]
+        count = state["players"]
+        while len(snapshot.players) < count:
+            snapshot.players.append(Player(0, 0, 0, WHITE, WHITE))
+        del snapshot.players[count:]
+        for i, player in enumerate(snapshot.players):
+            for name, attr in SPECTATOR_PLAYER_FIELDS:
+                value = state[f"{i}.{name}"]
+                setattr(player, attr, tuple(value) if isinstance(value, list) else value)
+        snapshot.winner = snapshot.players[state["winner"]] if state["winner"] >= 0 else None
+        return snapshot
+
+
+def run_spectator(host, port):
+    """Open a window and draw a live match from a broadcaster; no simulation runs here."""
+    client = SpectatorClient(host, port)
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    pygame.display.set_caption(f"Spectating {host}:{port}")
+    renderer = SnapshotRenderer(screen)
+    clock = pygame.time.Clock()
+    while client.connected:
+        if any(event.type == pygame.QUIT for event in pygame.event.get()):
+            break
+        if client.poll():
+            snapshot = client.build_snapshot()
+            snapshot.background_surface = renderer.background_for(snapshot)
+            renderer.draw(snapshot)
+            pygame.display.flip()
+        clock.tick(FPS)
+    print(f"Spectator: {client.messages} messages, {client.bytes_received / 1024:.1f} KB received")
+    pygame.quit()
+
+
+class GameMatch(tag_core.Match):
+    """The Game's simulation: a tag_core.Match built from drawable players,
+    platforms and portals, with layouts from the game's MapQueue (or a
+    ChunkedWorld), and the game's sounds, telemetry and effects on events."""
+    portal_type = Portal
+
+    def __init__(self, game, map_type, num_players, num_bots, num_it):
+        self.game = game
+        super().__init__(game.config, map_type, num_players, num_bots, num_it)
+
+    def _new_player(self, x, y, player_id):
+        color = PLAYER_COLORS[player_id - 1]
+        return Player(x, y, player_id, color, color, self.config)
+
+    def _build_platforms(self, map_type):
+        """Take the next layout from the map queue, or start a new chunked world."""
+        game = self.game
+        if self.heatmap:
+            self.heatmap.set_map(map_type)
+        if self.map_width > MAP_WIDTH:
+            game.world = ChunkedWorld(game.map_rng.randrange(1 << 30), self.map_width, map_type)
+            return game.world.refresh(self._focus_spans())
+        # Layouts come pre-validated and pre-indexed from the map queue
+        platforms, self.map_report, self.platform_grid = game.map_queue.take(map_type)
+        return platforms
+
+    def _stream_platforms(self):
+        # Stream chunks in and out around the camera and players
+        if self.game.world:
+            self.platforms = self.game.world.refresh(self._focus_spans())
+
+    def _focus_spans(self):
+        """World x ranges a chunked world must keep resident: the view and every player."""
+        if not self.players:
+            return [(0, MAP_WIDTH)]  # spawn area, before players exist
+        game = self.game
+        zoom, cam_x, _ = game.camera.get_transform()
+        spans = [(cam_x / zoom, (cam_x + SCREEN_WIDTH) / zoom)]
+        for _, camera in game.split_cameras or ():
+            zoom, cam_x, _ = camera.get_transform()
+            spans.append((cam_x / zoom, (cam_x + camera.width) / zoom))
+        spans.extend((player.x, player.x + player.width) for player in self.players)
+        return spans
+
+    def _emit(self, kind, *fields):
+        self.game._emit(kind, *fields)
+
+    def _tagged(self, it):
+        self.game._tag_effects(it)
+
+    def _portal_touched(self, toucher):
+        self.game._portal_effects(toucher)
+
+
+class MatchAttribute:
+    """A Game attribute that lives on the Game's GameMatch."""
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, game, owner=None):
+        if game is None:
+            return self
+        return getattr(game.match, self.name)
+
+    def __set__(self, game, value):
+        setattr(game.match, self.name, value)
+
 
 class Game:
     """
     Main game class with improved initialization and update logic.
+
+    Gameplay state lives on self.match, a GameMatch the game steps each
+    frame; the attributes below read and write it. map_type picks the
+    first map; the start screen picks later ones with select_map().
     """
-    def __init__(self):
-        self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-        pygame.display.set_caption("Two Player Tag Game")
+    players = MatchAttribute()
+    bots = MatchAttribute()
+    num_players = MatchAttribute()
+    num_it = MatchAttribute()
+    map_width = MatchAttribute()
+    ground_top = MatchAttribute()
+    platforms = MatchAttribute()
+    map_report = MatchAttribute()
+    gravity = MatchAttribute()
+    is_upside_down = MatchAttribute()
+    portal = MatchAttribute()
+    portal_cooldown = MatchAttribute()
+    portal_spawn_delay = MatchAttribute()
+    portal_needs_platform_fix = MatchAttribute()
+    portal_fade_timer = MatchAttribute()
+    portal_fade_duration = MatchAttribute()
+    state = MatchAttribute()
+    winner = MatchAttribute()
+    match_seconds = MatchAttribute()
+    frame_counter = MatchAttribute()
+    sim_frames = MatchAttribute()  # gameplay frames simulated; drives time-based effects
+    tag_count = MatchAttribute()
+    portal_uses = MatchAttribute()
+    heatmap = MatchAttribute()  # optional Heatmap binning player positions and tags every gameplay frame
+
+    def __init__(self, input_mode=InputMode.STANDARD, headless=False,
+                 num_players=2, num_bots=0, num_it=1, config=None, threaded=False, map_type="default"):
+        # Headless games are stepped by the batch runner and never draw or open a window
+        self.headless = headless
+        if headless:
+            self.screen = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+        else:
+            self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+            pygame.display.set_caption("Two Player Tag Game")
         self.clock = pygame.time.Clock()
+        # Paces gameplay frames; replaced by main() for other render rates or vsync
+        self.pacer = FramePacer(FPS)
         self.running = True
+
+        # Per-match settings and RNG streams; nothing below touches module state
+        self.config = config or MatchConfig()
+        self.map_rng = self.config.rng("map")
+        # Pooled particle effects; None when headless or without NumPy
+        self.particles = create_particles(headless, seed=self.config.rng("particles").randrange(1 << 30))
+        # Sound effects for gameplay events; NullAudio when headless or without a mixer
+        self.audio = create_audio(headless)
+        # Optional Telemetry event stream
+        self.telemetry = None
+
+        # A map wider than MAP_WIDTH turns on the streamed ChunkedWorld
+        self.world = None
+        self.map_queue = MapQueue(self.config, background=not headless)
+
+        # The simulation. Players: the first two are keyboard/gamepad players,
+        # the last num_bots are driven by TagBots, anything in between needs a gamepad
+        self.match = GameMatch(self, map_type, num_players, num_bots, num_it)
+
+        # Input scheduling and gamepads
+        self.input_mode = input_mode
+        self.joysticks = {}          # instance_id -> pygame.joystick.Joystick
+        self.joystick_slots = {}     # instance_id -> player index
+        self.joy_move = [0] * self.num_players  # latest -1/0/1 horizontal intent per player
+        self.input_sample_time = None
+        self.present_deadline = None
+        self.frame_work_estimate = 0.004
+        # Called as latency_hook(ms) after each gameplay frame is presented
+        self.latency_hook = None
+        # Optional InputRecorder capturing per-frame actions for batch replays
+        self.input_recorder = None
+        # Optional live_state.LiveStateWriter republished after every step and input
+        self.live_state = None
+        self.last_frame_time = None
+        # Optional FrameCapture fed every presented frame
+        self.frame_capture = None
+        # Optional SpectatorBroadcaster fed every gameplay snapshot that is drawn
+        self.spectators = None
+        # Split screen for two players who are far apart; both views share world tiles
+        self.split_screen = False
+        # Instant replay: every step is recorded; while replay_position is set the
+        # match is paused and recorded frames are drawn instead
+        self.replay = None if headless else ReplayBuffer(self.num_players, self.config.moving_platforms)
+        self.replay_snapshot = RenderSnapshot()
+        self.replay_position = None
+        self.replay_end = 0
+        self.replay_speed = 1.0
+
+        # Threaded mode: a simulation thread steps at FPS and publishes
+        # RenderSnapshots; the main thread only handles events and draws.
+        # sim_lock serializes game state changes between the two.
+        self.threaded = threaded
+        self.sim_lock = threading.Lock()
+        self.sim_thread = None
+        self.sim_stop = threading.Event()
+        self.saved_switch_interval = None
+        self.render_buffer = TripleBuffer(RenderSnapshot)
+        self.render_snapshot = RenderSnapshot()  # reused by the single-threaded loop
+        # Draws RenderSnapshots (world, split views and HUD) onto the screen
+        self.renderer = SnapshotRenderer(self.screen, self.particles)
+        # Threaded mode: (seq, moves) of the newest input sample, and the
+        # (seq, sample time) pairs not yet presented in a snapshot
+        self.latest_input = (0, [0] * self.num_players)
+        self.input_seq = 0
+        self.input_samples = collections.deque(maxlen=FPS)
+        # Menu screens repaint only on input or when the screen changes
+        self.painted_screen = None
+        self.last_input_time = time.perf_counter()
+        # Called as step_hook(perf_counter_time) after every simulation step
+        self.step_hook = None
+        pygame.joystick.init()
         
         # Current sky and mountain colors (can be modified for special maps) - MUST be before create_background()
         self.current_sky_top = SKY_TOP
@@ -574,15 +2724,10 @@ class Game:
         self.current_platform_dark = PLATFORM_DARK
         self.current_grass_color = GRASS_COLOR
         
-        # Initialize world
-        self.platforms = self.generate_platforms()
-        self.ground_top = MAP_HEIGHT - GROUND_HEIGHT
-        
         # Pre-render background for performance
-        self.background_surface = self.create_background()
+        self.background_surface = self.default_background = self.create_background()
 
         # Theme state
-        self.is_upside_down = False
         self.transition_active = False
         self.transition_elapsed = 0.0
         self.transition_duration = 0.0
@@ -592,35 +2737,9 @@ class Game:
         self.ui_from = 0.0
         self.ui_to = 0.0
         
-        # Initialize players at spawn positions
-        ground_spawn_y = self.ground_top - PLAYER_HEIGHT
-        self.player1 = Player(200, ground_spawn_y, 1, RED, RED)
-        self.player2 = Player(MAP_WIDTH - 200, ground_spawn_y, 2, BLUE, BLUE)
-        
         # Initialize camera with new simplified class
-        self.camera = Camera(self.ground_top)
-
-        # Portal spawns on a platform and toggles world colors
-        self.portal = None
-        self.portal_cooldown = 0
-        self.portal_spawn_delay = 0
-        self.portal_needs_platform_fix = True  # spawn initial fallback then fix onto a platform
-        self.portal_fade_timer = 0.0
-        self.portal_fade_duration = 0.6
-        # First portal: intentionally place with fallback (may float), then corrected next update
-        self._spawn_portal_on_random_platform(40, 80, force_ground_fallback=True)
-        
-        # Game state
-        self.player1.is_tagged = True
-        self.player2.is_tagged = False
-        self.tag_timer = 0
-        self.state = GameState.PLAYING
-        
-        # Timing and scoring
-        self.match_seconds = MATCH_DURATION
-        self.frame_counter = 0
-        self.p1_tag_time = 0
-        self.p2_tag_time = 0
+        self.camera = Camera(self.ground_top, self.map_width)
+        self.split_cameras = None  # [(player, Camera)], left view first, while split
         
         # Fonts
         self.font_main = pygame.font.Font(None, 32)
@@ -633,118 +2752,109 @@ class Game:
         self.show_color_selection_screen = False
         self.show_start_screen = False
 
-    def _ui_color(self):
-        """Return a blended UI color based on transition progress (fades black->light)."""
-        def lerp_color(c1, c2, t):
-            return tuple(int(c1[i] + (c2[i] - c1[i]) * t) for i in range(3))
-        return lerp_color(BLACK, UI_LIGHT, max(0.0, min(1.0, self.ui_t)))
+    @property
+    def player1(self):
+        return self.players[0]
+
+    @property
+    def player2(self):
+        return self.players[1]
 
     def create_background(self):
         """
-        Pre-render the background gradient once for performance.
-        This eliminates 1024 draw calls per frame!
+        Pre-render the sky gradient once for performance.
+        The gradient is drawn into a one pixel wide column and stretched,
+        which keeps rebuilds cheap during theme transitions.
+        Headless games never draw, so they skip the work entirely.
         """
-        bg = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
-        for y in range(SCREEN_HEIGHT):
-            ratio = y / SCREEN_HEIGHT
-            r = int(self.current_sky_top[0] + (self.current_sky_bottom[0] - self.current_sky_top[0]) * ratio)
-            g = int(self.current_sky_top[1] + (self.current_sky_bottom[1] - self.current_sky_top[1]) * ratio)
-            b = int(self.current_sky_top[2] + (self.current_sky_bottom[2] - self.current_sky_top[2]) * ratio)
-            pygame.draw.line(bg, (r, g, b), (0, y), (SCREEN_WIDTH, y))
-        
-        # Draw mountains on the background
-        self.draw_mountains(bg)
-        return bg
+        if self.headless:
+            return None
+        return render_background(self.current_sky_top, self.current_sky_bottom,
+                                 self.current_mountain_light, self.current_mountain_dark)
+
+    def _emit(self, kind, *fields):
+        """Play the event's sound effect and send a telemetry event if telemetry is enabled."""
+        if kind in SOUND_EFFECTS:
+            self.audio.play(kind)
+        if self.telemetry:
+            self.telemetry.emit(kind, *fields)
+
+    def _jump(self, player):
+        self.match._jump(player)
+
+    def _dash(self, player):
+        self.match._dash(player)
+
+    def _spawn_movement_particles(self):
+        """Dust where players land hard and trails behind dashing players."""
+        for player in self.players:
+            center_x = player.x + player.width / 2
+            if player.landing_speed > LANDING_DUST_SPEED:
+                self.particles.emit("dust", center_x, player.y + player.height, int(player.landing_speed * 2))
+            if player.dash_timer > 0:
+                self.particles.emit("trail", center_x, player.y + player.height / 2, 3, vx=-player.vx * 0.1)
+
+    def _tag_effects(self, it):
+        """Burst particles around the new 'it' player and mark the replay."""
+        if self.particles:
+            self.particles.emit("tag", it.x + it.width / 2, it.y + it.height / 2, 40)
+        if self.replay:
+            self.replay.mark()
+
+    def _portal_effects(self, toucher):
+        """Burst particles around the portal's toucher, mark the replay and start flipping the colors."""
+        if self.particles:
+            self.particles.emit("portal", toucher.x + toucher.width / 2, toucher.y + toucher.height / 2, 60)
+        if self.replay:
+            self.replay.mark()
+        if not self.is_upside_down:
+            self._start_transition_to_upside_down()
+        else:
+            self._start_transition_to_light()
 
-    def draw_mountains(self, surface):
-        """Draw mountain layers on the given surface."""
-        points_far = [
-            (0, 650), (300, 520), (600, 600), (900, 500), 
-            (1200, 580), (1500, 550), (1800, 580), (2100, 500), 
-            (2400, 650), (2400, 1050), (0, 1050)
-        ]
-        pygame.draw.polygon(surface, self.current_mountain_light, points_far)
-        
-        points_near = [
-            (0, 1050), (250, 580), (550, 680), (750, 550), 
-            (1000, 680), (1200, 600), (1500, 650), (1800, 600), 
-            (2100, 700), (2400, 600), (2400, 1050)
-        ]
-        pygame.draw.polygon(surface, self.current_mountain_dark, points_near)
-
-    def draw_cloud(self, surface, x, y, size):
-        """Draw a simple cloud."""
-        pygame.draw.circle(surface, self.current_cloud_color, (x, y), size)
-        pygame.draw.circle(surface, self.current_cloud_color, (x + size, y), size)
-        pygame.draw.circle(surface, self.current_cloud_color, (x + size // 2, y - size // 2), size)
-
-    def check_tag(self):
-        """Check if players collide and handle tag switching."""
-        bounds1 = self.player1.get_bounds()
-        bounds2 = self.player2.get_bounds()
-        
-        if bounds1.colliderect(bounds2) and self.tag_timer <= 0:
-            # Switch who is tagged
-            self.player1.is_tagged = not self.player1.is_tagged
-            self.player2.is_tagged = not self.player2.is_tagged
-            self.tag_timer = TAG_COOLDOWN
+    def _sample_input(self):
+        """Sample held movement input for every player and timestamp the sample.
 
-    def update(self):
-        """Update game state - called every frame during gameplay."""
+        Keyboard wins over the joystick when both are held. Returns a list of
+        -1/0/1 horizontal intents, one per player (bots fill theirs in later).
+        """
         keys = pygame.key.get_pressed()
+        self.input_sample_time = time.perf_counter()
 
         # Player 1 controls (WASD)
-        p1_speed = BASE_SPEED * (TAGGED_SPEED_BOOST if self.player1.is_tagged else 1.0)
-
-        # Movement - update direction even during dash
         if keys[pygame.K_a]:
-            self.player1.direction = -1
-            if self.player1.dash_timer == 0:
-                self.player1.vx = -p1_speed
+            p1_move = -1
         elif keys[pygame.K_d]:
-            self.player1.direction = 1
-            if self.player1.dash_timer == 0:
-                self.player1.vx = p1_speed
+            p1_move = 1
         else:
-            if self.player1.dash_timer == 0:
-                self.player1.vx *= FRICTION
+            p1_move = self.joy_move[0]
 
         # Player 2 controls (Arrow keys)
-        p2_speed = BASE_SPEED * (TAGGED_SPEED_BOOST if self.player2.is_tagged else 1.0)
-        
-        # Movement - update direction even during dash
         if keys[pygame.K_LEFT]:
-            self.player2.direction = -1
-            if self.player2.dash_timer == 0:
-                self.player2.vx = -p2_speed
+            p2_move = -1
         elif keys[pygame.K_RIGHT]:
-            self.player2.direction = 1
-            if self.player2.dash_timer == 0:
-                self.player2.vx = p2_speed
+            p2_move = 1
         else:
-            if self.player2.dash_timer == 0:
-                self.player2.vx *= FRICTION
-
-        # Update physics
-        self.player1.update(self.platforms)
-        self.player2.update(self.platforms)
+            p2_move = self.joy_move[1]
+        return [p1_move, p2_move] + self.joy_move[2:]
 
-        # Check for tagging
-        self.check_tag()
-        if self.tag_timer > 0:
-            self.tag_timer -= 1
+    def step(self, actions):
+        """Advance one gameplay frame from scripted actions instead of devices.
 
-        # Accumulate tagged time for scoring
-        if self.state == GameState.PLAYING:
-            if self.player1.is_tagged:
-                self.p1_tag_time += 1
-            if self.player2.is_tagged:
-                self.p2_tag_time += 1
+        actions holds one (move, jump, dash) tuple per scripted player, in
+        the same order the live loop applies them: presses first, then
+        simulation. Bots still drive their own players.
+        """
+        self.update(moves=self.match.press(actions))
 
-        # Update camera
-        self.camera.update(self.player1, self.player2)
+    def update(self, moves=None):
+        """Update game state - called every frame during gameplay."""
+        if moves is None:
+            moves = self._sample_input()
+            if self.input_recorder:
+                self.input_recorder.end_frame(moves)
 
-        # Color transition step
+        # Color transition step (a portal touched below starts the next one)
         if self.transition_active:
             self.transition_elapsed += 1.0 / FPS
             t = min(1.0, self.transition_elapsed / self.transition_duration)
@@ -766,140 +2876,37 @@ class Game:
                 self.transition_active = False
                 self.ui_t = self.ui_to
 
-        # First-frame fix to move initial portal onto a platform
-        if self.portal_needs_platform_fix and self.portal_spawn_delay == 0:
-            if self.platforms:
-                w, h = (self.portal.rect.size if self.portal else (40, 80))
-                self._spawn_portal_on_random_platform(w, h)
-                self.portal_needs_platform_fix = False
-
-        # Handle portal spawn delay
-        if self.portal_spawn_delay > 0:
-            self.portal_spawn_delay -= 1
-            if self.portal_spawn_delay == 0:
-                # Spawn after delay if portal is absent
-                if self.portal is None:
-                    self._spawn_portal_on_random_platform(40, 80)
-
-        # Fade-in timer for newly spawned portals
-        if self.portal and self.portal_fade_timer < self.portal_fade_duration:
-            self.portal_fade_timer = min(self.portal_fade_duration, self.portal_fade_timer + 1.0 / FPS)
-
-        # Portal collision: toggle colors and start respawn delay
-        if self.portal_cooldown > 0:
-            self.portal_cooldown -= 1
-        portal_ready = (
-            self.portal
-            and self.portal_cooldown == 0
-            and self.portal_fade_timer >= self.portal_fade_duration
-        )
-        if portal_ready:
-            if (self.player1.get_bounds().colliderect(self.portal.rect) or
-                self.player2.get_bounds().colliderect(self.portal.rect)):
-                if not self.is_upside_down:
-                    self._start_transition_to_upside_down()
-                    self.is_upside_down = True
-                else:
-                    self._start_transition_to_light()
-                    self.is_upside_down = False
-                # Despawn portal and schedule a delayed respawn (5-10s)
-                self.portal = None
-                self.portal_spawn_delay = random.randint(5 * FPS, 10 * FPS)
-                self.portal_cooldown = max(10, FPS // 4)
-
-        # Update game timer
-        if self.state == GameState.PLAYING:
-            self.frame_counter += 1
-            if self.frame_counter >= FPS:
-                self.frame_counter = 0
-                self.match_seconds -= 1
-
-                if self.match_seconds <= 0:
-                    if self.player1.is_tagged and not self.player2.is_tagged:
-                        self.state = GameState.GAME_OVER_P2
-                    elif self.player2.is_tagged and not self.player1.is_tagged:
-                        self.state = GameState.GAME_OVER_P1
-                    else:
-                        self.state = GameState.GAME_OVER_P2
-
-    def draw_ui(self):
-        """Draw HUD elements during gameplay."""
-        # Tag status banner (show which player is 'it' using their selected color)
-        if self.player1.is_tagged:
-            tagged_text = "PLAYER 1 IS IT!"
-            color = self.player1.color_shirt
-        else:
-            tagged_text = "PLAYER 2 IS IT!"
-            color = self.player2.color_shirt
+        # Bots, physics, tags, the portal and the match clock
+        self.match.update(moves)
+        if self.particles:
+            self._spawn_movement_particles()
+            self.particles.update()
 
-        text_surface = self.font_main.render(tagged_text, True, color)
-        # place banner just under the top UI (dash bars)
-        self.screen.blit(text_surface, 
-                        (SCREEN_WIDTH // 2 - text_surface.get_width() // 2, 10 + 15 + 4))
-        
-        # Controls guide
-        ui_color = self._ui_color()
-        p1_text = self.font_small.render("P1: A / D move, W jump, R dash", True, ui_color)
-        p2_text = self.font_small.render("P2: LEFT / RIGHT move, UP jump, U dash", True, ui_color)
-        self.screen.blit(p1_text, (10, 50))
-        self.screen.blit(p2_text, (10, 75))
-        
-        # Match timer (moved slightly lower so it doesn't overlap with top dash bars)
-        timer_surface = self.font_main.render(f"Time: {self.match_seconds}s", True, ui_color)
-        timer_x = SCREEN_WIDTH - timer_surface.get_width() - 10
-        # place timer beneath the top dash bars (dash bars at y=10, height=15)
-        timer_y = 10 + 15 + 8
-        self.screen.blit(timer_surface, (timer_x, timer_y))
-
-    def draw_dash_cooldown(self):
-        """Draw dash cooldown bars for both players at the top of the screen."""
-        ui_color = self._ui_color()
-        # Player 1 Dash Cooldown Bar (Top Left)
-        p1_bar_width = 200
-        p1_bar_height = 15
-        p1_bar_x = 10
-        p1_bar_y = 10
-        p1_cooldown_ratio = 1 - (self.player1.dash_cooldown / (FPS * 5))
-        p1_fill_width = int(p1_bar_width * p1_cooldown_ratio)
-
-        pygame.draw.rect(self.screen, ui_color, (p1_bar_x, p1_bar_y, p1_bar_width, p1_bar_height), 2)
-        pygame.draw.rect(self.screen, self.player1.color_shirt, (p1_bar_x, p1_bar_y, p1_fill_width, p1_bar_height))
-
-        # Player 2 Dash Cooldown Bar (Top Right)
-        p2_bar_width = 200
-        p2_bar_height = 15
-        p2_bar_x = SCREEN_WIDTH - p2_bar_width - 10
-        p2_bar_y = 10
-        p2_cooldown_ratio = 1 - (self.player2.dash_cooldown / (FPS * 5))
-        p2_fill_width = int(p2_bar_width * p2_cooldown_ratio)
-
-        pygame.draw.rect(self.screen, ui_color, (p2_bar_x, p2_bar_y, p2_bar_width, p2_bar_height), 2)
-        pygame.draw.rect(self.screen, self.player2.color_shirt, (p2_bar_x, p2_bar_y, p2_fill_width, p2_bar_height))
-
-    def draw_game_over(self):
-        """Draw game over screen with winner announcement."""
-        if self.state == GameState.GAME_OVER_P1:
-            title = "PLAYER 1 WINS!"
-            color = self.player1.color_shirt
-        else:
-            title = "PLAYER 2 WINS!"
-            color = self.player2.color_shirt
-        
-        # Title
-        title_surface = self.font_big.render(title, True, color)
-        self.screen.blit(title_surface, 
-                        (SCREEN_WIDTH // 2 - title_surface.get_width() // 2,
-                         SCREEN_HEIGHT // 2 - 60))
-        
-        # Instructions
-        info1 = self.font_main.render("Press 6 for Title Screen", True, BLACK)
-        info2 = self.font_main.render("Press 5 to quit", True, BLACK)
-        self.screen.blit(info1, 
-                        (SCREEN_WIDTH // 2 - info1.get_width() // 2,
-                         SCREEN_HEIGHT // 2 + 20))
-        self.screen.blit(info2, 
-                        (SCREEN_WIDTH // 2 - info2.get_width() // 2,
-                         SCREEN_HEIGHT // 2 + 50))
+        # Update camera
+        self.camera.update(*self.players)
+        if self.split_screen:
+            self._update_split_screen()
+
+        if self.replay:
+            self.replay.record(self)
+        if self.live_state:
+            self.publish_live_state()
+
+    def publish_live_state(self):
+        """Write the match state into the shared live state block."""
+        writer = self.live_state
+        screens = ((self.show_title_screen and live_state.SCREEN_TITLE)
+                   | (self.show_color_selection_screen and live_state.SCREEN_COLORS)
+                   | (self.show_start_screen and live_state.SCREEN_START)
+                   | (self.replay_position is not None and live_state.SCREEN_REPLAY))
+        writer.begin()
+        writer.write_match(self.sim_frames, self.state.value, screens, self.num_players,
+                           self.winner.player_id if self.winner else 0, self.match_seconds,
+                           self.config.dash_cooldown, self.map_width, MAP_HEIGHT)
+        for slot, player in enumerate(self.players):
+            writer.write_player(slot, player.player_id, player.is_tagged, player.x, player.y,
+                                player.tag_time / FPS, player.dash_cooldown)
+        writer.end()
 
     def draw_title_screen(self):
         """Draw the title screen."""
@@ -1259,47 +3266,20 @@ class Game:
                 self.show_color_selection_screen = False
                 self.show_start_screen = True
 
-    def draw(self):
-        """Main draw method - renders everything."""
-        # Draw pre-rendered background (HUGE performance boost!)
-        self.screen.blit(self.background_surface, (0, 0))
-        
-        # Draw animated clouds
-        cloud_time = pygame.time.get_ticks() // 100
-        for i in range(4):
-            cloud_x = (i * 350 + cloud_time) % (SCREEN_WIDTH + 200) - 100
-            cloud_y = 40 + (i % 2) * 60
-            self.draw_cloud(self.screen, cloud_x, cloud_y, 50)
-        
-        # Get camera transform
-        zoom, cam_x, cam_y = self.camera.get_transform()
-        
-        # Draw world objects
-        for platform in self.platforms:
-            platform.draw(self.screen, zoom, cam_x, cam_y, 
-                         self.current_platform_brown, 
-                         self.current_platform_dark, 
-                         self.current_grass_color)
-
-        # Draw portal on top of platforms but behind players
-        if self.portal:
-            if self.portal_fade_duration <= 0:
-                alpha = 1.0
-            else:
-                alpha = min(1.0, self.portal_fade_timer / self.portal_fade_duration)
-            self.portal.draw(self.screen, zoom, cam_x, cam_y, alpha)
-        
-        self.player1.draw(self.screen, zoom, cam_x, cam_y)
-        self.player2.draw(self.screen, zoom, cam_x, cam_y)
-        
-        # Draw UI overlay
-        if self.state == GameState.PLAYING:
-            self.draw_ui()
-            self.draw_dash_cooldown()
-        else:
-            self.draw_game_over()
-        
-        pygame.display.flip()
+    def draw(self, snapshot=None):
+        """Main draw method - renders everything.
+
+        Draws from a RenderSnapshot; without one the current state is
+        captured first, which is what the single-threaded loop does.
+        """
+        if snapshot is None:
+            snapshot = self.render_snapshot.capture(self)
+        banner = None
+        if snapshot is self.replay_snapshot:
+            banner = "REPLAY" if self.replay_speed >= 1 else "REPLAY (SLOW)"
+        self.renderer.draw(snapshot, banner)
+        if not self.headless:
+            pygame.display.flip()
 
     def handle_event(self, event):
         """Handle pygame events."""
@@ -1308,45 +3288,69 @@ class Game:
         elif event.type == pygame.KEYDOWN:
             if self.show_start_screen:
                 if event.key == pygame.K_1:
-                    # Default map: light colors + normal gravity
-                    self._reset_to_default_theme()
-                    self._set_normal_gravity()
-                    self.platforms = self.generate_platforms()
+                    self.select_map("default")
                     self.show_start_screen = False
                 elif event.key == pygame.K_6:
-                    # Floating map gameplay: light colors + low gravity
-                    self._reset_to_default_theme()
-                    self._set_low_gravity()
-                    self.platforms = self.generate_floating_platforms()
+                    self.select_map("floating")
                     self.show_start_screen = False
                 elif event.key == pygame.K_2:
-                    # Narrow map: light colors + normal gravity
-                    self._reset_to_default_theme()
-                    self._set_normal_gravity()
-                    self.platforms = self.generate_narrow_platforms()
+                    self.select_map("narrow")
                     self.show_start_screen = False
             else:
                 if event.key == pygame.K_5:
                     self.running = False
-                
-                if self.state == GameState.PLAYING:
+
+                if self.replay_position is not None:
+                    # Any key cuts a replay short
+                    self.stop_replay()
+                elif event.key == pygame.K_i and self.replay and self.replay.recorded:
+                    self.start_replay(slow=bool(getattr(event, "mod", 0) & pygame.KMOD_SHIFT))
+                elif self.state == GameState.PLAYING:
                     if event.key == pygame.K_w:
-                        self.player1.jump()
+                        self._jump(self.player1)
                     if event.key == pygame.K_UP:
-                        self.player2.jump()
+                        self._jump(self.player2)
                     if event.key == pygame.K_r:
-                        self.player1.dash()
+                        self._dash(self.player1)
                     if event.key == pygame.K_u:
-                        self.player2.dash()
+                        self._dash(self.player2)
+                    if self.input_recorder:
+                        self.input_recorder.press(event.key)
                 else:
                     # Game over - go to title screen on 6
                     if event.key == pygame.K_6:
                         self.go_to_title_screen()
 
+    def select_map(self, map_type):
+        """Apply the theme and gravity for a map type and generate its platforms."""
+        self._emit("map", MAP_CODES.get(map_type, 0))
+        self._reset_to_default_theme()
+        self.match.select_map(map_type)
+
+    def _update_split_screen(self):
+        """Split the view when the shared camera must zoom out too far; merge once the players close in."""
+        if self.num_players != 2:
+            return
+        split_below, merge_above = SPLIT_SCREEN_ZOOM
+        if self.split_cameras is None and self.camera.target_zoom < split_below:
+            self.split_cameras = []
+            for player in sorted(self.players, key=lambda player: player.x):
+                camera = Camera(self.ground_top, self.map_width, SPLIT_VIEW_WIDTH, SCREEN_HEIGHT, SPLIT_ZOOM_STEP)
+                # Zoom in from the shared view, starting centred on the player
+                camera.zoom = self.camera.zoom
+                camera.update(player)
+                scale = camera.zoom / camera.target_zoom
+                camera.x = (camera.target_x + camera.width / 2) * scale - camera.width / 2
+                camera.y = (camera.target_y + camera.height / 2) * scale - camera.height / 2
+                self.split_cameras.append((player, camera))
+        elif self.split_cameras is not None and self.camera.target_zoom > merge_above:
+            self.split_cameras = None
+        for player, camera in self.split_cameras or ():
+            camera.update(player)
+
     def _reset_to_default_theme(self):
         """Reset all theme settings to default normal map colors and gravity."""
-        global GRAVITY
-        GRAVITY = 0.5
+        self.gravity = self.config.normal_gravity
         self.current_sky_top = SKY_TOP
         self.current_sky_bottom = SKY_BOTTOM
         self.current_mountain_light = MOUNTAIN_LIGHT
@@ -1356,13 +3360,15 @@ class Game:
         self.current_platform_dark = PLATFORM_DARK
         self.current_grass_color = GRASS_COLOR
         self.ui_t = 0.0
-        self.background_surface = self.create_background()
+        # The default sky never changes, so it is rendered once and reused every match
+        if self.default_background is None:
+            self.default_background = self.create_background()
+        self.background_surface = self.default_background
         self.is_upside_down = False
     
     def _set_floating_theme(self):
         """Set theme for floating platforms map with upside-down colors."""
-        global GRAVITY
-        GRAVITY = 0.2
+        self.gravity = self.config.low_gravity
         self.current_sky_top = UPSIDE_DOWN_SKY_TOP
         self.current_sky_bottom = UPSIDE_DOWN_SKY_BOTTOM
         self.current_mountain_light = UPSIDE_DOWN_MOUNTAIN_LIGHT
@@ -1439,86 +3445,15 @@ class Game:
         )
         self._start_color_transition(target, 0.0)
 
-    def _spawn_portal_on_random_platform(self, portal_w=40, portal_h=80, force_ground_fallback=False):
-        """Place the portal on top of a random non-ground platform.
-        If platforms missing or forced, use a ground fallback near center.
-        """
-        if not self.platforms or force_ground_fallback:
-            x = MAP_WIDTH // 2 - portal_w // 2
-            y = max(0, self.ground_top - portal_h)
-            if self.portal is None:
-                self.portal = Portal(x, y, portal_w, portal_h)
-            else:
-                self.portal.rect.update(x, y, portal_w, portal_h)
-            self.portal_fade_timer = 0.0
-            return
-
-        # Exclude ground platform (assumed first in list) and require enough width
-        candidates = [p for p in self.platforms[1:] if p.rect.width >= portal_w + 10]
-
-        # If no suitable non-ground platforms, fall back to widest non-ground or ground
-        if not candidates:
-            non_ground = self.platforms[1:] if len(self.platforms) > 1 else []
-            if non_ground:
-                platform = max(non_ground, key=lambda p: p.rect.width)
-            else:
-                platform = self.platforms[0]
-        else:
-            platform = random.choice(candidates)
-
-        # Center the portal on the chosen platform and keep inside bounds
-        x = platform.rect.centerx - portal_w // 2
-        x = max(platform.rect.left, min(x, platform.rect.right - portal_w))
-        y = platform.rect.top - portal_h
-        y = max(0, y)
-
-        if self.portal is None:
-            self.portal = Portal(x, y, portal_w, portal_h)
-        else:
-            self.portal.rect.update(x, y, portal_w, portal_h)
-        self.portal_fade_timer = 0.0
-
-    def _set_normal_gravity(self):
-        global GRAVITY
-        GRAVITY = 0.5
-
-    def _set_low_gravity(self):
-        global GRAVITY
-        GRAVITY = 0.2
-
     def reset(self):
         """Reset game state for a new match."""
-        ground_spawn_y = self.ground_top - PLAYER_HEIGHT
-        self.player1 = Player(200, ground_spawn_y, 1, RED, RED)
-        self.player2 = Player(MAP_WIDTH - 200, ground_spawn_y, 2, BLUE, BLUE)
-        
-        self.player1.is_tagged = True
-        self.player2.is_tagged = False
-        self.tag_timer = 0
-        
-        self.p1_tag_time = 0
-        self.p2_tag_time = 0
-        self.match_seconds = MATCH_DURATION
-        self.frame_counter = 0
-        self.state = GameState.PLAYING
-        
-        # Reset to default theme
         self._reset_to_default_theme()
-        self._set_normal_gravity()
-        
-        # Regenerate platforms for variety
-        self.platforms = self.generate_platforms()
+        # Respawn players and portal on a fresh default layout
+        self.match.reset()
         
         # Reset camera
-        self.camera = Camera(self.ground_top)
-
-        # Recreate portal: spawn fallback then fix onto platform next update
-        self.portal_cooldown = 0
-        self.portal_spawn_delay = 0
-        self.portal_needs_platform_fix = True
-        self.portal_fade_timer = 0.0
-        self.portal = None
-        self._spawn_portal_on_random_platform(40, 80, force_ground_fallback=True)
+        self.camera = Camera(self.ground_top, self.map_width)
+        self.split_cameras = None
 
     def go_to_title_screen(self):
         """Reset gameplay state, then show the DANGER THINGS title screen."""
@@ -1529,89 +3464,1658 @@ class Game:
         self.show_color_selection_screen = False
         self.show_start_screen = False
 
-    def _is_too_close(self, platforms, candidate, pad_x, pad_y):
-        """Reject platform placement when padded candidate bounds collide with any existing platform."""
-        padded = candidate.rect.inflate(pad_x * 2, pad_y * 2)
-        return any(padded.colliderect(existing.rect) for existing in platforms)
-
-    def generate_platforms(self):
-        """Generate the default map with evenly spaced common platforms (no overlaps)."""
-        platforms = []
-        platforms.append(Platform(0, MAP_HEIGHT - GROUND_HEIGHT, MAP_WIDTH, GROUND_HEIGHT))
-
-        attempts = 0
-        target = 26
-        while len(platforms) - 1 < target and attempts < target * 30:
-            attempts += 1
-            w = random.randint(150, 320)
-            x = random.randint(10, MAP_WIDTH - w - 10)
-            y = random.randint(140 + PLATFORM_Y_OFFSET, MAP_HEIGHT - GROUND_HEIGHT - 260 + PLATFORM_Y_OFFSET)
-            candidate = Platform(x, y, w, 44)
-            if not self._is_too_close(platforms, candidate, 50, 120):
-                platforms.append(candidate)
-        return platforms
+    def _handle_joystick_event(self, event):
+        """Track gamepad hot-plugging and stick state.
 
-    def generate_floating_platforms(self):
-        """Generate a map with mostly floating platforms (no overlaps)."""
-        platforms = []
-        platforms.append(Platform(0, MAP_HEIGHT - GROUND_HEIGHT, MAP_WIDTH, GROUND_HEIGHT))
-        attempts = 0
-        target = 20
-        while len(platforms) - 1 < target and attempts < target * 25:
-            attempts += 1
-            fw = random.randint(120, 280)
-            fx = random.randint(10, MAP_WIDTH - fw - 10)
-            fy = random.randint(120 + PLATFORM_Y_OFFSET, MAP_HEIGHT - 340 + PLATFORM_Y_OFFSET)
-            candidate = Platform(fx, fy, fw, 40)
-            if not self._is_too_close(platforms, candidate, 60, 140):
-                platforms.append(candidate)
-        
-        return platforms
-
-    def generate_narrow_platforms(self):
-        """Generate a map with narrow and challenging platforms (no overlaps)."""
-        platforms = []
-        platforms.append(Platform(0, MAP_HEIGHT - GROUND_HEIGHT, MAP_WIDTH, GROUND_HEIGHT))
-        attempts = 0
-        target = 15
-        while len(platforms) - 1 < target and attempts < target * 25:
-            attempts += 1
-            nw = random.randint(90, 160)
-            nx = random.randint(10, MAP_WIDTH - nw - 10)
-            ny = random.randint(120 + PLATFORM_Y_OFFSET, MAP_HEIGHT - 340 + PLATFORM_Y_OFFSET)
-            candidate = Platform(nx, ny, nw, 30)
-            if not self._is_too_close(platforms, candidate, 50, 120):
-                platforms.append(candidate)
-        return platforms
+        Presses are translated into the keyboard event the owning player would
+        have produced on the current screen, so the screen handlers stay
+        keyboard-only. Returns that KEYDOWN event, or None.
+        """
+        if event.type == pygame.JOYDEVICEADDED:
+            joystick = pygame.joystick.Joystick(event.device_index)
+            free_slots = [slot for slot in range(self.num_players)
+                          if slot not in self.bots and slot not in self.joystick_slots.values()]
+            if free_slots:
+                self.joysticks[joystick.get_instance_id()] = joystick
+                self.joystick_slots[joystick.get_instance_id()] = free_slots[0]
+            return None
+        if event.type == pygame.JOYDEVICEREMOVED:
+            self.joysticks.pop(event.instance_id, None)
+            slot = self.joystick_slots.pop(event.instance_id, None)
+            if slot is not None:
+                self.joy_move[slot] = 0
+            return None
+
+        slot = self.joystick_slots.get(getattr(event, "instance_id", None))
+        if slot is None:
+            return None
+        if slot >= len(PLAYER_KEYS):
+            return self._handle_extra_joystick_event(slot, event)
+        left_key, right_key, jump_key, dash_key = PLAYER_KEYS[slot]
+
+        if event.type in (pygame.JOYAXISMOTION, pygame.JOYHATMOTION):
+            move = self._joystick_move(event)
+            if move is None:
+                return None
+            previous = self.joy_move[slot]
+            self.joy_move[slot] = move
+            # Only a fresh push counts as a press (used to cycle colors in menus)
+            if move != 0 and move != previous:
+                return pygame.event.Event(pygame.KEYDOWN, key=left_key if move < 0 else right_key)
+            return None
+
+        if event.type != pygame.JOYBUTTONDOWN:
+            return None
+        button = event.button
+        key = None
+        if self.show_title_screen or self.show_color_selection_screen:
+            if button in (JOY_BUTTON_JUMP, JOY_BUTTON_START):
+                key = pygame.K_SPACE
+        elif self.show_start_screen:
+            key = {JOY_BUTTON_JUMP: pygame.K_1, JOY_BUTTON_ALT: pygame.K_2, JOY_BUTTON_DASH: pygame.K_6}.get(button)
+        elif self.state == GameState.PLAYING:
+            if button == JOY_BUTTON_JUMP:
+                key = jump_key
+            elif button in (JOY_BUTTON_DASH, JOY_BUTTON_ALT):
+                key = dash_key
+        elif button in (JOY_BUTTON_JUMP, JOY_BUTTON_START):
+            key = pygame.K_6
+        if key is None:
+            return None
+        return pygame.event.Event(pygame.KEYDOWN, key=key)
+
+    def _joystick_move(self, event):
+        """Horizontal -1/0/1 intent of a stick or hat event (None for other axes)."""
+        if event.type == pygame.JOYAXISMOTION:
+            if event.axis != 0:
+                return None
+            value = event.value
+        else:
+            value = event.value[0]
+        return -1 if value < -JOYSTICK_DEADZONE else (1 if value > JOYSTICK_DEADZONE else 0)
+
+    def _handle_extra_joystick_event(self, slot, event):
+        """Gamepads of players 3 and up have no keyboard equivalent, so act directly."""
+        if event.type in (pygame.JOYAXISMOTION, pygame.JOYHATMOTION):
+            move = self._joystick_move(event)
+            if move is not None:
+                self.joy_move[slot] = move
+        elif event.type == pygame.JOYBUTTONDOWN and self.state == GameState.PLAYING:
+            menus = self.show_title_screen or self.show_color_selection_screen or self.show_start_screen
+            if not menus:
+                player = self.players[slot]
+                if event.button == JOY_BUTTON_JUMP:
+                    self._jump(player)
+                elif event.button in (JOY_BUTTON_DASH, JOY_BUTTON_ALT):
+                    self._dash(player)
+        return None
+
+    def enable_vsync(self):
+        """Reopen the window synced to the display; returns False when the driver can't."""
+        try:
+            self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SCALED, vsync=1)
+        except pygame.error:
+            return False
+        return True
+
+    def _wait_for_late_input(self):
+        """Sleep until just before the next frame deadline so input is sampled late.
+
+        The wake-up point is the deadline minus a running estimate of how long
+        sampling, simulation and drawing take, minus a small safety margin.
+        """
+        period = 1.0 / FPS
+        now = time.perf_counter()
+        if self.present_deadline is None or now > self.present_deadline + period:
+            # First frame, or we fell badly behind: re-anchor instead of bursting
+            self.present_deadline = now + period
+        wake_at = self.present_deadline - self.frame_work_estimate - LATE_INPUT_MARGIN
+        if wake_at > now:
+            time.sleep(wake_at - now)
+        self.present_deadline += period
+
+    def _record_input_latency(self, input_seq=None):
+        """Measure input-to-present latency for the frame that was just flipped.
+
+        In threaded mode input_seq is the sample the presented snapshot's
+        step consumed; each sample is measured once, when first presented.
+        """
+        if input_seq is not None:
+            samples = self.input_samples
+            while samples and samples[0][0] < input_seq:
+                samples.popleft()  # superseded before any step consumed it
+            if not samples or samples[0][0] != input_seq:
+                return
+            self.input_sample_time = samples.popleft()[1]
+        if self.input_sample_time is None:
+            return
+        latency = time.perf_counter() - self.input_sample_time
+        self.input_sample_time = None
+        # Exponential moving average of frame work, used by the late scheduler
+        self.frame_work_estimate += (latency - self.frame_work_estimate) * 0.1
+        if self.latency_hook:
+            self.latency_hook(latency * 1000.0)
+
+    def _gameplay_active(self):
+        """True while the match itself is being played (no menus, no game over)."""
+        menus = self.show_title_screen or self.show_color_selection_screen or self.show_start_screen
+        return not menus and self.state == GameState.PLAYING and self.replay_position is None
+
+    def start_replay(self, slow=False):
+        """Pause the match and play back the replay buffer.
+
+        A normal-speed replay shows everything recorded. A slow one covers
+        REPLAY_LEAD_SECONDS either side of the latest tag or portal flip,
+        or just the last moments when none is still in the buffer.
+        """
+        replay = self.replay
+        start = replay.oldest
+        end = replay.recorded
+        if slow:
+            lead = REPLAY_LEAD_SECONDS * FPS
+            highlight = replay.last_mark if replay.last_mark >= start else end - lead
+            start = max(start, highlight - lead)
+            end = min(end, highlight + lead)
+        # The players' looks (colours, size, ids) don't change mid-match
+        self.replay_snapshot.capture(self)
+        self.replay_snapshot.dash_cooldown = self.config.dash_cooldown
+        self.replay_position = float(start)
+        self.replay_end = end
+        self.replay_speed = REPLAY_SLOW_SPEED if slow else 1.0
+
+    def stop_replay(self):
+        self.replay_position = None
+        self.painted_screen = None
+
+    def _draw_replay_frame(self):
+        """Draw the recorded frame under the replay cursor and advance it."""
+        snapshot = self.replay.restore(int(self.replay_position), self.replay_snapshot)
+        snapshot.background_surface = self.renderer.background_for(snapshot)
+        self.draw(snapshot)
+        self.replay_position += self.replay_speed * FPS / self.pacer.rate
+        if self.replay_position >= self.replay_end:
+            self.stop_replay()
+
+    def _simulate_frame(self, moves=None):
+        """Advance the simulation one frame and report it to step_hook."""
+        self.update(moves)
+        if self.step_hook:
+            self.step_hook(time.perf_counter())
+
+    def start_simulation(self):
+        """Start the fixed-rate simulation thread used in threaded mode."""
+        self.sim_stop.clear()
+        self.render_buffer.clear()
+        # With a GIL, the default 5 ms hand-off lets a busy render thread
+        # delay physics steps by whole milliseconds; free-threaded builds
+        # run both threads in parallel and don't need this
+        if getattr(sys, "_is_gil_enabled", lambda: True)():
+            self.saved_switch_interval = sys.getswitchinterval()
+            sys.setswitchinterval(min(self.saved_switch_interval, SIM_SWITCH_INTERVAL))
+        self.sim_thread = threading.Thread(target=self._simulation_loop, name="simulation", daemon=True)
+        self.sim_thread.start()
+
+    def stop_simulation(self):
+        if self.sim_thread:
+            self.sim_stop.set()
+            self.sim_thread.join()
+            self.sim_thread = None
+        if self.saved_switch_interval is not None:
+            sys.setswitchinterval(self.saved_switch_interval)
+            self.saved_switch_interval = None
+
+    def _simulation_loop(self):
+        """Step gameplay every 1/FPS seconds and publish a snapshot after each step.
+
+        Steps are scheduled against absolute deadlines, so a slow render on
+        the main thread never delays physics. Only when the simulation itself
+        falls more than a frame behind does it re-anchor instead of bursting.
+        """
+        period = 1.0 / FPS
+        next_step = time.perf_counter()
+        while not self.sim_stop.is_set():
+            with self.sim_lock:
+                if self._gameplay_active():
+                    seq, moves = self.latest_input
+                    moves = list(moves)
+                    if self.input_recorder:
+                        self.input_recorder.end_frame(moves)
+                    self._simulate_frame(moves)
+                    self.render_buffer.back.capture(self)
+                    self.render_buffer.back.input_seq = seq
+                    self.render_buffer.publish()
+            next_step += period
+            delay = next_step - time.perf_counter()
+            if delay > 0:
+                self.sim_stop.wait(delay)
+            elif delay < -period:
+                next_step = time.perf_counter()
+
+    def _wait_for_menu_events(self):
+        """Block until input arrives or the menu tick passes; returns the pending events.
+
+        The tick drops from MENU_FPS to MENU_IDLE_FPS after MENU_IDLE_SECONDS
+        without input (see MENU_INPUT_EVENTS), so an unattended cabinet
+        barely wakes up.
+        """
+        idle = time.perf_counter() - self.last_input_time > MENU_IDLE_SECONDS
+        first = pygame.event.wait(1000 // (MENU_IDLE_FPS if idle else MENU_FPS))
+        if first.type == pygame.NOEVENT:
+            return []
+        return [first] + pygame.event.get()
 
     def run(self):
-        """Main game loop."""
-        while self.running:
-            for event in pygame.event.get():
-                if self.show_title_screen:
-                    self.handle_title_screen_event(event)
-                elif self.show_color_selection_screen:
-                    self.handle_color_selection_event(event)
-                else:
-                    self.handle_event(event)
+        """Main game loop.
 
-            if self.show_title_screen:
+        During play it runs at FPS. Menus and the game-over screen instead
+        block on input and repaint only when something changed; game-over
+        keeps the last world frame on screen.
+        """
+        if self.threaded:
+            self.start_simulation()
+        while self.running:
+            menu = not self._gameplay_active() and self.replay_position is None
+            if menu:
+                events = self._wait_for_menu_events()
+            else:
+                if self.input_mode == InputMode.LATE:
+                    self._wait_for_late_input()
+                events = pygame.event.get()
+
+            repaint = False
+            for event in events:
+                moves = list(self.joy_move) if event.type == pygame.JOYAXISMOTION else None
+                translated = self._handle_joystick_event(event)
+                if event.type in MENU_INPUT_EVENTS or (moves is not None and moves != self.joy_move):
+                    self.last_input_time = time.perf_counter()
+                if translated is not None:
+                    event = translated
+                repaint = repaint or event.type in MENU_REPAINT_EVENTS
+                # Handlers change game state, so keep the simulation thread out meanwhile
+                with self.sim_lock:
+                    if self.show_title_screen:
+                        self.handle_title_screen_event(event)
+                    elif self.show_color_selection_screen:
+                        self.handle_color_selection_event(event)
+                    else:
+                        self.handle_event(event)
+                    if self.live_state:
+                        self.publish_live_state()
+
+            screen = (self.show_title_screen, self.show_color_selection_screen,
+                      self.show_start_screen, self.state)
+            presented = False  # a gameplay or replay frame went to the screen
+            if menu and not repaint and screen == self.painted_screen:
+                # Nothing changed, so the last frame stays up; spectators still get the frozen state
+                if self.spectators and self.state != GameState.PLAYING:
+                    self.spectators.publish(self.render_buffer.latest() if self.threaded else self.render_snapshot)
+            elif self.show_title_screen:
                 self.draw_title_screen()
             elif self.show_color_selection_screen:
                 self.draw_color_selection_screen()
             elif self.show_start_screen:
                 self.draw_start_screen()
+            elif self.replay_position is not None:
+                self._draw_replay_frame()
+                presented = True
+            elif self.threaded:
+                # The simulation thread reads the newest held input on its next step
+                moves = self._sample_input()
+                self.input_seq += 1
+                self.input_samples.append((self.input_seq, self.input_sample_time))
+                self.latest_input = (self.input_seq, moves)
+                snapshot = self.render_buffer.latest()
+                if snapshot:
+                    self.draw(snapshot)
+                    presented = not menu
+                    self._record_input_latency(snapshot.input_seq)
+                    if self.spectators:
+                        self.spectators.publish(snapshot)
             elif self.state == GameState.PLAYING:
-                self.update()
+                # Render rates above FPS re-present the latest state between fixed steps
+                for _ in range(self.pacer.sim_steps()):
+                    self._simulate_frame()
+                    if self.state != GameState.PLAYING:
+                        break
                 self.draw()
+                presented = True
+                self._record_input_latency()
+                if self.spectators:
+                    self.spectators.publish(self.render_snapshot)
             elif self.state != GameState.PLAYING:
                 self.draw()
-
-            self.clock.tick(FPS)
+                if self.spectators:
+                    self.spectators.publish(self.render_snapshot)
+            self.painted_screen = screen if menu else None
+            # Generate upcoming maps only while nobody is playing
+            self.map_queue.set_active(not self._gameplay_active() and self.replay_position is None)
+            if self.threaded and not self._gameplay_active() and self.state == GameState.PLAYING:
+                # Don't show a stale match once play resumes from a menu
+                self.render_buffer.clear()
+            # Menus and the game-over screen are not part of the recording
+            if self.frame_capture and presented:
+                self.frame_capture.capture(self.screen)
+
+            self.clock.tick()
+            if menu:
+                # Paced by _wait_for_menu_events; don't count menu waits as frames
+                self.pacer.pause()
+                self.last_frame_time = None
+                continue
+            if self.input_mode != InputMode.LATE:  # LATE paces itself in _wait_for_late_input
+                self.pacer.wait()
+
+            if self.telemetry:
+                now = time.perf_counter()
+                if self.last_frame_time is not None:
+                    self.telemetry.frame(now - self.last_frame_time)
+                self.last_frame_time = now
+        self.stop_simulation()
+        self.map_queue.close()
+        self.audio.close()
         pygame.quit()
 
 
+# ==================== BATCH SIMULATION ====================
+# Constants a tournament sweep may override, with their shipped values
+TUNABLES = (
+    "BASE_SPEED", "TAGGED_SPEED_BOOST", "JUMP_VELOCITY", "FRICTION",
+    "NORMAL_GRAVITY", "LOW_GRAVITY", "TAG_COOLDOWN", "DASH_COOLDOWN", "MATCH_DURATION",
+    "MOVING_PLATFORMS",
+)
+TUNABLE_DEFAULTS = {name: globals()[name] for name in TUNABLES}
+MAP_TYPES = ("default", "floating", "narrow")
+
+
+class InputRecorder:
+    """Records each gameplay frame's actions as one JSON line per frame.
+
+    A line is [p1_move, p1_jump, p1_dash, p2_move, p2_jump, p2_dash], which is
+    what InputPlayback feeds back into Game.step.
+    """
+    def __init__(self, path):
+        self.file = open(path, "w")
+        self.pending = [[0, 0], [0, 0]]  # jump/dash presses seen since the last frame
+
+    def press(self, key):
+        for index, (_, _, jump_key, dash_key) in enumerate(PLAYER_KEYS):
+            if key == jump_key:
+                self.pending[index][0] = 1
+            elif key == dash_key:
+                self.pending[index][1] = 1
+
+    def end_frame(self, moves):
+        (p1_jump, p1_dash), (p2_jump, p2_dash) = self.pending
+        self.file.write(json.dumps([moves[0], p1_jump, p1_dash, moves[1], p2_jump, p2_dash]) + "\n")
+        self.pending = [[0, 0], [0, 0]]
+
+    def close(self):
+        self.file.close()
+
+
+def check_core(jobs):
+    """Play every job in a headless Game and in a bare tag_core.Match side by side.
+
+    Both step tag_core's simulation, but the game's GameMatch builds its
+    own layouts and players and runs the effect hooks, so the generated
+    layouts and tag_core.fingerprint() after every frame must still
+    match exactly. Bot-only jobs recorded in tag_core_golden.json must also
+    hash to their golden digest, so the two can't drift together. Prints
+    the first difference, if any, and the time each side spent simulating;
+    returns True when all matches agreed.
+    """
+    golden = tag_core.load_golden()
+    game_seconds = core_seconds = 0.0
+    frames = 0
+    checked = 0
+    for job in jobs:
+        config = MatchConfig(seed=job["seed"], **job["params"])
+        playback = InputPlayback.load(job["inputs"]) if job.get("inputs") else None
+        bots = 0 if playback else 2
+        game = Game(headless=True, num_bots=bots, config=config, map_type=job["map"])
+        game.show_title_screen = False
+        match = tag_core.Match(MatchConfig(seed=job["seed"], **job["params"]), job["map"], num_bots=bots)
+        label = f"seed {job['seed']} on {job['map']} with {job['params'] or 'defaults'}"
+        if tag_core.layout(game.platforms) != tag_core.layout(match.platforms):
+            print(f"{label}: generated layouts differ")
+            return False
+
+        frame_limit = (config.match_duration + 1) * FPS
+        frame = 0
+        digest = tag_core.fingerprint_digest(game.platforms)
+        while True:
+            expected = tag_core.fingerprint(game)
+            actual = tag_core.fingerprint(match)
+            if expected != actual:
+                print(f"{label}: state differs after frame {frame}\n  game: {expected}\n  core: {actual}")
+                return False
+            digest.update(actual.encode())
+            if game.state != GameState.PLAYING or frame >= frame_limit:
+                break
+            actions = playback.actions(game, frame) if playback else None
+            start = time.perf_counter()
+            if playback:
+                game.step(actions)
+            else:
+                game.update(moves=[0, 0])
+            middle = time.perf_counter()
+            if playback:
+                match.step(actions)
+            else:
+                match.update([0, 0])
+            core_seconds += time.perf_counter() - middle
+            game_seconds += middle - start
+            frame += 1
+        frames += frame
+        reference = None if playback else golden.get(tag_core.golden_key(job))
+        if reference:
+            if (frame, digest.hexdigest()) != reference:
+                print(f"{label}: {frame} frames hash to {digest.hexdigest()}, "
+                      f"golden is {reference[0]} frames with {reference[1]}")
+                return False
+            checked += 1
+    print(f"{len(jobs)} matches, {frames} frames: game and tag_core states identical on every frame")
+    print(f"{checked} of them matched their golden digests ({len(golden)} recorded)")
+    print(f"simulation time per match: game {game_seconds / len(jobs) * 1000:.1f} ms, "
+          f"tag_core {core_seconds / len(jobs) * 1000:.1f} ms")
+    return True
+
+
+class TournamentReport:
+    """Aggregates streamed match results per (map, parameter set)."""
+    def __init__(self):
+        self.groups = {}
+
+    def add(self, result):
+        key = (result["map"], json.dumps(result["params"], sort_keys=True))
+        group = self.groups.setdefault(key, {
+            "map": result["map"], "params": result["params"], "matches": 0,
+            "p1_wins": 0, "p2_wins": 0, "p1_tag_time": 0.0, "p2_tag_time": 0.0,
+            "tags": 0, "portal_uses": 0,
+        })
+        group["matches"] += 1
+        if result["winner"] == 1:
+            group["p1_wins"] += 1
+        elif result["winner"] == 2:
+            group["p2_wins"] += 1
+        for field in ("p1_tag_time", "p2_tag_time", "tags", "portal_uses"):
+            group[field] += result[field]
+
+    def rows(self):
+        rows = []
+        for key in sorted(self.groups):
+            group = self.groups[key]
+            n = group["matches"]
+            rows.append({
+                "map": group["map"],
+                "params": group["params"],
+                "matches": n,
+                "p1_win_rate": group["p1_wins"] / n,
+                "p2_win_rate": group["p2_wins"] / n,
+                "mean_p1_tag_time": group["p1_tag_time"] / n,
+                "mean_p2_tag_time": group["p2_tag_time"] / n,
+                "mean_tags": group["tags"] / n,
+                "mean_portal_uses": group["portal_uses"] / n,
+            })
+        return rows
+
+    def format(self):
+        lines = []
+        for row in self.rows():
+            params = ", ".join(f"{k}={v}" for k, v in sorted(row["params"].items())) or "defaults"
+            lines.append(
+                f"{row['map']:<9} {params:<40} n={row['matches']:<5} "
+                f"P1 win {row['p1_win_rate']:.0%}  P2 win {row['p2_win_rate']:.0%}  "
+                f"it-time {row['mean_p1_tag_time']:.1f}s/{row['mean_p2_tag_time']:.1f}s  "
+                f"tags {row['mean_tags']:.1f}  portals {row['mean_portal_uses']:.1f}")
+        return "\n".join(lines)
+
+
+def parse_sweep(spec):
+    """Parse 'NAME=v1,v2,...' into (NAME, [values]) using the default's type."""
+    name, _, values = spec.partition("=")
+    name = name.strip().upper()
+    if name not in TUNABLE_DEFAULTS or not values:
+        raise argparse.ArgumentTypeError(
+            f"expected NAME=v1,v2 with NAME one of {', '.join(TUNABLES)}")
+    cast = type(TUNABLE_DEFAULTS[name])
+    try:
+        return name, [cast(v) for v in values.split(",")]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{name} takes {cast.__name__} values")
+
+
+def build_tournament_jobs(matches, maps, sweeps, base_seed, inputs=None, heatmap=False):
+    """Every grid point plays the same seeds so parameter sets are compared fairly."""
+    names = [name for name, _ in sweeps]
+    grids = itertools.product(*[values for _, values in sweeps])
+    jobs = []
+    for combo in grids:
+        params = dict(zip(names, combo))
+        for map_type in maps:
+            for i in range(matches):
+                jobs.append({"seed": base_seed + i, "map": map_type, "params": params,
+                             "inputs": inputs, "heatmap": heatmap})
+    return jobs
+
+
+def core_worker_pool(workers):
+    """A spawn-context Pool whose workers import tag_core and nothing else.
+
+    Forked workers would inherit the parent's initialised pygame and SDL.
+    Spawned ones start clean, but normally re-run the parent's main script
+    to resolve pickled functions, and this script starts pygame on import.
+    Jobs only name tag_core functions, so workers load tag_core as their
+    main module instead.
+    """
+    main = sys.modules["__main__"]
+    saved_spec = getattr(main, "__spec__", None)
+    main.__spec__ = tag_core.__spec__
+    try:
+        return multiprocessing.get_context("spawn").Pool(workers)
+    finally:
+        main.__spec__ = saved_spec
+
+
+def run_tournament(args):
+    """Play the requested matches across worker processes and report the results."""
+    jobs = build_tournament_jobs(args.tournament, args.maps, args.sweep, args.seed, args.inputs,
+                                 heatmap=bool(args.heatmap or args.heatmap_image))
+    workers = args.workers or os.cpu_count() or 1
+    # Large chunks keep IPC negligible; several per worker keep the tail short
+    chunksize = max(1, len(jobs) // (workers * 8))
+    report = TournamentReport()
+    heatmap = Heatmap() if jobs[0]["heatmap"] else None
+    results_file = open(args.results, "w") if args.results else None
+
+    start = time.perf_counter()
+    with core_worker_pool(workers) as pool:
+        for done, result in enumerate(pool.imap_unordered(tag_core.simulate_match, jobs, chunksize), 1):
+            match_heatmap = result.pop("heatmap", None)
+            if match_heatmap:
+                heatmap.merge(match_heatmap)
+            report.add(result)
+            if results_file:
+                results_file.write(json.dumps(result) + "\n")
+                results_file.flush()
+            if done % 50 == 0 or done == len(jobs):
+                print(f"\r{done}/{len(jobs)} matches", end="", flush=True)
+        # Let workers exit on their own rather than through Pool.terminate()
+        # when the block ends
+        pool.close()
+        pool.join()
+    elapsed = time.perf_counter() - start
+    print()
+    if results_file:
+        results_file.close()
+
+    print(report.format())
+    print(f"{len(jobs)} matches in {elapsed:.1f}s on {workers} workers "
+          f"({len(jobs) / elapsed:.1f} matches/s)")
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({"workers": workers, "elapsed": elapsed, "matches": len(jobs),
+                       "groups": report.rows()}, f, indent=2)
+    if heatmap:
+        write_heatmap(heatmap, args.heatmap, args.heatmap_image)
+
+
+def benchmark_players(counts=(2, 8, 16), frames=600):
+    """Print per-frame simulation cost for bot-only matches of each size."""
+    for n in counts:
+        game = Game(headless=True, num_players=n, num_bots=n, num_it=max(1, n // 4),
+                    config=MatchConfig(seed=1))
+        game.show_title_screen = False
+        idle = [0] * n
+        start = time.perf_counter()
+        for _ in range(frames):
+            game.update(moves=idle)
+        simulation = (time.perf_counter() - start) / frames
+        start = time.perf_counter()
+        for _ in range(frames):
+            touching_pairs(game.players)
+        broadphase = (time.perf_counter() - start) / frames
+        print(f"{n:>2} players: {simulation * 1000:.3f} ms/frame simulation, "
+              f"{broadphase * 1000:.4f} ms/frame tag broadphase")
+
+
+def benchmark_world(width=100000, report_every=10000):
+    """Run two players across a chunked world and print frame cost and memory per stretch.
+
+    The traversal runs twice with the same seed: once for timing and once
+    under tracemalloc, whose bookkeeping would otherwise distort the timings.
+    """
+    import tracemalloc
+
+    def traverse(trace):
+        game = Game(headless=True, config=MatchConfig(seed=1, map_width=width))
+        game.show_title_screen = False
+        # Run the pair side by side at equal speed so the view covers the same span throughout
+        game.player2.x = game.player1.x + 200
+        for player in game.players:
+            player.is_tagged = False
+        if trace:
+            tracemalloc.start()
+        rows = []
+        next_report = report_every
+        window_start = time.perf_counter()
+        window_frames = 0
+        while min(player.x for player in game.players) < width - 400:
+            # Both run right, jumping whenever something stops them
+            actions = [(1, player.on_ground and abs(player.vx) < 0.5, False) for player in game.players]
+            game.step(actions)
+            zoom, cam_x, cam_y = game.camera.get_transform()
+            display_list = game.renderer.display_list
+            for platform in game.platforms:
+                platform.record(display_list, zoom, cam_x, cam_y, PLATFORM_BROWN, PLATFORM_DARK, GRASS_COLOR)
+            display_list.submit(game.screen)
+            window_frames += 1
+            if game.player1.x >= next_report:
+                elapsed = time.perf_counter() - window_start
+                traced = tracemalloc.get_traced_memory()[0] if trace else 0
+                rows.append((next_report, elapsed / window_frames * 1000, len(game.world.chunks),
+                             game.world.generated, traced / 1024))
+                next_report += report_every
+                window_start = time.perf_counter()
+                window_frames = 0
+        if trace:
+            tracemalloc.stop()
+        return rows
+
+    timed = traverse(trace=False)
+    traced = traverse(trace=True)
+    print(f"{'x':>8} {'ms/frame':>9} {'chunks':>7} {'generated':>10} {'traced KB':>10}")
+    for (x, ms, chunks, generated, _), (_, _, _, _, kb) in zip(timed, traced):
+        print(f"{x:>8} {ms:>9.3f} {chunks:>7} {generated:>10} {kb:>10.0f}")
+
+
+def benchmark_maps(maps=200, candidates=32):
+    """Time map validation per map type, then best-of-N selection serial vs on a process pool."""
+    print(f"{'map':<9} {'gravity':>7} {'gen ms':>7} {'check ms':>9} {'coverage':>9} {'fully reachable':>16}")
+    for map_type, generator in MAP_GENERATORS.items():
+        for gravity in (NORMAL_GRAVITY, LOW_GRAVITY):
+            air_time_table(JUMP_VELOCITY, gravity)  # built once per physics setting, not per map
+            gen_time = check_time = coverage = 0.0
+            complete = 0
+            for seed in range(maps):
+                start = time.perf_counter()
+                platforms = generator(random.Random(seed))
+                generated = time.perf_counter()
+                report = analyze_map(platforms, JUMP_VELOCITY, gravity, BASE_SPEED)
+                check_time += time.perf_counter() - generated
+                gen_time += generated - start
+                coverage += report.coverage
+                complete += report.coverage == 1.0
+            print(f"{map_type:<9} {gravity:>7} {gen_time / maps * 1000:>7.2f} {check_time / maps * 1000:>9.2f} "
+                  f"{coverage / maps:>9.1%} {complete:>10}/{maps}")
+
+    seeds = list(range(candidates))
+    start = time.perf_counter()
+    serial = pick_best_map("default", seeds, JUMP_VELOCITY, NORMAL_GRAVITY, BASE_SPEED)
+    serial_time = time.perf_counter() - start
+    workers = os.cpu_count() or 1
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        executor.submit(int).result()  # exclude worker start-up
+        start = time.perf_counter()
+        pooled = pick_best_map("default", seeds, JUMP_VELOCITY, NORMAL_GRAVITY, BASE_SPEED, executor)
+        pooled_time = time.perf_counter() - start
+    assert pooled == serial
+    print(f"Best of {candidates}: seed {serial[0]} (score {serial[1]:.3f}); "
+          f"serial {serial_time * 1000:.1f} ms, {workers} worker processes {pooled_time * 1000:.1f} ms")
+
+
+def benchmark_platforms(counts=(10, 100, 1000), frames=600):
+    """Per-frame cost of moving N platforms and keeping the collision index current.
+
+    Compares re-filing only the platforms that changed columns with
+    rebuilding the whole PlatformGrid every frame.
+    """
+    rng = random.Random(1)
+    for n in counts:
+        platforms = generate_default_map(random.Random(1), Platform)
+        for _ in range(n):
+            x = rng.randint(0, MAP_WIDTH - 200)
+            y = rng.randint(PLATFORM_Y_OFFSET, MAP_HEIGHT - GROUND_HEIGHT - 100)
+            reach = rng.randint(*MOVING_PLATFORM_RANGE)
+            path = [(x - reach, y), (x + reach, y)] if rng.random() < 0.7 else [(x, y - reach), (x, y + reach)]
+            platforms.append(MovingPlatform(path, rng.randint(90, 200), 40, rng.randint(*MOVING_PLATFORM_PERIOD)))
+        moving = [platform for platform in platforms if platform.moving]
+
+        grid = PlatformGrid(platforms)
+        step = incremental = rebuild = 0.0
+        for frame in range(frames):
+            start = time.perf_counter()
+            spans = []
+            for platform in moving:
+                spans.append((platform.rect.left, platform.rect.right))
+                platform.step(frame)
+            stepped = time.perf_counter()
+            for platform, (left, right) in zip(moving, spans):
+                if platform.dx:
+                    grid.move(platform, left, right)
+            moved = time.perf_counter()
+            PlatformGrid(platforms)
+            rebuilt = time.perf_counter()
+            step += stepped - start
+            incremental += moved - stepped
+            rebuild += rebuilt - moved
+        print(f"{n:>5} moving platforms: paths {step / frames * 1000:.3f} ms/frame, index "
+              f"{incremental / frames * 1000:.3f} ms/frame incremental vs "
+              f"{rebuild / frames * 1000:.3f} ms/frame rebuilt ({rebuild / incremental:.0f}x)")
+
+
+def benchmark_idle(seconds=5.0, warmup=1.0):
+    """Measure the CPU share of Game.run sitting on each menu and on game-over.
+
+    Each screen runs once as if just used (MENU_FPS wake-ups) and once as
+    if left alone (MENU_IDLE_FPS). Sampling starts after a warm-up so
+    start-up and the map queue's first fill are not counted.
+    """
+    screens = {
+        "title": {},
+        "colour select": {"show_title_screen": False, "show_color_selection_screen": True},
+        "map select": {"show_title_screen": False, "show_start_screen": True},
+        "game over": {"show_title_screen": False, "state": GameState.GAME_OVER_P1},
+    }
+    print(f"{'screen':<14} {'in use':>8} {'unattended':>11}")
+    for name, attributes in screens.items():
+        shares = []
+        for unattended in (False, True):
+            pygame.init()  # run() shuts pygame down on exit
+            game = Game(config=MatchConfig(seed=1))
+            for attribute, value in attributes.items():
+                setattr(game, attribute, value)
+            if unattended:
+                game.last_input_time -= MENU_IDLE_SECONDS + 1
+            samples = []
+
+            def sample():
+                time.sleep(warmup)
+                samples.append((time.perf_counter(), time.process_time()))
+                time.sleep(seconds)
+                samples.append((time.perf_counter(), time.process_time()))
+                pygame.event.post(pygame.event.Event(pygame.QUIT))
+
+            sampler = threading.Thread(target=sample)
+            sampler.start()
+            game.run()
+            sampler.join()
+            (wall0, cpu0), (wall1, cpu1) = samples
+            shares.append((cpu1 - cpu0) / (wall1 - wall0))
+        print(f"{name:<14} {shares[0]:>8.1%} {shares[1]:>11.1%}", flush=True)
+
+
+def benchmark_pacing(seconds=4.0, load_ms=(1, 5)):
+    """Compare frame-interval jitter of clock.tick(FPS) with FramePacer at 60/120/144 Hz.
+
+    Each frame does a random few milliseconds of blitting, like a draw.
+    """
+    load = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+    target = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+    rng = random.Random(1)
+    print(f"{'scheduler':<18} {'target ms':>9} {'p50 ms':>7} {'p99 ms':>7} {'max ms':>7} {'missed':>7}")
+    for name, rate in (("clock.tick", FPS), ("FramePacer", FPS), ("FramePacer", 120), ("FramePacer", 144)):
+        clock = pygame.time.Clock()
+        pacer = FramePacer(rate)
+        wakes = []
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end:
+            busy_until = time.perf_counter() + rng.uniform(*load_ms) / 1000.0
+            while time.perf_counter() < busy_until:
+                target.blit(load, (0, 0))
+            if name == "clock.tick":
+                clock.tick(rate)
+            else:
+                pacer.wait()
+            wakes.append(time.perf_counter())
+        intervals = sorted((b - a) * 1000 for a, b in zip(wakes, wakes[1:]))
+        period_ms = 1000.0 / rate
+        missed = pacer.missed if name != "clock.tick" else sum(1 for i in intervals if i > period_ms * 1.5)
+        print(f"{name:<18} {period_ms:>9.2f} {intervals[len(intervals) // 2]:>7.2f} "
+              f"{intervals[int(len(intervals) * 0.99)]:>7.2f} {intervals[-1]:>7.2f} {missed:>7}", flush=True)
+
+
+def benchmark_particles(count=10000, frames=300):
+    """Time update, capture and draw of a pool holding `count` live particles."""
+    if numpy is None:
+        print("NumPy is not installed; particles are disabled")
+        return
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    particles = ParticleSystem(count, seed=1)
+    glow_cache = GlowCache()
+    rng = random.Random(1)
+    timings = {"emit": 0.0, "update": 0.0, "capture": 0.0, "draw": 0.0}
+    live = 0
+    for _ in range(frames):
+        start = time.perf_counter()
+        # Keep the pool full: bursts across the screen replace what expired
+        while particles.free_count:
+            kind = rng.choice(PARTICLE_KINDS)
+            particles.emit(kind, rng.uniform(0, SCREEN_WIDTH), rng.uniform(0, SCREEN_HEIGHT), 50)
+        emitted = time.perf_counter()
+        particles.update()
+        updated = time.perf_counter()
+        frame = particles.capture()
+        captured = time.perf_counter()
+        screen.fill(SKY_BOTTOM)
+        particles.draw(screen, frame, 1.0, 0, 0, glow_cache)
+        drawn = time.perf_counter()
+        timings["emit"] += emitted - start
+        timings["update"] += updated - emitted
+        timings["capture"] += captured - updated
+        timings["draw"] += drawn - captured
+        live += len(frame[0])
+    print(f"{live / frames:.0f} live particles on average over {frames} frames")
+    for name, total in timings.items():
+        print(f"  {name:<8} {total / frames * 1000:6.3f} ms/frame")
+    print(f"  total    {sum(timings.values()) / frames * 1000:6.3f} ms/frame")
+
+
+def benchmark_heatmap(frames=3600):
+    """Compare per-frame heatmap cost with the simulation step it rides along with."""
+    if numpy is None:
+        print("NumPy is not installed; heatmaps are disabled")
+        return
+    for n in (2, 16):
+        game = Game(headless=True, num_players=n, num_bots=n, num_it=max(1, n // 4),
+                    config=MatchConfig(seed=1, MATCH_DURATION=frames // FPS + 1))
+        game.show_title_screen = False
+        heatmap = Heatmap(game.map_width, MAP_HEIGHT)
+        game.heatmap = heatmap
+        game.select_map("default")
+        idle = [0] * n
+        start = time.perf_counter()
+        for _ in range(frames):
+            game.update(moves=idle)
+        total = time.perf_counter() - start
+        # The same positions again without the rest of the frame
+        start = time.perf_counter()
+        for _ in range(frames):
+            heatmap.record(game.players)
+        heatmap.flush()
+        record = time.perf_counter() - start
+        print(f"{n:>2} players: frame {total / frames * 1000:.3f} ms, "
+              f"heatmap {record / frames * 1e6:.1f} us ({record / total:.1%} of a frame)")
+
+
+def benchmark_replay(frames=3000):
+    """Print the replay buffer's fixed size and per-step recording cost."""
+    for n in (2, 16):
+        game = Game(headless=True, num_players=n, num_bots=n, num_it=max(1, n // 4),
+                    config=MatchConfig(seed=1))
+        game.show_title_screen = False
+        game.select_map("default")
+        replay = ReplayBuffer(n, game.config.moving_platforms)
+        start = time.perf_counter()
+        for _ in range(frames):
+            game.update(moves=[0] * n)
+            replay.record(game)
+        total = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(frames):
+            replay.record(game)
+        record = time.perf_counter() - start
+        print(f"{n:>2} players: {replay.frames} frames in {replay.nbytes / 1024:.0f} KB, "
+              f"record {record / frames * 1e6:.1f} us/frame ({record / total:.1%} of a step)")
+
+
+def benchmark_live_state(seconds=5.0):
+    """Publish a bot match at FPS while a separate reader process times each publish.
+
+    Also prints what publishing costs the game per step.
+    """
+    import subprocess
+
+    name = f"{live_state.DEFAULT_NAME}-bench-{os.getpid()}"
+    game = Game(headless=True, num_bots=2, config=MatchConfig(seed=1))
+    game.show_title_screen = False
+    game.select_map("default")
+    game.live_state = live_state.LiveStateWriter(name)
+    try:
+        game.update(moves=[0, 0])
+        reader = subprocess.Popen([sys.executable, os.path.abspath(live_state.__file__),
+                                   "--name", name, "--latency", str(seconds)],
+                                  stdout=subprocess.PIPE, text=True)
+        period = 1.0 / FPS
+        publish = 0.0
+        steps = 0
+        next_step = time.perf_counter()
+        while reader.poll() is None:
+            game.update(moves=[0, 0])
+            start = time.perf_counter()
+            game.publish_live_state()
+            publish += time.perf_counter() - start
+            steps += 1
+            next_step += period
+            delay = next_step - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        print(f"publish {publish / steps * 1e6:.1f} us/step over {steps} steps, "
+              f"{live_state.BLOCK_SIZE} byte block")
+        print(f"reader: {reader.stdout.read().strip()}")
+    finally:
+        game.live_state.close()
+
+
+def benchmark_threading(seconds=5.0, load_ms=(2, 30)):
+    """Compare frame timing with and without the simulation thread while drawing is slow.
+
+    Every rendered frame adds a random load_ms of blitting on top of the
+    normal draw. Prints render frame time and the interval between physics
+    steps (mean, standard deviation, p99) for both loops.
+    """
+    import statistics
+
+    period = 1.0 / FPS
+    load = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+    rng = random.Random(1)
+    gil = getattr(sys, "_is_gil_enabled", lambda: True)()
+    print(f"GIL {'enabled' if gil else 'disabled'}; extra render load {load_ms[0]}-{load_ms[1]} ms per frame")
+    print(f"{'loop':<10} {'frames':>6} {'render ms':>10} {'+/-':>6} {'steps':>6} "
+          f"{'step ms':>8} {'+/-':>6} {'p99':>6} {'late':>5}")
+    for threaded in (False, True):
+        game = Game(num_bots=2, config=MatchConfig(seed=1), threaded=threaded)
+        game.show_title_screen = False
+        steps = []
+        game.step_hook = steps.append
+        frame_times = []
+        if threaded:
+            game.start_simulation()
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end and game.state == GameState.PLAYING:
+            start = time.perf_counter()
+            if threaded:
+                snapshot = game.render_buffer.latest()
+                if snapshot:
+                    game.draw(snapshot)
+            else:
+                game._simulate_frame([0, 0])
+                game.draw()
+            busy_until = time.perf_counter() + rng.uniform(*load_ms) / 1000.0
+            while time.perf_counter() < busy_until:
+                game.screen.blit(load, (0, 0))
+            frame_times.append(time.perf_counter() - start)
+            game.clock.tick(FPS)
+        game.stop_simulation()
+
+        intervals = [(b - a) * 1000 for a, b in zip(steps, steps[1:])]
+        frames_ms = [t * 1000 for t in frame_times]
+        p99 = sorted(intervals)[int(len(intervals) * 0.99)]
+        late = sum(1 for interval in intervals if interval > period * 1500)
+        print(f"{'threaded' if threaded else 'single':<10} {len(frames_ms):>6} "
+              f"{statistics.mean(frames_ms):>10.2f} {statistics.pstdev(frames_ms):>6.2f} {len(steps):>6} "
+              f"{statistics.mean(intervals):>8.2f} {statistics.pstdev(intervals):>6.2f} {p99:>6.2f} {late:>5}")
+
+
+def benchmark_render(frames=600):
+    """Print draw cost, display list sizes and pose cache hit rate per frame.
+
+    Measured for a bot match (everyone moving, camera easing) and for two
+    idle players under a settled camera, where poses replay from cache.
+    """
+    print(f"{'scene':<8} {'draw ms':>8} {'recorded':>9} {'culled':>7} {'draw calls':>11} {'pose hits':>10}")
+    for scene in ("bots", "idle"):
+        game = Game(num_bots=2 if scene == "bots" else 0, config=MatchConfig(seed=1))
+        game.show_title_screen = False
+        moves = [0, 0]
+        # Let the idle scene settle first so its camera stops zooming
+        for _ in range(FPS * 3 if scene == "idle" else 0):
+            game.update(moves=moves)
+        game.renderer.pose_cache.hits = game.renderer.pose_cache.misses = 0
+        totals = [0, 0, 0]
+        elapsed = 0.0
+        for _ in range(frames):
+            game.update(moves=moves)
+            start = time.perf_counter()
+            game.draw()
+            elapsed += time.perf_counter() - start
+            display_list = game.renderer.display_list
+            totals[0] += display_list.recorded
+            totals[1] += display_list.culled
+            totals[2] += display_list.draw_calls
+        lookups = game.renderer.pose_cache.hits + game.renderer.pose_cache.misses
+        print(f"{scene:<8} {elapsed / frames * 1000:>8.3f} {totals[0] / frames:>9.1f} {totals[1] / frames:>7.1f} "
+              f"{totals[2] / frames:>11.1f} {game.renderer.pose_cache.hits / max(1, lookups):>10.0%}")
+
+
+def benchmark_split(frames=600):
+    """Compare draw cost of one shared camera with split screen.
+
+    Split screen is timed both with shared world tiles and with every view
+    recording all platforms itself. The two players are swept back and
+    forth far enough apart to stay split, so every camera pans each frame.
+    """
+    print(f"{'mode':<24} {'draw ms':>8} {'split':>6} {'tile hits':>10} {'tile MB':>8}")
+    for mode in ("single camera", "split, platforms per view", "split, shared tiles"):
+        game = Game(config=MatchConfig(seed=1))
+        game.show_title_screen = False
+        game.split_screen = mode != "single camera"
+        if mode == "split, platforms per view":
+            game.renderer.world_tiles = None
+        elapsed = 0.0
+        split = 0
+        for frame in range(frames):
+            t = frame / FPS
+            game.player1.x = 250 + 150 * math.sin(t)
+            game.player2.x = game.map_width - 300 + 150 * math.sin(t * 1.3)
+            game.update(moves=[0, 0])
+            start = time.perf_counter()
+            game.draw()
+            elapsed += time.perf_counter() - start
+            split += game.split_cameras is not None
+        tiles = game.renderer.world_tiles
+        lookups = tiles.hits + tiles.misses if tiles else 0
+        print(f"{mode:<24} {elapsed / frames * 1000:>8.3f} {split / frames:>6.0%} "
+              f"{tiles.hits / lookups if lookups else 0:>10.0%} {tiles.bytes / (1 << 20) if lookups else 0:>8.1f}")
+
+
+def benchmark_spectators(clients=4, seconds=10, port=0):
+    """Stream a bot match to loopback spectators and print bandwidth and publish cost."""
+    game = Game(headless=True, num_bots=2, config=MatchConfig(seed=1))
+    game.show_title_screen = False
+    broadcaster = SpectatorBroadcaster(port)
+    port = broadcaster.server.getsockname()[1]
+    spectators = [SpectatorClient("127.0.0.1", port) for _ in range(clients)]
+    snapshot = RenderSnapshot()
+    mismatches = 0
+    for frame in range(seconds * FPS):
+        game.update(moves=[0, 0])
+        broadcaster.publish(snapshot.capture(game))
+        for spectator in spectators:
+            spectator.poll()
+        # Every spectator should hold exactly the state that was just published
+        expected = broadcaster.last_state
+        mismatches += sum(1 for spectator in spectators if spectator.state != expected)
+    keyframe = len(broadcaster._encode(True, broadcaster.last_state))
+    print(broadcaster.summary())
+    print(f"{clients} loopback spectators over {seconds}s; keyframe {keyframe} bytes; "
+          f"{mismatches} frames where a spectator was out of sync")
+    for spectator in spectators:
+        spectator.sock.close()
+    broadcaster.close()
+
+
+class LatencyReport:
+    """Collects per-frame input-to-present latencies and prints a summary."""
+    def __init__(self):
+        self.samples = []
+
+    def __call__(self, latency_ms):
+        self.samples.append(latency_ms)
+
+    def summary(self):
+        if not self.samples:
+            return "no gameplay frames recorded"
+        ordered = sorted(self.samples)
+        p50 = ordered[len(ordered) // 2]
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        mean = sum(ordered) / len(ordered)
+        return (f"input-to-present over {len(ordered)} frames: "
+                f"mean {mean:.2f} ms, p50 {p50:.2f} ms, p95 {p95:.2f} ms, max {ordered[-1]:.2f} ms")
+
+
+# ==================== MATCH SERVER ====================
+# Datagram types; every packet starts with one of these bytes
+MSG_JOIN = 1      # client -> server: put me in a match
+MSG_WELCOME = 2   # server -> client: <match id, slot>
+MSG_INPUT = 3     # client -> server: <match id, slot, seq, move, buttons>
+MSG_STATE = 4     # server -> client: header then one record per player
+WELCOME_PACKET = struct.Struct(">BIB")
+INPUT_PACKET = struct.Struct(">BIBIbB")
+STATE_HEADER = struct.Struct(">BIIhBB")   # type, match id, frame, seconds left, state, players
+STATE_PLAYER = struct.Struct(">ffBI")     # x, y, is it, frames as it
+BUTTON_JUMP = 1
+BUTTON_DASH = 2
+CLIENT_TIMEOUT = 10.0  # seconds without input before a slot is freed
+
+
+class ServerMatch:
+    """One authoritative two-player match stepped by the MatchServer tick."""
+    def __init__(self, match_id, seed):
+        self.match_id = match_id
+        self.game = Game(headless=True, config=MatchConfig(seed=seed))
+        self.game.show_title_screen = False
+        self.game.map_queue.depth = 1  # only the next round's map is generated ahead
+        self.addrs = [None, None]
+        self.last_seen = [0.0, 0.0]
+        self.last_seq = [-1, -1]
+        self.moves = [0, 0]
+        self.buttons = [0, 0]   # presses OR-ed together until the next tick uses them
+        self.rounds = 0
+        self.ticks = 0
+        self.tick_total = 0.0
+        self.tick_max = 0.0
+
+    def free(self, slot):
+        """Forget a departed client's slot and held input, ready for a new one."""
+        self.addrs[slot] = None
+        self.last_seq[slot] = -1
+        self.moves[slot] = 0
+        self.buttons[slot] = 0
+
+    def receive_input(self, slot, seq, move, buttons, now):
+        self.last_seen[slot] = now
+        if seq <= self.last_seq[slot]:
+            return  # late or duplicated datagram
+        self.last_seq[slot] = seq
+        self.moves[slot] = max(-1, min(1, move))
+        self.buttons[slot] |= buttons
+
+    def step(self, outbox):
+        """Advance one frame and queue the resulting state for both players."""
+        start = time.perf_counter()
+        game = self.game
+        if game.state == GameState.PLAYING:
+            game.step([(self.moves[i], bool(self.buttons[i] & BUTTON_JUMP), bool(self.buttons[i] & BUTTON_DASH))
+                       for i in range(2)])
+        else:
+            # MatchServer.serve generates the next map ahead, so this only takes it
+            game.reset()
+            self.rounds += 1
+        self.buttons = [0, 0]
+        packet = self.encode_state()
+        for addr in self.addrs:
+            if addr:
+                outbox.append((packet, addr))
+        elapsed = time.perf_counter() - start
+        self.ticks += 1
+        self.tick_total += elapsed
+        self.tick_max = max(self.tick_max, elapsed)
+
+    def encode_state(self):
+        game = self.game
+        parts = [STATE_HEADER.pack(MSG_STATE, self.match_id, game.sim_frames, game.match_seconds,
+                                   game.state.value, len(game.players))]
+        parts.extend(STATE_PLAYER.pack(player.x, player.y, player.is_tagged, player.tag_time)
+                     for player in game.players)
+        return b"".join(parts)
+
+
+class MatchServer(asyncio.DatagramProtocol):
+    """Headless UDP server hosting many matches from a single asyncio event loop.
+
+    Joining clients are paired into ServerMatches. One fixed-rate tick task
+    steps every match, collects all outgoing state datagrams, and sends
+    them together at the end of the tick. Per-match and whole-tick times
+    are recorded. Each match's next map is generated ahead on an executor
+    thread, so starting a new round never stalls the tick.
+    """
+    def __init__(self, seed=1):
+        self.seed = seed
+        self.transport = None
+        self.matches = {}
+        self.waiting = None          # match with a free slot
+        self.clients = {}            # addr -> (match, slot)
+        self.next_match_id = 1
+        self.outbox = []
+        self.tick_times = collections.deque(maxlen=FPS * 60)
+        self.late_ticks = 0
+        self.closed = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        if not data:
+            return
+        if data[0] == MSG_JOIN:
+            self._join(addr)
+        elif data[0] == MSG_INPUT and len(data) == INPUT_PACKET.size:
+            _, match_id, slot, seq, move, buttons = INPUT_PACKET.unpack(data)
+            match = self.matches.get(match_id)
+            if match and slot < 2 and match.addrs[slot] == addr:
+                match.receive_input(slot, seq, move, buttons, time.monotonic())
+
+    def _join(self, addr):
+        if addr not in self.clients:
+            match = self.waiting
+            if match is None:
+                match = ServerMatch(self.next_match_id, self.seed + self.next_match_id)
+                self.next_match_id += 1
+                self.waiting = match
+            slot = match.addrs.index(None)
+            match.addrs[slot] = addr
+            match.last_seen[slot] = time.monotonic()
+            self.clients[addr] = (match, slot)
+            if None not in match.addrs:
+                self.matches[match.match_id] = match
+                self.waiting = None
+        match, slot = self.clients[addr]
+        self.transport.sendto(WELCOME_PACKET.pack(MSG_WELCOME, match.match_id, slot), addr)
+
+    def _expire(self):
+        """Free slots whose client went quiet; a match left with one player waits for a partner."""
+        now = time.monotonic()
+        matches = list(self.matches.values())
+        if self.waiting and self.waiting.match_id not in self.matches:
+            matches.append(self.waiting)
+        for match in matches:
+            for slot, addr in enumerate(match.addrs):
+                if addr and now - match.last_seen[slot] > CLIENT_TIMEOUT:
+                    match.free(slot)
+                    del self.clients[addr]
+            if match.addrs == [None, None]:
+                self.matches.pop(match.match_id, None)
+                if self.waiting is match:
+                    self.waiting = None
+            elif None in match.addrs and self.waiting is None:
+                self.waiting = match
+
+    def _prepare_map(self, loop):
+        """Start generating the next round's map for one match that has none ready."""
+        for match in self.matches.values():
+            queue = match.game.map_queue
+            if queue.needs("default"):
+                return loop.run_in_executor(None, queue.prepare, "default")
+        return None
+
+    def tick(self):
+        start = time.perf_counter()
+        for match in self.matches.values():
+            match.step(self.outbox)
+        sendto = self.transport.sendto
+        for packet, addr in self.outbox:
+            sendto(packet, addr)
+        self.outbox.clear()
+        self.tick_times.append(time.perf_counter() - start)
+
+    async def serve(self, report_interval=None):
+        loop = asyncio.get_running_loop()
+        period = 1.0 / FPS
+        next_tick = loop.time()
+        next_report = loop.time() + report_interval if report_interval else None
+        next_expire = loop.time() + 1.0
+        preparing = None
+        # Take the GIL back from the map generator quickly, as Game.start_simulation does
+        saved_switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(saved_switch_interval, SIM_SWITCH_INTERVAL))
+        try:
+            while not self.closed:
+                self.tick()
+                if preparing is None or preparing.done():
+                    preparing = self._prepare_map(loop)
+                now = loop.time()
+                if now >= next_expire:
+                    self._expire()
+                    next_expire = now + 1.0
+                if next_report and now >= next_report:
+                    print(self.summary(), flush=True)
+                    next_report = now + report_interval
+                next_tick += period
+                delay = next_tick - loop.time()
+                if delay < 0:
+                    self.late_ticks += 1
+                    if delay < -period:
+                        next_tick = loop.time()  # fell behind: re-anchor instead of bursting
+                await asyncio.sleep(max(0.0, delay))
+        finally:
+            sys.setswitchinterval(saved_switch_interval)
+
+    def stats(self):
+        """(matches, mean tick ms, p99 tick ms, mean per-match tick ms, max per-match tick ms)."""
+        ticks = sorted(self.tick_times) or [0.0]
+        p99 = ticks[int(len(ticks) * 0.99) - 1 if len(ticks) > 1 else 0]
+        matches = list(self.matches.values())
+        per_match = sum(m.tick_total for m in matches) / max(1, sum(m.ticks for m in matches))
+        per_match_max = max((m.tick_max for m in matches), default=0.0)
+        return (len(matches), sum(ticks) / len(ticks) * 1000, p99 * 1000,
+                per_match * 1000, per_match_max * 1000)
+
+    def summary(self):
+        matches, mean, p99, per_match, per_match_max = self.stats()
+        return (f"{matches} matches: tick {mean:.2f} ms mean, {p99:.2f} ms p99; "
+                f"per match {per_match:.3f} ms mean, {per_match_max:.2f} ms max; {self.late_ticks} late ticks")
+
+
+def serve_matches(host, port, report_interval=5.0):
+    """Run a match server until interrupted."""
+    async def main():
+        loop = asyncio.get_running_loop()
+        server = MatchServer()
+        transport, _ = await loop.create_datagram_endpoint(lambda: server, local_addr=(host, port))
+        print(f"Match server on {host}:{port}", flush=True)
+        try:
+            await server.serve(report_interval)
+        finally:
+            transport.close()
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+
+
+class LoadClient(asyncio.DatagramProtocol):
+    """One simulated player for the load generator: joins, then plays random inputs."""
+    def __init__(self, rng):
+        self.rng = rng
+        self.transport = None
+        self.match_id = None
+        self.slot = None
+        self.seq = 0
+        self.move = 0
+        self.states = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+        transport.sendto(bytes([MSG_JOIN]))
+
+    def datagram_received(self, data, addr):
+        if data[0] == MSG_WELCOME:
+            _, self.match_id, self.slot = WELCOME_PACKET.unpack(data)
+        elif data[0] == MSG_STATE:
+            self.states += 1
+
+    def send_input(self):
+        if self.match_id is None:
+            self.transport.sendto(bytes([MSG_JOIN]))  # the join or its welcome was lost
+            return
+        if self.rng.random() < 0.05:
+            self.move = self.rng.choice((-1, 0, 1))
+        buttons = (BUTTON_JUMP if self.rng.random() < 0.02 else 0) | (BUTTON_DASH if self.rng.random() < 0.005 else 0)
+        self.seq += 1
+        self.transport.sendto(INPUT_PACKET.pack(MSG_INPUT, self.match_id, self.slot, self.seq, self.move, buttons))
+
+
+def run_load(host, port, matches, seconds, seed=1):
+    """Drive `matches` two-player matches against a server from one process; prints delivery rates."""
+    async def main():
+        loop = asyncio.get_running_loop()
+        rng = random.Random(seed)
+        clients = []
+        for _ in range(matches * 2):
+            _, client = await loop.create_datagram_endpoint(
+                lambda: LoadClient(random.Random(rng.random())), remote_addr=(host, port))
+            clients.append(client)
+        period = 1.0 / FPS
+        start = next_tick = loop.time()
+        while loop.time() - start < seconds:
+            for client in clients:
+                client.send_input()
+            next_tick += period
+            await asyncio.sleep(max(0.0, next_tick - loop.time()))
+        for client in clients:
+            client.transport.close()
+        return clients
+
+    clients = asyncio.run(main())
+    joined = sum(1 for client in clients if client.match_id is not None)
+    rate = sum(client.states for client in clients) / max(1, len(clients)) / seconds
+    print(f"Load: {joined}/{len(clients)} clients joined, {rate:.1f} states/s per client", flush=True)
+
+
+def benchmark_server(counts=(8, 16, 32, 64, 128), seconds=5.0, port=50710):
+    """Ramp loopback load against a local server and report how many matches one core sustains.
+
+    The load generator runs in a child process; the server measures its
+    own tick time. A count is sustained when the p99 tick stays within
+    one frame.
+    """
+    period_ms = 1000.0 / FPS
+    print(f"{'matches':>7} {'tick ms':>8} {'p99 ms':>7} {'per match ms':>13} {'late':>5}")
+    sustained = 0
+    per_match_cost = None
+    for count in counts:
+        async def main():
+            loop = asyncio.get_running_loop()
+            server = MatchServer()
+            transport, _ = await loop.create_datagram_endpoint(lambda: server, local_addr=("127.0.0.1", port))
+            load = multiprocessing.Process(target=run_load, args=("127.0.0.1", port, count, seconds + 1.0))
+            load.start()
+            serving = asyncio.ensure_future(server.serve())
+            # Skip the join phase, then measure a clean window
+            await asyncio.sleep(1.0)
+            server.tick_times.clear()
+            server.late_ticks = 0
+            await asyncio.sleep(seconds)
+            stats = server.stats() + (server.late_ticks,)
+            server.closed = True
+            await serving
+            transport.close()
+            await loop.run_in_executor(None, load.join)
+            return stats
+
+        matches, mean, p99, per_match, _, late = asyncio.run(main())
+        print(f"{matches:>7} {mean:>8.2f} {p99:>7.2f} {per_match:>13.3f} {late:>5}", flush=True)
+        if matches:
+            per_match_cost = per_match
+        if p99 > period_ms:
+            break
+        sustained = matches
+    print(f"Sustained on one core (p99 tick within {period_ms:.1f} ms): {sustained} matches")
+    if per_match_cost:
+        print(f"Tick budget / per-match cost: about {int(period_ms / per_match_cost)} matches")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Danger Things - two player tag game")
+    parser.add_argument("--input-mode", choices=["standard", "late"], default="standard",
+                        help="late: sleep first and sample input right before simulating")
+    parser.add_argument("--latency-report", action="store_true",
+                        help="print input-to-present latency statistics on exit")
+    parser.add_argument("--record-inputs", metavar="PATH",
+                        help="record gameplay inputs for replay in --tournament --inputs")
+    parser.add_argument("--players", type=int, default=2,
+                        help=f"N-player tag mode with up to {MAX_PLAYERS} players")
+    parser.add_argument("--bots", type=int, default=0, help="how many of the players are bots")
+    parser.add_argument("--it", type=int, default=1, help="how many players start as 'it'")
+    parser.add_argument("--bench-players", action="store_true",
+                        help="benchmark simulation cost at 2, 8 and 16 players, then exit")
+    parser.add_argument("--world-width", type=int, metavar="PX",
+                        help=f"play on a streamed chunked world this wide (more than {MAP_WIDTH})")
+    parser.add_argument("--bench-world", action="store_true",
+                        help="benchmark traversing a 100,000 px chunked world, then exit")
+    parser.add_argument("--bench-maps", action="store_true",
+                        help="benchmark map reachability checks and best-of-N map selection, then exit")
+    parser.add_argument("--moving-platforms", type=int, default=MOVING_PLATFORMS, metavar="N",
+                        help="platforms per generated map that move back and forth")
+    parser.add_argument("--bench-platforms", action="store_true",
+                        help="time moving platforms and collision index updates, then exit")
+    parser.add_argument("--bench-idle", action="store_true",
+                        help="measure CPU use while menus and game-over sit idle, then exit")
+    parser.add_argument("--render-rate", type=int, default=FPS, metavar="HZ",
+                        help=f"present frames at HZ (e.g. 120 or 144) while simulating at {FPS}")
+    parser.add_argument("--vsync", action="store_true", help="sync presentation to the display refresh")
+    parser.add_argument("--pacing-report", action="store_true",
+                        help="print frame-interval p50/p99 and missed deadlines on exit")
+    parser.add_argument("--bench-pacing", action="store_true",
+                        help="compare clock.tick with the frame pacer at 60/120/144 Hz, then exit")
+    parser.add_argument("--particle-budget", type=int, default=PARTICLE_BUDGET, metavar="N",
+                        help="most live particles at once (0 disables particle effects)")
+    parser.add_argument("--bench-particles", action="store_true",
+                        help="benchmark the particle pool at 10,000 live particles, then exit")
+    parser.add_argument("--threaded", action="store_true",
+                        help="simulate on a separate fixed-rate thread and render snapshots")
+    parser.add_argument("--bench-replay", action="store_true",
+                        help="print instant replay memory and recording cost, then exit")
+    parser.add_argument("--bench-threading", action="store_true",
+                        help="compare frame-time variance of the single and threaded loops, then exit")
+    parser.add_argument("--split-screen", action="store_true",
+                        help="give each of two players their own view while they are far apart")
+    parser.add_argument("--bench-split", action="store_true",
+                        help="compare split-screen and single-camera draw cost, then exit")
+    parser.add_argument("--bench-render", action="store_true",
+                        help="report draw calls, culling and pose cache hits per frame, then exit")
+    parser.add_argument("--capture", metavar="DIR", help="record every presented gameplay and replay frame to DIR")
+    parser.add_argument("--capture-format", choices=["png", "raw"], default="png",
+                        help="png: numbered PNG sequence; raw: one capture.raw video file")
+    parser.add_argument("--capture-workers", type=int, default=2, help="PNG encoder threads")
+    parser.add_argument("--capture-buffers", type=int, default=8,
+                        help="frames that may wait for an encoder before capture drops frames")
+    parser.add_argument("--spectator-port", type=int, metavar="PORT",
+                        help="stream the match to spectators connecting to PORT")
+    parser.add_argument("--spectator-host", default="127.0.0.1",
+                        help="address the spectator stream listens on (default: loopback only)")
+    parser.add_argument("--spectate", metavar="HOST:PORT",
+                        help="watch a match streamed with --spectator-port instead of playing")
+    parser.add_argument("--bench-spectators", action="store_true",
+                        help="measure spectator stream bandwidth and publish cost over loopback, then exit")
+    parser.add_argument("--serve", type=int, metavar="PORT",
+                        help="run a headless UDP match server hosting many matches")
+    parser.add_argument("--server-host", default="127.0.0.1", help="address --serve listens on")
+    parser.add_argument("--load-test", type=int, metavar="MATCHES",
+                        help="play MATCHES bot-input matches against --server for --duration seconds")
+    parser.add_argument("--server", default="127.0.0.1:50710", metavar="HOST:PORT",
+                        help="match server used by --load-test")
+    parser.add_argument("--duration", type=float, default=30.0, help="--load-test length in seconds")
+    parser.add_argument("--bench-server", action="store_true",
+                        help="ramp loopback load to find how many matches one core sustains, then exit")
+    parser.add_argument("--telemetry", metavar="DIR", help="write gameplay telemetry logs to DIR")
+    parser.add_argument("--telemetry-format", choices=["jsonl", "binary"], default="jsonl")
+    parser.add_argument("--heatmap", metavar="PATH",
+                        help="accumulate position/tag heatmaps into PATH (.npz), adding to what it holds")
+    parser.add_argument("--heatmap-image", metavar="PNG",
+                        help="export the accumulated heatmap as one PNG per map type")
+    parser.add_argument("--merge-heatmaps", nargs="+", metavar="NPZ",
+                        help="merge heatmaps saved by separate runs into --heatmap and exit")
+    parser.add_argument("--bench-heatmap", action="store_true",
+                        help="print the per-frame cost of heatmap accumulation and exit")
+    parser.add_argument("--live-state", nargs="?", const=live_state.DEFAULT_NAME, metavar="NAME",
+                        help="publish live match state to shared memory for overlays (see live_state.py)")
+    parser.add_argument("--bench-live-state", action="store_true",
+                        help="measure live state publish cost and cross-process read latency, then exit")
+
+    batch = parser.add_argument_group("tournament (headless batch simulation)")
+    batch.add_argument("--tournament", type=int, metavar="N",
+                       help="simulate N matches per map and parameter set, then exit")
+    batch.add_argument("--check-core", type=int, metavar="N",
+                       help="play N matches per map and parameter set in both the game and tag_core, "
+                            "exit 1 unless every frame's state is identical and recorded matches "
+                            "hash to their digests in tag_core_golden.json")
+    batch.add_argument("--workers", type=int, help="worker processes (default: all cores)")
+    batch.add_argument("--maps", type=lambda v: v.split(","), default=list(MAP_TYPES),
+                       help="comma separated map types (default: all)")
+    batch.add_argument("--sweep", type=parse_sweep, action="append", default=[],
+                       metavar="NAME=V1,V2", help="sweep a tunable; repeat for a grid")
+    batch.add_argument("--seed", type=int, default=1, help="seed of the first match")
+    batch.add_argument("--inputs", metavar="PATH", help="drive players from a recording instead of bots")
+    batch.add_argument("--results", metavar="PATH", help="stream per-match results as JSON lines")
+    batch.add_argument("--report", metavar="PATH", help="write the aggregated report as JSON")
+    args = parser.parse_args()
+    unknown_maps = [m for m in args.maps if m not in MAP_TYPES]
+    if unknown_maps:
+        parser.error(f"unknown map type(s): {', '.join(unknown_maps)}")
+    if not 2 <= args.players <= MAX_PLAYERS:
+        parser.error(f"--players must be between 2 and {MAX_PLAYERS}")
+    if args.capture_workers < 1 or args.capture_buffers < 1:
+        parser.error("--capture-workers and --capture-buffers must be at least 1")
+    if not 0 <= args.bots <= args.players:
+        parser.error("--bots must be between 0 and --players")
+    if not 1 <= args.it < args.players:
+        parser.error("--it must leave at least one runner")
+    if args.split_screen and args.players != 2:
+        parser.error("--split-screen needs exactly two players")
+    if args.moving_platforms < 0:
+        parser.error("--moving-platforms can't be negative")
+    if args.particle_budget < 0:
+        parser.error("--particle-budget can't be negative")
+    if args.render_rate < 1:
+        parser.error("--render-rate must be at least 1")
+    if args.input_mode == "late" and (args.render_rate != FPS or args.vsync):
+        parser.error("--input-mode late paces frames itself; it can't be combined with --render-rate or --vsync")
+    if (args.heatmap or args.heatmap_image or args.merge_heatmaps) and numpy is None:
+        parser.error("heatmaps need NumPy")
+    if args.merge_heatmaps and not args.heatmap:
+        parser.error("--merge-heatmaps writes to --heatmap PATH")
+    if args.threaded and args.input_mode == "late":
+        parser.error("--threaded samples input on the render thread; it can't be combined with --input-mode late")
+    return args
+
+
 # Main entry point
 if __name__ == "__main__":
-    game = Game()
-    game.run()
\ No newline at end of file
+    args = parse_args()
+    if args.merge_heatmaps:
+        merge_heatmaps(args.merge_heatmaps, args.heatmap, args.heatmap_image)
+    elif args.tournament:
+        run_tournament(args)
+    elif args.check_core:
+        jobs = build_tournament_jobs(args.check_core, args.maps, args.sweep, args.seed, args.inputs)
+        sys.exit(0 if check_core(jobs) else 1)
+    elif args.bench_players:
+        benchmark_players()
+    elif args.bench_world:
+        benchmark_world()
+    elif args.bench_maps:
+        benchmark_maps()
+    elif args.bench_platforms:
+        benchmark_platforms()
+    elif args.bench_idle:
+        benchmark_idle()
+    elif args.bench_pacing:
+        benchmark_pacing()
+    elif args.bench_particles:
+        benchmark_particles()
+    elif args.bench_heatmap:
+        benchmark_heatmap()
+    elif args.bench_replay:
+        benchmark_replay()
+    elif args.bench_live_state:
+        benchmark_live_state()
+    elif args.bench_threading:
+        benchmark_threading()
+    elif args.bench_render:
+        benchmark_render()
+    elif args.bench_split:
+        benchmark_split()
+    elif args.bench_spectators:
+        benchmark_spectators()
+    elif args.bench_server:
+        benchmark_server()
+    elif args.serve:
+        serve_matches(args.server_host, args.serve)
+    elif args.load_test:
+        host, _, port = args.server.rpartition(":")
+        run_load(host or "127.0.0.1", int(port), args.load_test, args.duration)
+    elif args.spectate:
+        host, _, port = args.spectate.rpartition(":")
+        run_spectator(host or "127.0.0.1", int(port))
+    else:
+        game = Game(input_mode=InputMode.LATE if args.input_mode == "late" else InputMode.STANDARD,
+                    num_players=args.players, num_bots=args.bots, num_it=args.it,
+                    config=MatchConfig(map_width=args.world_width or MAP_WIDTH,
+                                       MOVING_PLATFORMS=args.moving_platforms),
+                    threaded=args.threaded)
+        vsync = args.vsync and game.enable_vsync()
+        if args.vsync and not vsync:
+            print("vsync is not available with this video driver; pacing in software")
+        game.pacer = FramePacer(args.render_rate, vsync=vsync)
+        game.split_screen = args.split_screen
+        if args.particle_budget != PARTICLE_BUDGET:
+            game.particles = create_particles(False, args.particle_budget)
+        report = None
+        if args.latency_report:
+            report = LatencyReport()
+            game.latency_hook = report
+        if args.record_inputs:
+            game.input_recorder = InputRecorder(args.record_inputs)
+        if args.telemetry:
+            game.telemetry = Telemetry(args.telemetry, binary=args.telemetry_format == "binary")
+        if args.heatmap or args.heatmap_image:
+            game.heatmap = Heatmap(game.map_width, MAP_HEIGHT)
+        if args.live_state:
+            game.live_state = live_state.LiveStateWriter(args.live_state)
+        if args.spectator_port:
+            game.spectators = SpectatorBroadcaster(args.spectator_port, args.spectator_host)
+        if args.capture:
+            game.frame_capture = FrameCapture(args.capture, raw=args.capture_format == "raw",
+                                              workers=args.capture_workers, buffers=args.capture_buffers,
+                                              rate=game.pacer.rate)
+        game.run()
+        if game.input_recorder:
+            game.input_recorder.close()
+        if game.telemetry:
+            game.telemetry.close()
+        if game.heatmap:
+            write_heatmap(game.heatmap, args.heatmap, args.heatmap_image)
+        if game.live_state:
+            game.live_state.close()
+        if game.frame_capture:
+            game.frame_capture.close()
+            print(game.frame_capture.summary())
+        if game.spectators:
+            print(game.spectators.summary())
+            game.spectators.close()
+        if report:
+            print(report.summary())
+        if args.pacing_report:
+            print(game.pacer.summary())
\ No newline at end of file
@@ -0,0 +1,134 @@
+"""Per-map heatmaps of player positions and tags, binned with NumPy.
+
+Kept out of tag_core so that importing the simulation never loads NumPy;
+tournament workers import this only when a heatmap was asked for.
+"""
+import array
+import json
+
+from tag_core import MAP_HEIGHT, MAP_WIDTH
+try:
+    import numpy
+except ImportError:  # heatmaps need NumPy
+    numpy = None
+
+# ==================== HEATMAPS ====================
+HEATMAP_LAYERS = ("it", "runner", "tags")
+HEATMAP_CELL = 16           # world pixels per histogram cell
+HEATMAP_BATCH = 4096        # pending samples folded into the grids in one scatter-add
+
+
+class Heatmap:
+    """Per-map 2D histograms of where players stand and where tags happen.
+
+    record() only appends each player's (layer, x, y) feet position to a
+    flat array; every HEATMAP_BATCH samples the pending positions are binned
+    with NumPy and scatter-added into the grids by one numpy.bincount.
+    Grids are int64 arrays of (layer, row, col) per map type, so heatmaps
+    from any number of runs can be merged and saved as .npz. Needs NumPy;
+    Arcade Game.py's subclass adds PNG export.
+    """
+    def __init__(self, width=MAP_WIDTH, height=MAP_HEIGHT, cell=HEATMAP_CELL):
+        self.width = width
+        self.height = height
+        self.cell = cell
+        self.cols = -(-width // cell)
+        self.rows = -(-height // cell)
+        self.grids = {}   # map type -> counts shaped (layers, rows, cols)
+        self.frames = {}  # map type -> frames recorded
+        self.pending = array.array("d")  # layer, x, y triples not yet binned
+        self.key = None
+        self.set_map("default")
+
+    def set_map(self, key):
+        """Send the following samples to key's grids."""
+        self.flush()
+        self.key = key
+        if key not in self.grids:
+            self.grids[key] = numpy.zeros((len(HEATMAP_LAYERS), self.rows, self.cols), numpy.int64)
+            self.frames[key] = 0
+
+    def record(self, players):
+        """Queue one frame of player positions for the 'it' and runner layers."""
+        pending = self.pending
+        for player in players:
+            pending.extend((0 if player.is_tagged else 1,
+                            player.x + player.width / 2, player.y + player.height - 1))
+        self.frames[self.key] += 1
+        if len(pending) >= HEATMAP_BATCH * 3:
+            self.flush()
+
+    def add_tag(self, x, y):
+        self.pending.extend((2, x, y))
+
+    def flush(self):
+        """Bin the pending samples and scatter-add them into the current map's grids."""
+        if not self.pending:
+            return
+        grid = self.grids[self.key]
+        samples = numpy.frombuffer(self.pending, numpy.float64).reshape(-1, 3)
+        layer = samples[:, 0].astype(numpy.intp)
+        col = numpy.clip(samples[:, 1] // self.cell, 0, self.cols - 1).astype(numpy.intp)
+        row = numpy.clip(samples[:, 2] // self.cell, 0, self.rows - 1).astype(numpy.intp)
+        indices = (layer * self.rows + row) * self.cols + col
+        grid += numpy.bincount(indices, minlength=grid.size).reshape(grid.shape)
+        # samples still views the old buffer, so start a fresh one rather than clear it
+        self.pending = array.array("d")
+
+    def merge(self, other):
+        """Add another heatmap's counts to this one; both must share cell and map size."""
+        if (other.cell, other.rows, other.cols) != (self.cell, self.rows, self.cols):
+            raise ValueError(f"can't merge a {other.width}x{other.height}/{other.cell} heatmap "
+                             f"into a {self.width}x{self.height}/{self.cell} one")
+        self.flush()
+        other.flush()
+        for key, grid in other.grids.items():
+            if key in self.grids:
+                self.grids[key] += grid
+                self.frames[key] += other.frames[key]
+            else:
+                self.grids[key] = grid.copy()
+                self.frames[key] = other.frames[key]
+
+    def unused_platforms(self, platforms):
+        """Count platforms nobody stood on in the current map's grids."""
+        self.flush()
+        grid = self.grids[self.key]
+        occupied = grid[0] + grid[1]
+        unused = 0
+        for platform in platforms:
+            rect = platform.rect
+            # Feet resting on the platform are binned one pixel above its top
+            row = min(max((rect.top - 1) // self.cell, 0), self.rows - 1)
+            first = max(rect.left // self.cell, 0)
+            last = min((rect.right - 1) // self.cell, self.cols - 1)
+            if not occupied[row, first:last + 1].any():
+                unused += 1
+        return unused
+
+    def save(self, path):
+        self.flush()
+        meta = {"width": self.width, "height": self.height, "cell": self.cell,
+                "layers": HEATMAP_LAYERS, "frames": self.frames}
+        with open(path, "wb") as f:
+            numpy.savez_compressed(f, meta=numpy.array(json.dumps(meta)), **self.grids)
+
+    @classmethod
+    def load(cls, path):
+        with numpy.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            heatmap = cls(meta["width"], meta["height"], meta["cell"])
+            heatmap.grids = {key: data[key] for key in meta["frames"]}
+        heatmap.frames = dict(meta["frames"])
+        heatmap.key = None
+        heatmap.set_map("default")
+        return heatmap
+
+    def summary(self):
+        self.flush()
+        parts = []
+        for key, frames in self.frames.items():
+            if frames:
+                tags = int(self.grids[key][2].sum())
+                parts.append(f"{key}: {frames} frames, {tags} tags")
+        return "heatmap " + ("; ".join(parts) or "empty")
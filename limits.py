@@ -0,0 +1,3 @@
+"""Limits shared by the simulation (tag_core) and the live state block
+(live_state), kept free of imports so overlay readers can load it cheaply."""
+MAX_PLAYERS = 16  # players per match, and player slots in the live state block
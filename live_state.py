@@ -0,0 +1,267 @@
+"""Live match state shared with external overlays through shared memory.
+
+The game (see --live-state in Arcade Game.py) owns one fixed-layout block
+and rewrites it after every simulation step. Overlays and scoreboards
+attach with LiveStateReader and read it at any rate without talking to
+the game: a sequence counter that is odd while a write is in progress
+lets readers detect and retry torn reads instead of taking a lock.
+
+Block layout (little-endian):
+    header  magic "TAGL", u16 version, u16 player slots, u64 sequence
+            (the sequence alone is native-endian: both sides access it as
+            one aligned 64-bit word so it can't itself be read half-written)
+    match   u64 frame, f64 published (time.monotonic), u8 state,
+            u8 screen flags, u8 players, i8 winner id, i16 seconds left,
+            u16 dash cooldown frames, u32 map width, u32 map height
+    players MAX_PLAYERS x (u8 id, u8 is it, 2 pad, f32 x, f32 y,
+            f32 seconds spent as 'it', u16 dash cooldown frames left, 2 pad)
+
+Run this file to watch a running game or to measure publish-to-read
+latency from a separate process:
+    python live_state.py --watch 10
+    python live_state.py --latency 5
+"""
+import argparse
+import struct
+import sys
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+from limits import MAX_PLAYERS
+
+MAGIC = b"TAGL"
+VERSION = 1
+DEFAULT_NAME = "arcade-tag-live"
+
+HEADER = struct.Struct("<4sHHQ")
+MATCH = struct.Struct("<QdBBBbhHII")
+PLAYER = struct.Struct("<BB2xfffH2x")
+SEQUENCE_OFFSET = 8
+MATCH_OFFSET = HEADER.size
+PLAYERS_OFFSET = MATCH_OFFSET + MATCH.size
+BLOCK_SIZE = PLAYERS_OFFSET + MAX_PLAYERS * PLAYER.size
+
+# Game.state values; 0 before the first match starts
+STATE_NAMES = {0: "none", 1: "playing", 2: "game_over_p1", 3: "game_over_p2", 4: "game_over"}
+# Screen flags: which menu (or replay) is showing over the match state
+SCREEN_TITLE = 1
+SCREEN_COLORS = 2
+SCREEN_START = 4
+SCREEN_REPLAY = 8
+
+
+class LiveStateWriter:
+    """Owns the shared block; one writer per block.
+
+    A publish is begin(), write_match(), write_player() per player, end().
+    begin() makes the sequence odd and end() makes it even again, so a
+    reader that saw the same even value before and after copying knows
+    nothing changed underneath it.
+    """
+    def __init__(self, name=DEFAULT_NAME):
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=BLOCK_SIZE)
+        except FileExistsError:
+            # Left behind by a game that didn't exit cleanly; take it over
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=BLOCK_SIZE)
+        self.name = name
+        self.buf = self.shm.buf
+        self.sequence = 0
+        HEADER.pack_into(self.buf, 0, MAGIC, VERSION, MAX_PLAYERS, 0)
+        self.counter = self.buf[SEQUENCE_OFFSET:SEQUENCE_OFFSET + 8].cast("Q")
+
+    def begin(self):
+        self.sequence += 1
+        self.counter[0] = self.sequence
+
+    def write_match(self, frame, state, screens, players, winner, seconds_left,
+                    dash_cooldown, map_width, map_height):
+        MATCH.pack_into(self.buf, MATCH_OFFSET, frame, time.monotonic(), state, screens,
+                        min(players, MAX_PLAYERS), winner, seconds_left, dash_cooldown,
+                        map_width, map_height)
+
+    def write_player(self, slot, player_id, is_it, x, y, tag_seconds, dash_cooldown):
+        if slot < MAX_PLAYERS:
+            PLAYER.pack_into(self.buf, PLAYERS_OFFSET + slot * PLAYER.size,
+                             player_id, is_it, x, y, tag_seconds, dash_cooldown)
+
+    def end(self):
+        self.sequence += 1
+        self.counter[0] = self.sequence
+
+    def close(self):
+        """Release and remove the block; readers see it disappear."""
+        self.counter.release()
+        self.buf = None
+        self.shm.close()
+        self.shm.unlink()
+
+
+class LivePlayer:
+    def __init__(self, player_id, is_it, x, y, tag_seconds, dash_cooldown):
+        self.player_id = player_id
+        self.is_it = bool(is_it)
+        self.x = x
+        self.y = y
+        self.tag_seconds = tag_seconds
+        self.dash_cooldown = dash_cooldown
+
+
+class LiveState:
+    """One consistent copy of the block."""
+    def __init__(self, sequence, match, players):
+        self.sequence = sequence
+        (self.frame, self.published, self.state, self.screens, _, winner,
+         self.seconds_left, self.dash_cooldown, self.map_width, self.map_height) = match
+        self.winner = winner or None
+        self.players = [LivePlayer(*fields) for fields in players]
+
+    @property
+    def state_name(self):
+        return STATE_NAMES.get(self.state, "unknown")
+
+    @property
+    def it_players(self):
+        return [player.player_id for player in self.players if player.is_it]
+
+    @property
+    def p1_tag_time(self):
+        return self.players[0].tag_seconds if self.players else 0.0
+
+    @property
+    def p2_tag_time(self):
+        return self.players[1].tag_seconds if len(self.players) > 1 else 0.0
+
+    def as_dict(self):
+        return {
+            "frame": self.frame, "state": self.state_name, "screens": self.screens,
+            "seconds_left": self.seconds_left, "winner": self.winner, "it": self.it_players,
+            "players": [{"id": p.player_id, "it": p.is_it, "x": round(p.x, 1), "y": round(p.y, 1),
+                         "tag_seconds": round(p.tag_seconds, 2), "dash_cooldown": p.dash_cooldown}
+                        for p in self.players],
+        }
+
+
+class LiveStateReader:
+    """Attaches to a game's block and returns consistent copies of it.
+
+    Fields are unpacked straight out of the shared buffer, so a read costs
+    a few microseconds and never blocks the game. The game must already be
+    running; FileNotFoundError means it isn't (or uses another name).
+    """
+    def __init__(self, name=DEFAULT_NAME):
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Before Python 3.13 every attach is tracked, and the tracker would
+            # unlink the game's block when this process exits
+            self.shm = shared_memory.SharedMemory(name=name)
+            resource_tracker.unregister(self.shm._name, "shared_memory")
+        self.buf = self.shm.buf
+        magic, version, slots, _ = HEADER.unpack_from(self.buf, 0)
+        if magic != MAGIC or version != VERSION or slots != MAX_PLAYERS:
+            self.close()
+            raise ValueError(f"{name} is not a version {VERSION} live state block")
+        self.counter = self.buf[SEQUENCE_OFFSET:SEQUENCE_OFFSET + 8].cast("Q")
+        self.torn = 0  # reads retried because the game was writing
+
+    def sequence(self):
+        """The current sequence number; changes (by 2) with every publish."""
+        return self.counter[0]
+
+    def read(self, attempts=10000):
+        """Return a LiveState, or None if the game hasn't published yet."""
+        buf = self.buf
+        counter = self.counter
+        for _ in range(attempts):
+            before = counter[0]
+            if before & 1:
+                self.torn += 1
+                time.sleep(0)
+                continue
+            match = MATCH.unpack_from(buf, MATCH_OFFSET)
+            players = [PLAYER.unpack_from(buf, PLAYERS_OFFSET + slot * PLAYER.size)
+                       for slot in range(match[4])]
+            if counter[0] == before:
+                return LiveState(before, match, players) if before else None
+            self.torn += 1
+        raise RuntimeError("live state never settled; is the writer stuck mid-write?")
+
+    def close(self):
+        if hasattr(self, "counter"):
+            self.counter.release()
+        self.buf = None
+        self.shm.close()
+
+
+def measure_latency(reader, seconds):
+    """Poll as fast as possible and time each publish until it is seen.
+
+    Returns (latencies in ms, frames missed between observed publishes).
+    Both sides use time.monotonic, which is system-wide.
+    """
+    latencies = []
+    missed = 0
+    last_sequence = reader.sequence()
+    last_frame = None
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        sequence = reader.sequence()
+        if sequence == last_sequence or sequence & 1:
+            continue
+        state = reader.read()
+        seen = time.monotonic()
+        last_sequence = state.sequence
+        latencies.append((seen - state.published) * 1000.0)
+        if last_frame is not None and state.frame > last_frame + 1:
+            missed += state.frame - last_frame - 1
+        last_frame = state.frame
+    return latencies, missed
+
+
+def latency_summary(latencies, missed, torn):
+    if not latencies:
+        return "no publishes seen; is the game running a match?"
+    ordered = sorted(latencies)
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+    return (f"{len(ordered)} publishes: latency p50 {percentile(50):.3f} ms, p99 {percentile(99):.3f} ms, "
+            f"max {ordered[-1]:.3f} ms; {missed} frames skipped between reads, {torn} torn reads retried")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Read the live match state a running game publishes.")
+    parser.add_argument("--name", default=DEFAULT_NAME, help="shared memory block name")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--watch", type=float, metavar="HZ", help="print the state this many times a second")
+    group.add_argument("--latency", type=float, metavar="SECONDS",
+                       help="measure publish-to-read latency for this long")
+    args = parser.parse_args()
+    try:
+        reader = LiveStateReader(args.name)
+    except FileNotFoundError:
+        sys.exit(f"no live state block named {args.name!r}; start the game with --live-state")
+    try:
+        if args.latency:
+            latencies, missed = measure_latency(reader, args.latency)
+            print(latency_summary(latencies, missed, reader.torn))
+        elif args.watch:
+            while True:
+                state = reader.read()
+                print(state.as_dict() if state else "waiting for the first publish", flush=True)
+                time.sleep(1.0 / args.watch)
+        else:
+            state = reader.read()
+            print(state.as_dict() if state else "waiting for the first publish")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        reader.close()
+
+
+if __name__ == "__main__":
+    main()
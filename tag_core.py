@@ -0,0 +1,1147 @@
+"""The tag match simulation without pygame.
+
+Players, platforms, the portal, timers and match state live here as plain
+numbers, and Match steps them. Arcade Game.py builds on these classes (its
+Platform, Portal and Player add drawing and animation on top and swap in
+pygame.Rect, and its Game steps a Match subclass), so there is one set of
+rules; tournament workers play whole matches on Match alone and never
+touch SDL, surfaces or fonts. Nothing here needs more than the standard
+library; heatmaps, which need NumPy, live in heatmaps.py.
+
+`python "Arcade Game.py" --check-core N` plays matches in a Game and a bare
+Match side by side and compares the complete state after every frame, and
+against the golden digests in tag_core_golden.json where it has them.
+"""
+import bisect
+import collections
+import hashlib
+import json
+import math
+import os
+import random
+from enum import Enum
+
+from limits import MAX_PLAYERS  # shared with live_state
+
+# ==================== CONSTANTS ====================
+FPS = 60
+NORMAL_GRAVITY = 0.5
+LOW_GRAVITY = 0.2
+MAP_WIDTH = 2000
+MAP_HEIGHT = 1600
+# Movement
+BASE_SPEED = 7
+TAGGED_SPEED_BOOST = 1.15
+JUMP_VELOCITY = -15
+FRICTION = 0.80
+PLAYER_WIDTH = 30
+PLAYER_HEIGHT = 60
+
+# Platform generation
+GROUND_HEIGHT = 140
+PLATFORM_Y_OFFSET = 80
+MAP_CANDIDATES = 4  # maps generated per match; the most playable one is used
+PLATFORM_GRID_CELL = 256  # column width of the collision index
+MOVING_PLATFORMS = 3  # platforms per generated map turned into oscillating ones
+MOVING_PLATFORM_RANGE = (60, 160)  # px each side of the platform's generated position
+MOVING_PLATFORM_PERIOD = (FPS * 4, FPS * 8)  # frames per back-and-forth
+
+# Game timing
+TAG_COOLDOWN = 30
+MATCH_DURATION = 60
+DASH_COOLDOWN = FPS * 5  # 5 seconds
+
+
+class GameState(Enum):
+    PLAYING = 1
+    GAME_OVER_P1 = 2
+    GAME_OVER_P2 = 3
+    GAME_OVER = 4  # N-player match over; winner holds the winner
+
+
+class MatchConfig:
+    """Physics, timing and map settings for one match, plus its seeded RNG streams.
+
+    Each match owns its config, so matches in the same process never share
+    state. Overrides use the module constant names (BASE_SPEED=8, ...) so
+    tournament sweep params can be passed straight through.
+    """
+    def __init__(self, seed=None, map_width=MAP_WIDTH, **overrides):
+        self.seed = seed
+        self.map_width = map_width
+        self.base_speed = overrides.pop("BASE_SPEED", BASE_SPEED)
+        self.tagged_speed_boost = overrides.pop("TAGGED_SPEED_BOOST", TAGGED_SPEED_BOOST)
+        self.jump_velocity = overrides.pop("JUMP_VELOCITY", JUMP_VELOCITY)
+        self.friction = overrides.pop("FRICTION", FRICTION)
+        self.normal_gravity = overrides.pop("NORMAL_GRAVITY", NORMAL_GRAVITY)
+        self.low_gravity = overrides.pop("LOW_GRAVITY", LOW_GRAVITY)
+        self.tag_cooldown = overrides.pop("TAG_COOLDOWN", TAG_COOLDOWN)
+        self.dash_cooldown = overrides.pop("DASH_COOLDOWN", DASH_COOLDOWN)
+        self.match_duration = overrides.pop("MATCH_DURATION", MATCH_DURATION)
+        self.map_candidates = overrides.pop("MAP_CANDIDATES", MAP_CANDIDATES)
+        self.moving_platforms = overrides.pop("MOVING_PLATFORMS", MOVING_PLATFORMS)
+        if overrides:
+            raise TypeError(f"unknown match settings: {', '.join(sorted(overrides))}")
+
+    def rng(self, stream):
+        """A random.Random for one subsystem ('map', 'portal', 'bots').
+
+        Streams are independent, so e.g. extra bot decisions never shift the
+        maps a seed produces. An unseeded config gives unseeded streams.
+        """
+        return random.Random(None if self.seed is None else f"{self.seed}:{stream}")
+
+
+DEFAULT_CONFIG = MatchConfig()
+
+
+# ==================== GEOMETRY ====================
+class Rect:
+    """The part of pygame.Rect the simulation uses, with the same integer rules:
+    coordinates truncate toward zero and empty rects never collide."""
+    __slots__ = ("x", "y", "width", "height")
+
+    def __init__(self, x, y, width, height):
+        self.update(x, y, width, height)
+
+    def update(self, x, y, width, height):
+        self.x = int(x)
+        self.y = int(y)
+        self.width = int(width)
+        self.height = int(height)
+
+    left = property(lambda self: self.x)
+    top = property(lambda self: self.y)
+    right = property(lambda self: self.x + self.width)
+    bottom = property(lambda self: self.y + self.height)
+    centerx = property(lambda self: self.x + self.width // 2)
+    size = property(lambda self: (self.width, self.height))
+
+    def inflate(self, dx, dy):
+        # pygame halves with C division, which truncates toward zero
+        return Rect(self.x - int(dx / 2), self.y - int(dy / 2), self.width + dx, self.height + dy)
+
+    def colliderect(self, other):
+        return (self.width > 0 and self.height > 0 and other.width > 0 and other.height > 0
+                and self.x < other.x + other.width and other.x < self.x + self.width
+                and self.y < other.y + other.height and other.y < self.y + self.height)
+
+    def __repr__(self):
+        return f"Rect({self.x}, {self.y}, {self.width}, {self.height})"
+
+
+# ==================== WORLD ====================
+class Platform:
+    moving = False
+    dx = dy = 0  # whole-pixel move of the last step; always 0 for static platforms
+    rect_type = Rect
+
+    def __init__(self, x, y, width, height):
+        self.rect = self.rect_type(x, y, width, height)
+
+
+class MovingPlatform(Platform):
+    """A platform that loops through a path of waypoints, one lap per `period` frames.
+
+    Each leg between consecutive waypoints (the last leads back to the
+    first) takes the same time; smooth eases every leg with a cosine, so
+    a two-point path is an oscillation that slows at both ends. Positions
+    are a function of the frame number, so platforms never drift and a
+    seed replays identically. dx/dy hold the last step's whole-pixel move,
+    which is what players standing on the platform are carried by.
+    """
+    moving = True
+
+    def __init__(self, path, width, height, period, phase=0.0, smooth=True):
+        self.path = path
+        self.period = period
+        self.phase = phase
+        self.smooth = smooth
+        super().__init__(*self.position(0), width, height)
+
+    def position(self, frame):
+        u = (frame / self.period + self.phase) % 1.0 * len(self.path)
+        leg = int(u)
+        t = u - leg
+        if self.smooth:
+            t = (1 - math.cos(t * math.pi)) / 2
+        x0, y0 = self.path[leg]
+        x1, y1 = self.path[(leg + 1) % len(self.path)]
+        return round(x0 + (x1 - x0) * t), round(y0 + (y1 - y0) * t)
+
+    def step(self, frame):
+        x, y = self.position(frame)
+        self.dx = x - self.rect.x
+        self.dy = y - self.rect.y
+        self.rect.x = x
+        self.rect.y = y
+
+
+class Portal:
+    """The portal's position; touching it switches the world colors."""
+    rect_type = Rect
+
+    def __init__(self, x, y, width, height):
+        self.rect = self.rect_type(x, y, width, height)
+
+
+def portal_spot(platforms, reachable, ground_top, rng, portal_w=40, portal_h=80):
+    """Top-left corner for a portal on a random reachable, static, floating platform.
+
+    Falls back to the widest such platform when none is wide enough, and to
+    the ground when there are none at all.
+    """
+    non_ground = [p for p in platforms
+                  if p.rect.top < ground_top and p in reachable and not p.moving]
+    candidates = [p for p in non_ground if p.rect.width >= portal_w + 10]
+    if not candidates:
+        if non_ground:
+            platform = max(non_ground, key=lambda p: p.rect.width)
+        else:
+            platform = platforms[0]
+    else:
+        platform = rng.choice(candidates)
+
+    # Center the portal on the chosen platform and keep inside bounds
+    x = platform.rect.centerx - portal_w // 2
+    x = max(platform.rect.left, min(x, platform.rect.right - portal_w))
+    y = max(0, platform.rect.top - portal_h)
+    return x, y
+
+
+# ==================== PLAYERS ====================
+class Player:
+    """A player's physics state; Arcade Game.py's Player adds animation and drawing."""
+    rect_type = Rect
+
+    def __init__(self, x, y, player_id, config=DEFAULT_CONFIG):
+        self.config = config
+        self.x = x
+        self.y = y
+        self.player_id = player_id
+        self.vx = 0
+        self.vy = 0
+        self.width = PLAYER_WIDTH
+        self.height = PLAYER_HEIGHT
+        self.on_ground = False
+        self.jumps_remaining = 2
+        self.is_tagged = False
+        self.tagged_cooldown = 0
+        self.tag_time = 0  # frames spent as 'it' this match
+        self.direction = 1
+        self.dash_cooldown = 0
+        self.dash_speed = 20
+        self.dash_duration = 10
+        self.dash_timer = 0
+        self.landing_speed = 0  # fall speed of a landing this frame (drives dust particles)
+        self.riding = None  # MovingPlatform landed on last frame; carries the player along
+
+    def get_bounds(self):
+        return self.rect_type(self.x, self.y, self.width, self.height)
+
+    def jump(self):
+        """Jump if a jump is left; returns True when it happened."""
+        if self.jumps_remaining > 0:
+            self.vy = self.config.jump_velocity
+            self.jumps_remaining -= 1
+            self.on_ground = False
+            return True
+        return False
+
+    def dash(self):
+        """Dash if off cooldown; returns True when it happened."""
+        if self.dash_cooldown == 0 and self.dash_timer == 0:
+            self.dash_timer = self.dash_duration
+            self.dash_cooldown = self.config.dash_cooldown
+            self.vx = self.dash_speed * self.direction
+            return True
+        return False
+
+    def update(self, platforms, map_width=MAP_WIDTH, gravity=NORMAL_GRAVITY):
+        self.landing_speed = 0
+        # Ride along with a moving platform before moving under our own steam
+        carry_x = carry_y = 0
+        rode = self.riding
+        if rode:
+            carry_x, carry_y = rode.dx, rode.dy
+            self.x += carry_x
+            self.y += carry_y
+            self.riding = None
+        self.vy += gravity
+        self.x += self.vx
+        self.y += self.vy
+
+        # World bounds
+        if self.x < 0:
+            self.x = 0
+            self.vx = 0
+        elif self.x + self.width > map_width:
+            self.x = map_width - self.width
+            self.vx = 0
+
+        # Check world floor
+        if self.y + self.height >= MAP_HEIGHT:
+            self.y = MAP_HEIGHT - self.height
+            self.landing_speed = max(self.landing_speed, self.vy)
+            self.vy = 0
+            self.on_ground = True
+            self.jumps_remaining = 2
+
+        # Resolve platform collisions. Positions are compared where both the
+        # player and the platform were last frame (moving platforms set dx/dy).
+        # The overlap test is Rect.colliderect on the player's truncated bounds.
+        width = self.width
+        height = self.height
+        left = int(self.x)
+        top = int(self.y)
+        for platform in platforms:
+            rect = platform.rect
+            if not (left < rect.x + rect.width and rect.x < left + width
+                    and top < rect.y + rect.height and rect.y < top + height):
+                continue
+            prev_y = self.y - self.vy - carry_y
+            prev_bottom = prev_y + height
+            fall = self.vy + carry_y - platform.dy
+
+            # Landing on top of platform
+            if fall > 0 and prev_bottom <= rect.top - platform.dy + 8:
+                self.y = rect.top - height
+                self.landing_speed = max(self.landing_speed, fall)
+                self.vy = 0
+                self.on_ground = True
+                self.jumps_remaining = 2
+                if platform.moving:
+                    self.riding = platform
+            # Hitting head on bottom of platform
+            elif fall < 0 and prev_y >= rect.bottom - platform.dy - 4:
+                self.y = rect.bottom
+                self.vy = 0
+            # Side collision
+            else:
+                prev_x = self.x - self.vx - carry_x
+                if prev_x + width <= rect.left - platform.dx:
+                    # Hit from left
+                    self.x = rect.left - width
+                    self.vx = 0
+                elif prev_x >= rect.right - platform.dx:
+                    # Hit from right
+                    self.x = rect.right
+                    self.vx = 0
+
+            left = int(self.x)
+            top = int(self.y)
+
+        # A resting player only overlaps the platform every other frame (gravity
+        # sinks them in by less than a pixel first), so stay aboard while the
+        # feet are still on its top
+        if rode and not self.riding and self.vy >= 0:
+            gap = rode.rect.top - (self.y + self.height)
+            if -1 < gap < 2 and self.x + self.width > rode.rect.left and self.x < rode.rect.right:
+                self.riding = rode
+
+        if self.tagged_cooldown > 0:
+            self.tagged_cooldown -= 1
+
+        if self.dash_timer > 0:
+            self.dash_timer -= 1
+        elif self.dash_cooldown > 0:
+            self.dash_cooldown -= 1
+
+        # Apply friction to stop small movements
+        if self.on_ground and abs(self.vx) < 0.08 and self.dash_timer == 0:
+            self.vx = 0
+
+
+def apply_movement(player, move, config):
+    """Turn a -1/0/1 horizontal intent into player velocity."""
+    speed = config.base_speed * (config.tagged_speed_boost if player.is_tagged else 1.0)
+
+    # Movement - update direction even during dash
+    if move < 0:
+        player.direction = -1
+        if player.dash_timer == 0:
+            player.vx = -speed
+    elif move > 0:
+        player.direction = 1
+        if player.dash_timer == 0:
+            player.vx = speed
+    else:
+        if player.dash_timer == 0:
+            player.vx *= config.friction
+
+
+def touching_pairs(players):
+    """Sort-and-sweep broadphase along x returning pairs of touching players.
+
+    Bounds are sorted by their left edge and each one is only tested
+    against the intervals still open to its left, so the cost is
+    O(n log n) plus the number of x-overlaps instead of O(n^2).
+    """
+    boxes = sorted(((int(player.x), int(player.y), player) for player in players),
+                   key=lambda item: item[0])
+    open_boxes = []
+    pairs = []
+    for left, top, player in boxes:
+        open_boxes = [item for item in open_boxes if item[0] + item[2].width > left]
+        for other_left, other_top, other in open_boxes:
+            if top < other_top + other.height and other_top < top + player.height:
+                pairs.append((other, player))
+        open_boxes.append((left, top, player))
+    return pairs
+
+
+def match_winner(players):
+    """The (GameState, winning player) for a match whose clock just ran out."""
+    if len(players) == 2:
+        player1, player2 = players
+        if player1.is_tagged and not player2.is_tagged:
+            state = GameState.GAME_OVER_P2
+        elif player2.is_tagged and not player1.is_tagged:
+            state = GameState.GAME_OVER_P1
+        else:
+            state = GameState.GAME_OVER_P2
+        return state, player1 if state == GameState.GAME_OVER_P1 else player2
+    # The runner who spent the least time as 'it' wins
+    runners = [player for player in players if not player.is_tagged] or players
+    return GameState.GAME_OVER, min(runners, key=lambda player: player.tag_time)
+
+
+class TagBot:
+    """Scripted player: chases when it is 'it', runs away otherwise."""
+    def __init__(self, player_index, rng):
+        self.player_index = player_index
+        self.rng = rng
+
+    def act(self, game):
+        me = game.players[self.player_index]
+        others = [player for player in game.players if player is not me]
+        # Chase the nearest runner, or run from the nearest 'it' player
+        targets = [player for player in others if player.is_tagged != me.is_tagged] or others
+        other = min(targets, key=lambda player: abs(player.x - me.x) + abs(player.y - me.y))
+        dx = (other.x + other.width / 2) - (me.x + me.width / 2)
+        dy = other.y - me.y
+        toward = 1 if dx > 0 else -1
+
+        if me.is_tagged:
+            move = toward if abs(dx) > 10 else 0
+            wants_up = dy < -80
+            dash = abs(dx) < 220 and abs(dy) < 60
+        else:
+            move = -toward
+            # Cornered against a wall: break past the chaser instead
+            if me.x < 60 or me.x + me.width > game.map_width - 60:
+                move = toward
+            wants_up = abs(dx) < 180
+            dash = abs(dx) < 150 and abs(dy) < 80
+
+        stuck = move != 0 and abs(me.vx) < 0.5 and me.dash_timer == 0
+        jump = False
+        if me.on_ground:
+            jump = wants_up or stuck or self.rng.random() < 0.01
+        elif me.jumps_remaining > 0 and me.vy > 2:
+            jump = wants_up and self.rng.random() < 0.1
+        return move, jump, dash
+
+
+class InputPlayback:
+    """Replays a recording made by InputRecorder; idles once it runs out."""
+    def __init__(self, frames):
+        self.frames = frames
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls([json.loads(line) for line in f if line.strip()])
+
+    def actions(self, game, frame_index):
+        if frame_index >= len(self.frames):
+            return (0, False, False), (0, False, False)
+        m1, j1, d1, m2, j2, d2 = self.frames[frame_index]
+        return (m1, bool(j1), bool(d1)), (m2, bool(j2), bool(d2))
+
+
+# ==================== MAP GENERATION ====================
+# Generators take the Platform and MovingPlatform classes to build, so the
+# game gets drawable platforms from the same rules and random draws.
+def _is_too_close(platforms, candidate, pad_x, pad_y):
+    """Reject platform placement when padded candidate bounds collide with any existing platform."""
+    padded = candidate.rect.inflate(pad_x * 2, pad_y * 2)
+    return any(padded.colliderect(existing.rect) for existing in platforms)
+
+
+def generate_default_map(rng, platform_type=Platform):
+    """Generate the default map with evenly spaced common platforms (no overlaps)."""
+    platforms = []
+    platforms.append(platform_type(0, MAP_HEIGHT - GROUND_HEIGHT, MAP_WIDTH, GROUND_HEIGHT))
+
+    attempts = 0
+    target = 26
+    while len(platforms) - 1 < target and attempts < target * 30:
+        attempts += 1
+        w = rng.randint(150, 320)
+        x = rng.randint(10, MAP_WIDTH - w - 10)
+        y = rng.randint(140 + PLATFORM_Y_OFFSET, MAP_HEIGHT - GROUND_HEIGHT - 260 + PLATFORM_Y_OFFSET)
+        candidate = platform_type(x, y, w, 44)
+        if not _is_too_close(platforms, candidate, 50, 120):
+            platforms.append(candidate)
+    return platforms
+
+
+def generate_floating_map(rng, platform_type=Platform):
+    """Generate a map with mostly floating platforms (no overlaps)."""
+    platforms = []
+    platforms.append(platform_type(0, MAP_HEIGHT - GROUND_HEIGHT, MAP_WIDTH, GROUND_HEIGHT))
+    attempts = 0
+    target = 20
+    while len(platforms) - 1 < target and attempts < target * 25:
+        attempts += 1
+        fw = rng.randint(120, 280)
+        fx = rng.randint(10, MAP_WIDTH - fw - 10)
+        fy = rng.randint(120 + PLATFORM_Y_OFFSET, MAP_HEIGHT - 340 + PLATFORM_Y_OFFSET)
+        candidate = platform_type(fx, fy, fw, 40)
+        if not _is_too_close(platforms, candidate, 60, 140):
+            platforms.append(candidate)
+    return platforms
+
+
+def generate_narrow_map(rng, platform_type=Platform):
+    """Generate a map with narrow and challenging platforms (no overlaps)."""
+    platforms = []
+    platforms.append(platform_type(0, MAP_HEIGHT - GROUND_HEIGHT, MAP_WIDTH, GROUND_HEIGHT))
+    attempts = 0
+    target = 15
+    while len(platforms) - 1 < target and attempts < target * 25:
+        attempts += 1
+        nw = rng.randint(90, 160)
+        nx = rng.randint(10, MAP_WIDTH - nw - 10)
+        ny = rng.randint(120 + PLATFORM_Y_OFFSET, MAP_HEIGHT - 340 + PLATFORM_Y_OFFSET)
+        candidate = platform_type(nx, ny, nw, 30)
+        if not _is_too_close(platforms, candidate, 50, 120):
+            platforms.append(candidate)
+    return platforms
+
+
+MAP_GENERATORS = {
+    "default": generate_default_map,
+    "floating": generate_floating_map,
+    "narrow": generate_narrow_map,
+}
+
+
+def add_moving_platforms(platforms, rng, count, moving_type=MovingPlatform):
+    """Turn up to `count` floating platforms into ones oscillating around where they are.
+
+    Each pick tries a horizontal then a vertical swing and keeps the first
+    whose swept area stays clear of the other platforms; the platform is
+    replaced in place, so list order (and collision order) is unchanged.
+    The swing is centred on the generated position, which is where it
+    starts, so reachability analysed on the layout still holds on average.
+    """
+    floating = [i for i, platform in enumerate(platforms) if platform.rect.top < MAP_HEIGHT - GROUND_HEIGHT]
+    rng.shuffle(floating)
+    added = 0
+    for index in floating:
+        if added == count:
+            break
+        rect = platforms[index].rect
+        others = platforms[:index] + platforms[index + 1:]
+        reach = rng.randint(*MOVING_PLATFORM_RANGE)
+        for ax, ay in ((reach, 0), (0, reach // 2)):
+            swept = Platform(rect.x - ax, rect.y - ay, rect.width + 2 * ax, rect.height + 2 * ay)
+            if (swept.rect.left < 10 or swept.rect.right > MAP_WIDTH - 10
+                    or swept.rect.top < PLATFORM_Y_OFFSET or _is_too_close(others, swept, 30, 90)):
+                continue
+            path = [(rect.x - ax, rect.y - ay), (rect.x + ax, rect.y + ay)]
+            # A quarter lap in, the two-point swing is at its midpoint
+            platforms[index] = moving_type(path, rect.width, rect.height,
+                                           rng.randint(*MOVING_PLATFORM_PERIOD), phase=0.25)
+            added += 1
+            break
+    return platforms
+
+_AIR_TIME_TABLES = {}
+
+
+def air_time_table(jump_velocity, gravity):
+    """Longest time in the air before the feet drop below each height.
+
+    Replays the player's per-frame physics for a jump followed by the
+    second jump on every possible frame. Returns (max rise, lowest level,
+    frames), where frames[h - lowest] is the last frame a double-jump arc
+    can still be at or above height h (pixels above the take-off level).
+    Tables are cached per (jump velocity, gravity).
+    """
+    key = (jump_velocity, gravity)
+    if key in _AIR_TIME_TABLES:
+        return _AIR_TIME_TABLES[key]
+    lowest = -MAP_HEIGHT
+    best = {}
+    apex = int(-jump_velocity / gravity) + 1
+    for second_jump in range(1, 2 * apex + 1):
+        vy = jump_velocity
+        height = 0.0
+        frame = 0
+        while height > lowest:
+            frame += 1
+            if frame == second_jump:
+                vy = jump_velocity
+            vy += gravity
+            height -= vy
+            level = math.floor(height)
+            if best.get(level, -1) < frame:
+                best[level] = frame
+    max_rise = max(best)
+    frames = [0] * (max_rise - lowest + 1)
+    latest = 0
+    for level in range(max_rise, lowest - 1, -1):
+        latest = max(latest, best.get(level, 0))
+        frames[level - lowest] = latest
+    table = (max_rise, lowest, frames)
+    _AIR_TIME_TABLES[key] = table
+    return table
+
+
+class MapReport:
+    """Reachability and playability score for one platform layout."""
+    def __init__(self, platforms, gravity, reachable, routes, ground_top):
+        self.platforms = platforms
+        self.gravity = gravity
+        self.reachable = reachable
+        floating = [p for p in platforms if p.rect.top < ground_top]
+        reached = [p for p in floating if p in reachable]
+        # Share of floating platforms a player can get onto
+        self.coverage = len(reached) / len(floating) if floating else 0.0
+        # Platforms with several ways in, rather than dead-end chains
+        self.connectivity = (sum(min(routes[p], 3) for p in reached) / (3 * len(reached))) if reached else 0.0
+        # Height range the reachable platforms span
+        tops = [p.rect.top for p in reached]
+        self.spread = min(1.0, (max(tops) - min(tops)) / (MAP_HEIGHT - GROUND_HEIGHT - PLATFORM_Y_OFFSET - 120)) if tops else 0.0
+        self.score = 0.5 * self.coverage + 0.3 * self.connectivity + 0.2 * self.spread
+
+
+def analyze_map(platforms, jump_velocity, gravity, speed, ground_top=MAP_HEIGHT - GROUND_HEIGHT,
+                dash_speed=20, dash_duration=10):
+    """Find which platforms a player can reach from the ground.
+
+    Platform B is reachable from A when the horizontal gap between them is
+    within the distance a double jump plus one dash covers in the time the
+    arc stays above B's top. Ceilings are ignored, since a player can
+    always step out from under a platform before jumping.
+    """
+    max_rise, lowest, frames = air_time_table(jump_velocity, gravity)
+    dash_bonus = (dash_speed - speed) * dash_duration
+    rects = [platform.rect for platform in platforms]
+    routes = dict.fromkeys(platforms, 0)
+    start = [i for i, rect in enumerate(rects) if rect.top >= ground_top]
+    seen = set(start)
+    queue = collections.deque(start)
+    while queue:
+        i = queue.popleft()
+        source = rects[i]
+        for j, target in enumerate(rects):
+            if j == i:
+                continue
+            rise = source.top - target.top
+            if rise > max_rise:
+                continue
+            gap = max(target.left - source.right, source.left - target.right) - PLAYER_WIDTH
+            if gap > 0 and gap > frames[max(rise, lowest) - lowest] * speed + dash_bonus:
+                continue
+            routes[platforms[j]] += 1
+            if j not in seen:
+                seen.add(j)
+                queue.append(j)
+    return MapReport(platforms, gravity, {platforms[i] for i in seen}, routes, ground_top)
+
+
+def score_map(map_type, seed, jump_velocity, gravity, speed):
+    """Generate one candidate map from a seed and return (score, seed)."""
+    platforms = MAP_GENERATORS.get(map_type, generate_default_map)(random.Random(seed))
+    return analyze_map(platforms, jump_velocity, gravity, speed).score, seed
+
+
+def pick_best_map(map_type, seeds, jump_velocity, gravity, speed, executor=None):
+    """Score one candidate map per seed, optionally on an executor, and return
+    the (seed, score) of the best; ties go to the earliest seed."""
+    args = [(map_type, seed, jump_velocity, gravity, speed) for seed in seeds]
+    if executor is None:
+        results = [score_map(*arg) for arg in args]
+    else:
+        results = list(executor.map(score_map, *zip(*args)))
+    best_score, best_seed = max(results, key=lambda result: result[0])
+    return best_seed, best_score
+
+
+def map_gravity(config, map_type):
+    """Only the floating map plays in low gravity."""
+    return config.low_gravity if map_type == "floating" else config.normal_gravity
+
+
+def build_map(config, map_type, rng, platform_type=Platform, moving_type=MovingPlatform):
+    """Generate the next layout of a map type from its RNG stream.
+
+    Returns (platforms, MapReport, PlatformGrid). With several map
+    candidates the stream only supplies their seeds, and the best-scoring
+    one is rebuilt with the requested platform classes.
+    """
+    generator = MAP_GENERATORS[map_type]
+    gravity = map_gravity(config, map_type)
+    if config.map_candidates <= 1:
+        layout_rng = rng
+    else:
+        seeds = [rng.randrange(1 << 30) for _ in range(config.map_candidates)]
+        seed, _ = pick_best_map(map_type, seeds, config.jump_velocity, gravity, config.base_speed)
+        layout_rng = random.Random(seed)
+    platforms = add_moving_platforms(generator(layout_rng, platform_type), layout_rng,
+                                     config.moving_platforms, moving_type)
+    report = analyze_map(platforms, config.jump_velocity, gravity, config.base_speed)
+    return platforms, report, PlatformGrid(platforms)
+
+
+class PlatformGrid:
+    """Column index over a platform list, so collision only tests nearby platforms.
+
+    near() returns candidates in their original list order, which keeps
+    collision resolution identical to testing the whole list.
+    """
+    def __init__(self, platforms, cell=PLATFORM_GRID_CELL):
+        self.platforms = platforms
+        self.cell = cell
+        self.order = {platform: index for index, platform in enumerate(platforms)}
+        columns = collections.defaultdict(list)
+        for platform in platforms:
+            for column in range(platform.rect.left // cell, (platform.rect.right - 1) // cell + 1):
+                columns[column].append(platform)
+        self.columns = dict(columns)
+
+    def near(self, left, right):
+        """Platforms overlapping any column the x span [left, right] touches."""
+        first = int(left) // self.cell
+        last = int(right) // self.cell
+        if first == last:
+            return self.columns.get(first, ())
+        found = set()
+        for column in range(first, last + 1):
+            found.update(self.columns.get(column, ()))
+        return sorted(found, key=self.order.__getitem__)
+
+    def move(self, platform, old_left, old_right):
+        """Re-file one platform after it moved sideways from [old_left, old_right).
+
+        Only the columns it left or entered are touched, so a platform
+        moving within its columns (or only vertically) costs nothing.
+        """
+        cell = self.cell
+        first = platform.rect.left // cell
+        last = (platform.rect.right - 1) // cell
+        old_first = old_left // cell
+        old_last = (old_right - 1) // cell
+        if first == old_first and last == old_last:
+            return
+        old = range(old_first, old_last + 1)
+        new = range(first, last + 1)
+        columns = self.columns
+        for column in old:
+            if column not in new:
+                found = columns[column]
+                found.remove(platform)
+                if not found:
+                    del columns[column]
+        for column in new:
+            if column not in old:
+                bisect.insort(columns.setdefault(column, []), platform, key=self.order.__getitem__)
+
+
+# ==================== MATCH ====================
+class Match:
+    """A series of matches of tag, stepped one frame per update().
+
+    This is the whole simulation: Game owns one (a subclass that adds
+    pygame types, chunked worlds and effects through the hooks below) and
+    tournament workers run it bare. reset() starts the next match on a
+    fresh layout while the RNG streams carry on. heatmap may be set to
+    anything with set_map/record/add_tag.
+    """
+    portal_type = Portal
+
+    def __init__(self, config=None, map_type="default", num_players=2, num_bots=0, num_it=1):
+        self.config = config or MatchConfig()
+        self.map_width = self.config.map_width
+        self.ground_top = MAP_HEIGHT - GROUND_HEIGHT
+        self.map_rngs = {name: self.config.rng(f"map:{name}") for name in MAP_GENERATORS}
+        self.portal_rng = self.config.rng("portal")
+        self.sim_frames = 0  # gameplay frames simulated; drives moving platforms
+
+        # The last num_bots players are driven by TagBots
+        self.num_players = max(2, min(num_players, MAX_PLAYERS))
+        self.num_it = max(1, min(num_it, self.num_players - 1))
+        bot_rng = self.config.rng("bots")
+        first_bot = self.num_players - min(num_bots, self.num_players)
+        self.bots = {index: TagBot(index, bot_rng) for index in range(first_bot, self.num_players)}
+        self.heatmap = None
+
+        self.players = []
+        self.map_report = None
+        self.platform_grid = None
+        self.moving_platforms = []
+        self.moving_platforms_of = None
+        self.portal = None
+        self.portal_fade_duration = 0.6
+        self.select_map(map_type)
+        self._start()
+
+    @property
+    def p1_tag_time(self):
+        """Frames player 1 has spent as 'it' this match."""
+        return self.players[0].tag_time
+
+    @property
+    def p2_tag_time(self):
+        """Frames player 2 has spent as 'it' this match."""
+        return self.players[1].tag_time
+
+    def select_map(self, map_type):
+        """Switch to the next layout of a map type and its gravity; players stay put."""
+        map_type = map_type if map_type in MAP_GENERATORS else "default"
+        self.is_upside_down = False
+        self.gravity = map_gravity(self.config, map_type)
+        self.platforms = self._build_platforms(map_type)
+
+    def reset(self, map_type="default"):
+        """Start the next match: players respawn on the next layout of map_type."""
+        self._start()
+        self.select_map(map_type)
+
+    def _start(self):
+        """Respawn the players, restart the clock and put the portal back on the ground."""
+        self._create_players()
+        self.state = GameState.PLAYING
+        self.winner = None
+        self.match_seconds = self.config.match_duration
+        self.frame_counter = 0
+        self.tag_count = 0
+        self.portal_uses = 0
+
+        # The first portal starts on the ground and moves onto a platform next update
+        self.portal = None
+        self.portal_cooldown = 0
+        self.portal_spawn_delay = 0
+        self.portal_needs_platform_fix = True
+        self._spawn_portal(40, 80, force_ground_fallback=True)
+
+    def _new_player(self, x, y, player_id):
+        return Player(x, y, player_id, self.config)
+
+    def _build_platforms(self, map_type):
+        """Generate the next layout of a map type from its own RNG stream."""
+        if self.map_width > MAP_WIDTH:
+            raise ValueError("chunked worlds (map_width > MAP_WIDTH) are only simulated by the game")
+        if self.heatmap:
+            self.heatmap.set_map(map_type)
+        platforms, self.map_report, self.platform_grid = build_map(self.config, map_type, self.map_rngs[map_type])
+        return platforms
+
+    def _stream_platforms(self):
+        """Called before platforms move each frame; chunked worlds swap chunks in and out."""
+
+    def _emit(self, kind, *fields):
+        """Called on every gameplay event (jump, dash, tag, portal_spawn, portal_touch, match_end)."""
+
+    def _tagged(self, it):
+        """Called after a tag with the player who is now 'it'."""
+
+    def _portal_touched(self, toucher):
+        """Called when a player touches the portal, before the world flips."""
+
+    def _create_players(self):
+        """Spawn players evenly along the ground and pick who starts as 'it'."""
+        ground_spawn_y = self.ground_top - PLAYER_HEIGHT
+        n = self.num_players
+        self.players = []
+        for i in range(n):
+            # Chunked worlds still start everyone inside the first MAP_WIDTH pixels
+            x = 200 + (min(self.map_width, MAP_WIDTH) - 400) * i // (n - 1)
+            self.players.append(self._new_player(x, ground_spawn_y, i + 1))
+        # Spread starting 'it' players across the field; with two players, P1 starts as it
+        for k in range(self.num_it):
+            self.players[k * n // self.num_it].is_tagged = True
+
+    def _platform_grid(self):
+        """Collision index for the current platforms (rebuilt when chunks stream in or out)."""
+        grid = self.platform_grid
+        if grid is None or grid.platforms is not self.platforms:
+            grid = PlatformGrid(self.platforms)
+            self.platform_grid = grid
+        return grid
+
+    def _moving_platforms(self):
+        """The current platforms that follow a path (cached per platform list)."""
+        if self.moving_platforms_of is not self.platforms:
+            self.moving_platforms_of = self.platforms
+            self.moving_platforms = [platform for platform in self.platforms if platform.moving]
+        return self.moving_platforms
+
+    def _map_report(self):
+        """Reachability of the current platforms under the current gravity (cached)."""
+        report = self.map_report
+        if report is None or report.platforms is not self.platforms or report.gravity != self.gravity:
+            report = analyze_map(self.platforms, self.config.jump_velocity, self.gravity,
+                                 self.config.base_speed, self.ground_top)
+            self.map_report = report
+        return report
+
+    def _spawn_portal(self, portal_w=40, portal_h=80, force_ground_fallback=False):
+        """Place the portal on top of a random reachable platform.
+
+        Without platforms, or when forced, it goes on the ground near the
+        middle of the map (of the players, in maps wider than MAP_WIDTH).
+        """
+        if not self.platforms or force_ground_fallback:
+            if self.map_width > MAP_WIDTH:
+                center_x = int(sum(player.x for player in self.players) / len(self.players))
+            else:
+                center_x = MAP_WIDTH // 2
+            x = center_x - portal_w // 2
+            y = max(0, self.ground_top - portal_h)
+        else:
+            x, y = portal_spot(self.platforms, self._map_report().reachable, self.ground_top,
+                               self.portal_rng, portal_w, portal_h)
+        if self.portal is None:
+            self.portal = self.portal_type(x, y, portal_w, portal_h)
+        else:
+            self.portal.rect.update(x, y, portal_w, portal_h)
+        self.portal_fade_timer = 0.0
+        self._emit("portal_spawn", x, y)
+
+    def _jump(self, player):
+        if player.jump():
+            self._emit("jump", player.player_id, round(player.x), round(player.y), player.jumps_remaining)
+
+    def _dash(self, player):
+        if player.dash():
+            self._emit("dash", player.player_id, round(player.x), round(player.y))
+
+    def check_tag(self):
+        """Check if players collide and handle tag switching.
+
+        An 'it' player touching a runner passes the tag on. Both then get
+        tag_cooldown frames before they can be part of another tag.
+        """
+        for a, b in touching_pairs(self.players):
+            if a.is_tagged == b.is_tagged:
+                continue
+            if a.tagged_cooldown > 0 or b.tagged_cooldown > 0:
+                continue
+            a.is_tagged = not a.is_tagged
+            b.is_tagged = not b.is_tagged
+            a.tagged_cooldown = self.config.tag_cooldown
+            b.tagged_cooldown = self.config.tag_cooldown
+            self.tag_count += 1
+            it = a if a.is_tagged else b
+            self._emit("tag", it.player_id, round(it.x), round(it.y))
+            if self.heatmap:
+                self.heatmap.add_tag(it.x + it.width / 2, it.y + it.height / 2)
+            self._tagged(it)
+
+    def step(self, actions):
+        """Advance one frame from scripted actions instead of devices.
+
+        actions holds one (move, jump, dash) tuple per scripted player, in
+        the same order the live loop applies them: presses first, then
+        simulation. Bots still drive their own players.
+        """
+        self.update(self.press(actions))
+
+    def press(self, actions):
+        """Apply the jumps and dashes of step() actions; returns the moves for update()."""
+        for player, (move, jump, dash) in zip(self.players, actions):
+            if jump:
+                self._jump(player)
+            if dash:
+                self._dash(player)
+        moves = [action[0] for action in actions]
+        return moves + [0] * (self.num_players - len(moves))
+
+    def update(self, moves):
+        """Advance one frame; moves holds a -1/0/1 intent per player (bots fill in theirs)."""
+        moves = list(moves)
+        players = self.players
+        # Bots decide from the same snapshot, then press like a player would
+        if self.bots:
+            decisions = [(index, bot.act(self)) for index, bot in self.bots.items()]
+            for index, (move, jump, dash) in decisions:
+                if jump:
+                    self._jump(players[index])
+                if dash:
+                    self._dash(players[index])
+                moves[index] = move
+
+        config = self.config
+        for player, move in zip(players, moves):
+            apply_movement(player, move, config)
+
+        # Move platforms along their paths, re-filing only those that changed columns
+        self._stream_platforms()
+        grid = self._platform_grid()
+        for platform in self._moving_platforms():
+            left, right = platform.rect.left, platform.rect.right
+            platform.step(self.sim_frames)
+            if platform.dx:
+                grid.move(platform, left, right)
+
+        # Update physics, testing only platforms near each player's path this frame
+        for player in players:
+            # A rider is carried by its platform's dx before its own vx is applied
+            step = player.vx + (player.riding.dx if player.riding else 0)
+            nearby = grid.near(player.x + min(0, step) - 1, player.x + max(0, step) + player.width + 1)
+            player.update(nearby, self.map_width, self.gravity)
+
+        self.check_tag()
+
+        # Accumulate tagged time for scoring
+        if self.state == GameState.PLAYING:
+            for player in players:
+                if player.is_tagged:
+                    player.tag_time += 1
+            if self.heatmap:
+                self.heatmap.record(players)
+
+        # First-frame fix to move the initial portal onto a platform
+        if self.portal_needs_platform_fix and self.portal_spawn_delay == 0 and self.platforms:
+            w, h = self.portal.rect.size if self.portal else (40, 80)
+            self._spawn_portal(w, h)
+            self.portal_needs_platform_fix = False
+
+        # A touched portal respawns after a delay
+        if self.portal_spawn_delay > 0:
+            self.portal_spawn_delay -= 1
+            if self.portal_spawn_delay == 0 and self.portal is None:
+                self._spawn_portal(40, 80)
+
+        # Fade-in timer for newly spawned portals
+        if self.portal and self.portal_fade_timer < self.portal_fade_duration:
+            self.portal_fade_timer = min(self.portal_fade_duration, self.portal_fade_timer + 1.0 / FPS)
+
+        # Portal collision: flip the world and schedule a respawn in 5-10s
+        if self.portal_cooldown > 0:
+            self.portal_cooldown -= 1
+        if self.portal and self.portal_cooldown == 0 and self.portal_fade_timer >= self.portal_fade_duration:
+            portal_rect = self.portal.rect
+            toucher = next((player for player in players if player.get_bounds().colliderect(portal_rect)), None)
+            if toucher:
+                self._emit("portal_touch", toucher.player_id, 0 if self.is_upside_down else 1)
+                self._portal_touched(toucher)
+                self.is_upside_down = not self.is_upside_down
+                self.portal_uses += 1
+                self.portal = None
+                self.portal_spawn_delay = self.portal_rng.randint(5 * FPS, 10 * FPS)
+                self.portal_cooldown = max(10, FPS // 4)
+
+        # Match clock
+        self.sim_frames += 1
+        if self.state == GameState.PLAYING:
+            self.frame_counter += 1
+            if self.frame_counter >= FPS:
+                self.frame_counter = 0
+                self.match_seconds -= 1
+                if self.match_seconds <= 0:
+                    self._finish_match()
+
+    def _finish_match(self):
+        """Decide the winner once the clock runs out."""
+        self.state, self.winner = match_winner(self.players)
+        self._emit("match_end", self.winner.player_id,
+                   round(self.p1_tag_time / FPS, 2), round(self.p2_tag_time / FPS, 2),
+                   self.tag_count, self.portal_uses)
+
+
+def fingerprint(match):
+    """Every piece of state a frame can change, as one exact string.
+
+    Takes a Match or a Game; repr keeps every float bit, so two
+    simulations agree on a frame exactly when their fingerprints are equal.
+    """
+    portal = match.portal
+    return repr((
+        match.sim_frames, match.state, match.match_seconds, match.frame_counter,
+        match.tag_count, match.portal_uses, match.winner.player_id if match.winner else 0,
+        tuple((p.x, p.y, p.vx, p.vy, p.on_ground, p.jumps_remaining, p.is_tagged, p.tagged_cooldown,
+               p.tag_time, p.direction, p.dash_timer, p.dash_cooldown, p.landing_speed,
+               (p.riding.rect.x, p.riding.rect.y) if p.riding else None) for p in match.players),
+        (portal.rect.x, portal.rect.y, portal.rect.width, portal.rect.height) if portal else None,
+        match.portal_cooldown, match.portal_spawn_delay, match.portal_fade_timer,
+        match.portal_needs_platform_fix, match.is_upside_down,
+        tuple((p.rect.x, p.rect.y, p.dx, p.dy) for p in match.platforms if p.moving),
+    ))
+
+
+def layout(platforms):
+    """A platform list's rects and kinds, for comparing generated maps."""
+    return [(p.rect.x, p.rect.y, p.rect.width, p.rect.height, p.moving) for p in platforms]
+
+
+# Digests of reference matches (bots on both sides, no input) recorded from the
+# game's simulation before it moved into this module
+GOLDEN_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tag_core_golden.json")
+
+
+def fingerprint_digest(platforms):
+    """A SHA-256 seeded with a match's layout; update it with every frame's fingerprint()."""
+    return hashlib.sha256(repr(layout(platforms)).encode())
+
+
+def golden_key(job):
+    return json.dumps([job["seed"], job["map"], job["params"]], sort_keys=True)
+
+
+def load_golden(path=GOLDEN_FILE):
+    """{golden_key(job): (frames, sha256 hex digest)} for every recorded reference match."""
+    with open(path) as f:
+        return {golden_key(entry): (entry["frames"], entry["sha256"]) for entry in json.load(f)}
+
+
+def simulate_match(job):
+    """Play one match to the final whistle and return its result.
+
+    job is a dict with 'seed', 'map', 'params' (tunable overrides), an
+    optional 'inputs' recording path (without one, bots play both sides)
+    and an optional 'heatmap' flag. With the flag the result also lists
+    the platforms nobody stood on and carries the match's Heatmap. This is
+    the tournament workers' entry point, so it needs nothing but this module.
+    """
+    config = MatchConfig(seed=job["seed"], **job["params"])
+    heatmap = None
+    if job.get("heatmap"):
+        from heatmaps import Heatmap  # NumPy is only loaded by workers that need it
+        heatmap = Heatmap()
+    playback = InputPlayback.load(job["inputs"]) if job.get("inputs") else None
+    match = Match(config, job["map"], num_bots=0 if playback else 2)
+    if heatmap:
+        heatmap.set_map(job["map"])
+        match.heatmap = heatmap
+
+    frame_limit = (config.match_duration + 1) * FPS
+    frames = 0
+    idle = [0, 0]
+    while match.state == GameState.PLAYING and frames < frame_limit:
+        if playback:
+            match.step(playback.actions(match, frames))
+        else:
+            match.update(idle)
+        frames += 1
+
+    result = {
+        "seed": job["seed"],
+        "map": job["map"],
+        "params": job["params"],
+        "winner": match.winner.player_id if match.winner else 0,
+        "p1_tag_time": match.p1_tag_time / FPS,
+        "p2_tag_time": match.p2_tag_time / FPS,
+        "tags": match.tag_count,
+        "portal_uses": match.portal_uses,
+        "frames": frames,
+    }
+    if heatmap:
+        result["unused_platforms"] = heatmap.unused_platforms(match.platforms)
+        result["heatmap"] = heatmap
+    return result